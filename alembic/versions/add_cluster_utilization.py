@@ -0,0 +1,46 @@
+"""Add cluster_utilization rollup table
+
+Revision ID: add_cluster_utilization
+Revises: add_scheduler_indexes
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_cluster_utilization'
+down_revision = 'add_scheduler_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'cluster_utilization',
+        sa.Column('cluster_id', sa.Integer(), nullable=False),
+        sa.Column('resolution', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('samples', sa.Integer(), nullable=False),
+        sa.Column('cpu_used_sum', sa.Float(), nullable=False),
+        sa.Column('ram_used_sum', sa.Float(), nullable=False),
+        sa.Column('gpu_used_sum', sa.Float(), nullable=False),
+        sa.Column('cpu_used_max', sa.Float(), nullable=False),
+        sa.Column('ram_used_max', sa.Float(), nullable=False),
+        sa.Column('gpu_used_max', sa.Integer(), nullable=False),
+        sa.Column('cpu_used_last', sa.Float(), nullable=False),
+        sa.Column('ram_used_last', sa.Float(), nullable=False),
+        sa.Column('gpu_used_last', sa.Integer(), nullable=False),
+        sa.Column('total_cpu', sa.Float(), nullable=False),
+        sa.Column('total_ram', sa.Float(), nullable=False),
+        sa.Column('total_gpu', sa.Integer(), nullable=False),
+        sa.Column('last_sampled_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['cluster_id'], ['clusters.id'], ),
+        sa.PrimaryKeyConstraint('cluster_id', 'resolution', 'bucket'),
+    )
+    op.create_index(
+        'ix_cluster_utilization_resolution_bucket', 'cluster_utilization',
+        ['resolution', 'bucket'], unique=False,
+    )
+
+def downgrade() -> None:
+    op.drop_index('ix_cluster_utilization_resolution_bucket', table_name='cluster_utilization')
+    op.drop_table('cluster_utilization')
@@ -0,0 +1,43 @@
+"""Add deployment_groups and deployments.group_id for gang scheduling
+
+Revision ID: add_deployment_groups
+Revises: add_cluster_utilization
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_deployment_groups'
+down_revision = 'add_cluster_utilization'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'deployment_groups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('timeout_seconds', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('cluster_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['cluster_id'], ['clusters.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_deployment_groups_id'), 'deployment_groups', ['id'], unique=False)
+    op.create_index(op.f('ix_deployment_groups_name'), 'deployment_groups', ['name'], unique=False)
+    op.add_column('deployments', sa.Column('group_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'deployments_group_id_fkey', 'deployments', 'deployment_groups', ['group_id'], ['id']
+    )
+    op.create_index(op.f('ix_deployments_group_id'), 'deployments', ['group_id'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_deployments_group_id'), table_name='deployments')
+    op.drop_constraint('deployments_group_id_fkey', 'deployments', type_='foreignkey')
+    op.drop_column('deployments', 'group_id')
+    op.drop_index(op.f('ix_deployment_groups_name'), table_name='deployment_groups')
+    op.drop_index(op.f('ix_deployment_groups_id'), table_name='deployment_groups')
+    op.drop_table('deployment_groups')
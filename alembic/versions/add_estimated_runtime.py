@@ -0,0 +1,20 @@
+"""Add estimated_runtime to deployments for backfill scheduling
+
+Revision ID: add_estimated_runtime
+Revises: add_deployment_groups
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_estimated_runtime'
+down_revision = 'add_deployment_groups'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('deployments', sa.Column('estimated_runtime', sa.Float(), nullable=True))
+
+def downgrade() -> None:
+    op.drop_column('deployments', 'estimated_runtime')
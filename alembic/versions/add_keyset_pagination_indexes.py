@@ -0,0 +1,35 @@
+"""Add created_at to clusters and organizations and keyset pagination indexes
+
+Revision ID: add_keyset_pagination_indexes
+Revises: add_version_to_clusters
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_keyset_pagination_indexes'
+down_revision = 'add_version_to_clusters'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('clusters', sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True))
+    op.add_column('organizations', sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True))
+    # Keyset pagination cannot step over NULLs
+    op.execute('UPDATE deployments SET created_at = now() WHERE created_at IS NULL')
+
+    op.create_index('ix_organizations_created_at_id', 'organizations', ['created_at', 'id'], unique=False)
+    op.create_index('ix_clusters_organization_id_created_at_id', 'clusters', ['organization_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_deployments_created_at_id', 'deployments', ['created_at', 'id'], unique=False)
+    op.create_index('ix_deployments_cluster_id_created_at_id', 'deployments', ['cluster_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_deployments_cluster_id_status_created_at_id', 'deployments', ['cluster_id', 'status', 'created_at', 'id'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index('ix_deployments_cluster_id_status_created_at_id', table_name='deployments')
+    op.drop_index('ix_deployments_cluster_id_created_at_id', table_name='deployments')
+    op.drop_index('ix_deployments_created_at_id', table_name='deployments')
+    op.drop_index('ix_clusters_organization_id_created_at_id', table_name='clusters')
+    op.drop_index('ix_organizations_created_at_id', table_name='organizations')
+    op.drop_column('organizations', 'created_at')
+    op.drop_column('clusters', 'created_at')
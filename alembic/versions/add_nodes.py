@@ -0,0 +1,48 @@
+"""Add nodes under clusters for node-level placement
+
+Revision ID: add_nodes
+Revises: add_estimated_runtime
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_nodes'
+down_revision = 'add_estimated_runtime'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'nodes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('total_cpu', sa.Float(), nullable=False),
+        sa.Column('total_ram', sa.Float(), nullable=False),
+        sa.Column('total_gpu', sa.Integer(), nullable=False),
+        sa.Column('available_cpu', sa.Float(), nullable=False),
+        sa.Column('available_ram', sa.Float(), nullable=False),
+        sa.Column('available_gpu', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('cluster_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['cluster_id'], ['clusters.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_nodes_id'), 'nodes', ['id'], unique=False)
+    op.create_index(op.f('ix_nodes_name'), 'nodes', ['name'], unique=False)
+    op.create_index(op.f('ix_nodes_cluster_id'), 'nodes', ['cluster_id'], unique=False)
+    op.add_column('clusters', sa.Column('node_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('deployments', sa.Column('node_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('deployments_node_id_fkey', 'deployments', 'nodes', ['node_id'], ['id'])
+    op.create_index(op.f('ix_deployments_node_id'), 'deployments', ['node_id'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_deployments_node_id'), table_name='deployments')
+    op.drop_constraint('deployments_node_id_fkey', 'deployments', type_='foreignkey')
+    op.drop_column('deployments', 'node_id')
+    op.drop_column('clusters', 'node_count')
+    op.drop_index(op.f('ix_nodes_cluster_id'), table_name='nodes')
+    op.drop_index(op.f('ix_nodes_name'), table_name='nodes')
+    op.drop_index(op.f('ix_nodes_id'), table_name='nodes')
+    op.drop_table('nodes')
@@ -0,0 +1,41 @@
+"""Add composite and partial indexes for scheduler queries
+
+Revision ID: add_scheduler_indexes
+Revises: add_keyset_pagination_indexes
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_scheduler_indexes'
+down_revision = 'add_keyset_pagination_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_deployments_cluster_id_status_priority', 'deployments',
+            ['cluster_id', 'status', 'priority'],
+            unique=False, postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_deployments_queued_cluster_id_priority', 'deployments',
+            ['cluster_id', sa.text('priority DESC'), 'created_at'],
+            unique=False, postgresql_concurrently=True,
+            postgresql_where=sa.text("status = 'QUEUED'"),
+        )
+        op.create_index(
+            'ix_deployments_running_cluster_id_priority', 'deployments',
+            ['cluster_id', 'priority'],
+            unique=False, postgresql_concurrently=True,
+            postgresql_where=sa.text("status = 'RUNNING'"),
+        )
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_deployments_running_cluster_id_priority', table_name='deployments', postgresql_concurrently=True)
+        op.drop_index('ix_deployments_queued_cluster_id_priority', table_name='deployments', postgresql_concurrently=True)
+        op.drop_index('ix_deployments_cluster_id_status_priority', table_name='deployments', postgresql_concurrently=True)
@@ -0,0 +1,27 @@
+"""Add time-weighted usage columns to cluster_utilization
+
+Revision ID: add_utilization_used_seconds
+Revises: add_version_to_organizations
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_utilization_used_seconds'
+down_revision = 'add_version_to_organizations'
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    'cpu_used_seconds', 'ram_used_seconds', 'gpu_used_seconds', 'first_sample_offset', 'last_sample_offset',
+)
+
+def upgrade() -> None:
+    # Existing buckets read as holding their last state throughout
+    for column in COLUMNS:
+        op.add_column('cluster_utilization', sa.Column(column, sa.Float(), server_default='0', nullable=False))
+
+def downgrade() -> None:
+    for column in COLUMNS:
+        op.drop_column('cluster_utilization', column)
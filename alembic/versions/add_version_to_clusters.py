@@ -0,0 +1,20 @@
+"""Add optimistic lock version column to clusters
+
+Revision ID: add_version_to_clusters
+Revises: add_status_column_to_deployments
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_version_to_clusters'
+down_revision = 'add_status_column_to_deployments'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('clusters', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+def downgrade() -> None:
+    op.drop_column('clusters', 'version')
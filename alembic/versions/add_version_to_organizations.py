@@ -0,0 +1,20 @@
+"""Add version column to organizations
+
+Revision ID: add_version_to_organizations
+Revises: add_nodes
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_version_to_organizations'
+down_revision = 'add_nodes'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('organizations', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+def downgrade() -> None:
+    op.drop_column('organizations', 'version')
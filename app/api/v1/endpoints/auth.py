@@ -2,55 +2,64 @@ from datetime import timedelta
 from typing import Any
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.core.security import create_access_token, get_password_hash, verify_password
-from app.db.base import get_db
+from app.core.security import create_access_token, verify_password_async
+from app.db.base import get_async_db
 from app.schemas.user import User, UserCreate
-from app.services.user import user_service
+from app.services.user import async_user_service
 
 router = APIRouter()
 
 @router.post("/login", response_model=dict)
-def login(
-    db: Session = Depends(get_db),
+async def login(
+    db: AsyncSession = Depends(get_async_db),
     form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """
     OAuth2 compatible token login, get an access token for future requests
+
+    bcrypt runs on the password hashing pool, off the event loop.
     """
-    user = user_service.get_by_email(db, email=form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    credentials = await async_user_service.get_credentials(db, email=form_data.username)
+    valid, new_hash = (
+        await verify_password_async(form_data.password, credentials[1])
+        if credentials else (False, None)
+    )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    user_id = credentials[0]
+    if new_hash:
+        # The hash was made with another PASSWORD_BCRYPT_ROUNDS, upgrade it transparently
+        await async_user_service.set_password_hash(db, id=user_id, hashed_password=new_hash)
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     return {
         "access_token": create_access_token(
-            user.id, expires_delta=access_token_expires
+            user_id, expires_delta=access_token_expires
         ),
         "token_type": "bearer",
     }
 
 @router.post("/register", response_model=User)
-def register(
+async def register(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user_in: UserCreate,
 ) -> Any:
     """
     Register new user.
     """
-    user = user_service.get_by_email(db, email=user_in.email)
-    if user:
+    if await async_user_service.get_credentials(db, email=user_in.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="The user with this email already exists in the system.",
         )
     
-    user = user_service.create(db, obj_in=user_in)
+    user = await async_user_service.create(db, obj_in=user_in)
     return user 
\ No newline at end of file
@@ -1,21 +1,41 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Any, Iterable, List, Optional
+from datetime import datetime, timedelta, timezone
+import hashlib
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.base import get_db
+from app.db.base import get_async_db, get_db
+from app.core.config import settings
 from app.schemas.cluster import Cluster, ClusterCreate, ClusterUpdate
-from app.services.cluster import cluster_service
+from app.schemas.node import Node, NodeCreate
+from app.schemas.utilization import UtilizationSeries
+from app.services.cluster import async_cluster_service, cluster_service
+from app.services.node import async_node_service, node_service
+from app.services.scheduler import SchedulerEvent
+from app.services.scheduler_loop import dispatch_event
+from app.services.utilization import RESOLUTIONS, get_rollups, series_points
 from app.core.auth import get_current_user
-from app.db.models import User
+from app.db.replicas import get_async_read_db
+from app.core.principal_cache import Principal
+from app.core.response_cache import cached_response, conditional_response
 
 router = APIRouter()
 
+ClusterList = TypeAdapter(List[Cluster])
+
+def cluster_etag(clusters: Iterable[Any], next_cursor: Optional[str] = None) -> str:
+    """Changes whenever a listed cluster's version does, or the page's membership."""
+    raw = ",".join(f"{cluster.id}:{cluster.version}" for cluster in clusters)
+    return '"' + hashlib.sha1(f"{raw};{next_cursor or ''}".encode()).hexdigest() + '"'
+
 @router.post("/", response_model=Cluster)
-def create_cluster(
+async def create_cluster(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     cluster_in: ClusterCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
     Create new cluster.
@@ -27,35 +47,65 @@ def create_cluster(
             detail="Not authorized to create cluster for this organization",
         )
     
-    cluster = cluster_service.create(db, obj_in=cluster_in)
+    cluster = await async_cluster_service.create(db, obj_in=cluster_in)
     return cluster
 
 @router.get("/", response_model=List[Cluster])
-def read_clusters(
-    db: Session = Depends(get_db),
-    skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(get_current_user),
+async def read_clusters(
+    request: Request,
+    db: AsyncSession = Depends(get_async_read_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
-    Retrieve clusters for the user's organization.
+    Retrieve clusters for the user's organization, newest first.
+
+    Pass the X-Next-Cursor response header back as cursor to get the next page.
+    Answers 304 when If-None-Match carries the page's current ETag.
     """
-    clusters = cluster_service.get_multi_by_organization(
-        db, organization_id=current_user.organization_id, skip=skip, limit=limit
+    key = ("clusters", current_user.organization_id, cursor, limit)
+    cached = cached_response(request, "clusters", key, current_user.organization_id)
+    if cached is not None:
+        return cached
+    try:
+        clusters, next_cursor = await async_cluster_service.get_multi_by_organization(
+            db, organization_id=current_user.organization_id, limit=limit, cursor=cursor
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+    return conditional_response(
+        request,
+        "clusters",
+        cluster_etag(clusters, next_cursor),
+        lambda: ClusterList.dump_json(ClusterList.validate_python(clusters, from_attributes=True)),
+        key=key,
+        tags=[("organization", current_user.organization_id)] + [("cluster", cluster.id) for cluster in clusters],
+        organization_id=current_user.organization_id,
+        headers={"X-Next-Cursor": next_cursor} if next_cursor else None,
     )
-    return clusters
 
 @router.get("/{cluster_id}", response_model=Cluster)
-def read_cluster(
+async def read_cluster(
     *,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_read_db),
     cluster_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
     Get cluster by ID.
+
+    Answers 304 when If-None-Match carries the cluster's current ETag.
     """
-    cluster = cluster_service.get(db, id=cluster_id)
+    key = ("cluster", cluster_id)
+    cached = cached_response(request, "cluster", key, current_user.organization_id)
+    if cached is not None:
+        return cached
+    cluster = await async_cluster_service.get(db, id=cluster_id)
     if not cluster:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -66,7 +116,76 @@ def read_cluster(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to access this cluster",
         )
-    return cluster
+    return conditional_response(
+        request,
+        "cluster",
+        cluster_etag([cluster]),
+        lambda: Cluster.model_validate(cluster).model_dump_json().encode(),
+        key=key,
+        tags=[key],
+        organization_id=cluster.organization_id,
+    )
+
+@router.get("/{cluster_id}/utilization", response_model=UtilizationSeries)
+async def read_cluster_utilization(
+    *,
+    db: AsyncSession = Depends(get_async_read_db),
+    cluster_id: int,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    step: Optional[str] = Query(None, pattern="^(" + "|".join(RESOLUTIONS) + ")$"),
+    current_user: Principal = Depends(get_current_user),
+) -> Any:
+    """
+    Capacity in use on a cluster over time, from the 1m, 1h or 1d rollups.
+
+    Defaults to the last 24 hours at the finest step that fits in
+    UTILIZATION_MAX_POINTS points.
+    """
+    cluster = await async_cluster_service.get_owner(db, id=cluster_id)
+    if not cluster:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cluster not found",
+        )
+    if cluster.organization_id != current_user.organization_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this cluster",
+        )
+
+    end = _naive_utc(end) if end else datetime.utcnow()
+    start = _naive_utc(start) if start else end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="from must be before to",
+        )
+    span = (end - start).total_seconds()
+    if step is None:
+        step = next(
+            (name for name, resolution in RESOLUTIONS.items() if span / resolution <= settings.UTILIZATION_MAX_POINTS),
+            "1d",
+        )
+    resolution = RESOLUTIONS[step]
+    if span / resolution > settings.UTILIZATION_MAX_POINTS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.UTILIZATION_MAX_POINTS} points per request, use a coarser step",
+        )
+
+    previous, rows = await get_rollups(db, cluster_id=cluster_id, resolution=resolution, start=start, end=end)
+    return UtilizationSeries(
+        cluster_id=cluster_id,
+        step=step,
+        points=series_points(previous, rows, resolution=resolution, start=start, end=end),
+    )
+
+def _naive_utc(moment: datetime) -> datetime:
+    # Rollup buckets are stored as naive UTC, like every other timestamp
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
 
 @router.put("/{cluster_id}", response_model=Cluster)
 def update_cluster(
@@ -74,7 +193,7 @@ def update_cluster(
     db: Session = Depends(get_db),
     cluster_id: int,
     cluster_in: ClusterUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
     Update cluster.
@@ -90,5 +209,100 @@ def update_cluster(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to update this cluster",
         )
+    totals = (cluster_in.total_cpu, cluster_in.total_ram, cluster_in.total_gpu)
+    if cluster.node_count and totals != (cluster.total_cpu, cluster.total_ram, cluster.total_gpu):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="The capacity of a cluster with nodes is the sum of its nodes",
+        )
     cluster = cluster_service.update(db, db_obj=cluster, obj_in=cluster_in)
-    return cluster 
\ No newline at end of file
+    dispatch_event(db, cluster.id, SchedulerEvent.CLUSTER_RESIZE)
+    return cluster 
+
+@router.get("/{cluster_id}/nodes", response_model=List[Node])
+async def read_nodes(
+    *,
+    db: AsyncSession = Depends(get_async_read_db),
+    cluster_id: int,
+    current_user: Principal = Depends(get_current_user),
+) -> Any:
+    """
+    List the nodes of a cluster with their free capacity.
+    """
+    cluster = await async_cluster_service.get_owner(db, id=cluster_id)
+    if not cluster:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cluster not found",
+        )
+    if cluster.organization_id != current_user.organization_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this cluster",
+        )
+    return await async_node_service.get_multi_by_cluster(db, cluster_id=cluster_id)
+
+@router.post("/{cluster_id}/nodes", response_model=Node)
+def create_node(
+    *,
+    db: Session = Depends(get_db),
+    cluster_id: int,
+    node_in: NodeCreate,
+    current_user: Principal = Depends(get_current_user),
+) -> Any:
+    """
+    Add a node to a cluster.
+
+    The cluster's capacity becomes the sum of its nodes, and deployments are
+    placed on a single node each. The first node replaces the capacity the
+    cluster had as one pool, so it can only be added while nothing runs there.
+    """
+    cluster = cluster_service.get(db, id=cluster_id)
+    if not cluster:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cluster not found",
+        )
+    if cluster.organization_id != current_user.organization_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to update this cluster",
+        )
+    if not cluster.node_count and node_service.has_running(db, cluster_id=cluster.id):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="A cluster with running deployments cannot be split into nodes",
+        )
+    node = node_service.create(db, cluster=cluster, obj_in=node_in)
+    dispatch_event(db, cluster_id, SchedulerEvent.CLUSTER_RESIZE)
+    return node
+
+@router.delete("/{cluster_id}/nodes/{node_id}", response_model=Node)
+def delete_node(
+    *,
+    db: Session = Depends(get_db),
+    cluster_id: int,
+    node_id: int,
+    current_user: Principal = Depends(get_current_user),
+) -> Any:
+    """
+    Remove a node and its capacity from a cluster.
+    """
+    node = node_service.get(db, id=node_id)
+    if not node or node.cluster_id != cluster_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Node not found",
+        )
+    cluster = cluster_service.get(db, id=cluster_id)
+    if cluster.organization_id != current_user.organization_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to update this cluster",
+        )
+    if node_service.has_running(db, cluster_id=cluster_id, node_id=node.id):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Deployments are running on this node",
+        )
+    return node_service.remove(db, cluster=cluster, db_obj=node)
@@ -1,13 +1,35 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Any, Dict, List, Optional, Set
+import logging
+import math
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response, status
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 
+from app.core.config import settings
 from app.db.base import get_db
-from app.schemas.deployment import Deployment, DeploymentCreate, DeploymentUpdate
-from app.services.deployment import deployment_service
-from app.services.scheduler import SchedulerService
+from app.schemas.deployment import (
+    Deployment,
+    DeploymentBatchResult,
+    DeploymentCreate,
+    DeploymentGroup,
+    DeploymentGroupCreate,
+    DeploymentUpdate,
+    PreemptionPlan,
+)
+from app.services.cluster import cluster_service
+from app.services.deployment import async_deployment_service, deployment_service
+from app.services.placement import placement_service
+from app.services.scheduler import SchedulerEvent, SchedulerService
+from app.services.scheduler_loop import SchedulerQueueFull, dispatch_event, scheduler_loop
 from app.core.auth import get_current_user
-from app.db.models import User, Cluster, DeploymentStatus
+from app.db.replicas import get_async_read_db
+from app.core.principal_cache import Principal
+from app.db.models import Cluster, DeploymentStatus
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -16,29 +38,65 @@ def create_deployment(
     *,
     db: Session = Depends(get_db),
     deployment_in: DeploymentCreate,
-    current_user: User = Depends(get_current_user),
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
     Create new deployment.
+
+    Without a cluster_id the deployment is placed on the best-fitting cluster in
+    the user's organization. With the background scheduler enabled it is returned
+    as PENDING with 202 Accepted and scheduled on the next tick.
     """
-    # Verify cluster belongs to user's organization
-    cluster = db.query(Cluster).filter(Cluster.id == deployment_in.cluster_id).first()
-    if not cluster:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Cluster not found",
-        )
-    if cluster.organization_id != current_user.organization_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized to deploy to this cluster",
+    if deployment_in.cluster_id is None:
+        # Automatic placement across the organization's clusters
+        cluster_id = placement_service.place(
+            db,
+            organization_id=current_user.organization_id,
+            requirements=(
+                deployment_in.required_cpu,
+                deployment_in.required_ram,
+                deployment_in.required_gpu,
+            ),
         )
+        if cluster_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="No cluster in the organization can fit this deployment",
+            )
+        deployment_in.cluster_id = cluster_id
+    else:
+        # Verify cluster belongs to user's organization
+        cluster = cluster_service.get_owner(db, id=deployment_in.cluster_id)
+        if not cluster:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Cluster not found",
+            )
+        if cluster.organization_id != current_user.organization_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not authorized to deploy to this cluster",
+            )
     
     # Create deployment
     deployment = deployment_service.create(
         db, obj_in=deployment_in, user_id=current_user.id
     )
     
+    if settings.SCHEDULER_LOOP_ENABLED and scheduler_loop.running:
+        try:
+            scheduler_loop.submit(deployment)
+        except SchedulerQueueFull:
+            deployment_service.delete(db, id=deployment.id)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Scheduler queue is full, retry later",
+                headers={"Retry-After": str(math.ceil(settings.SCHEDULER_TICK_INTERVAL))},
+            )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return deployment
+
     # Try to schedule the deployment
     scheduler = SchedulerService(db)
     if not scheduler.schedule_deployment(deployment):
@@ -48,32 +106,288 @@ def create_deployment(
     
     return deployment
 
-@router.get("/", response_model=List[Deployment])
-def read_deployments(
+@router.post("/batch", response_model=List[DeploymentBatchResult])
+def create_deployments_batch(
+    *,
     db: Session = Depends(get_db),
-    skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(get_current_user),
+    items_in: List[Any] = Body(...),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
-    Retrieve deployments for the user's organization.
+    Create many deployments and schedule them together.
+
+    Each cluster is authorized once, all rows are inserted with one INSERT and every
+    cluster touched gets a single packing and fairness pass. Every item reports its
+    own status_code; items that fail, including ones that do not validate, do not
+    stop the rest of the batch. Items created on a cluster whose pass failed are
+    reported with scheduled=false and stay queued.
     """
-    deployments = deployment_service.get_multi_by_organization(
-        db, organization_id=current_user.organization_id, skip=skip, limit=limit
+    if len(items_in) > settings.DEPLOYMENT_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.DEPLOYMENT_BATCH_MAX_SIZE} deployments per batch",
+        )
+
+    results: List[Optional[DeploymentBatchResult]] = [None] * len(items_in)
+
+    def reject(index: int, status_code: int, detail: str) -> None:
+        results[index] = DeploymentBatchResult(index=index, status_code=status_code, detail=detail)
+
+    # Validate item by item, so one malformed item only rejects itself
+    deployments_in: Dict[int, DeploymentCreate] = {}
+    for index, item in enumerate(items_in):
+        try:
+            deployments_in[index] = DeploymentCreate.model_validate(item)
+        except ValidationError as exc:
+            reject(index, status.HTTP_422_UNPROCESSABLE_ENTITY, _validation_detail(exc))
+
+    # Automatic placement for items without a cluster_id, with one cluster query
+    unplaced = [index for index, item in deployments_in.items() if item.cluster_id is None]
+    placements = placement_service.place_many(
+        db,
+        organization_id=current_user.organization_id,
+        requirements=[
+            (deployments_in[index].required_cpu, deployments_in[index].required_ram, deployments_in[index].required_gpu)
+            for index in unplaced
+        ],
+    ) if unplaced else []
+    for index, cluster_id in zip(unplaced, placements):
+        if cluster_id is None:
+            reject(index, status.HTTP_422_UNPROCESSABLE_ENTITY, "No cluster in the organization can fit this deployment")
+        else:
+            deployments_in[index].cluster_id = cluster_id
+
+    # Verify each explicitly requested cluster belongs to the user's organization, once
+    placed = set(unplaced)
+    requested = {item.cluster_id for index, item in deployments_in.items() if index not in placed}
+    owners = dict(
+        db.query(Cluster.id, Cluster.organization_id).filter(Cluster.id.in_(requested)).all()
+    ) if requested else {}
+    for index, item in deployments_in.items():
+        if index in placed:
+            continue
+        if item.cluster_id not in owners:
+            reject(index, status.HTTP_404_NOT_FOUND, "Cluster not found")
+        elif owners[item.cluster_id] != current_user.organization_id:
+            reject(index, status.HTTP_403_FORBIDDEN, "Not authorized to deploy to this cluster")
+
+    accepted = [index for index, result in enumerate(results) if result is None]
+    use_loop = settings.SCHEDULER_LOOP_ENABLED and scheduler_loop.running
+    inserted = deployment_service.create_many(
+        db,
+        objs_in=[deployments_in[index] for index in accepted],
+        user_id=current_user.id,
+        status=DeploymentStatus.PENDING if use_loop else DeploymentStatus.QUEUED,
     )
+    # Keep the ids: after commit the instances are expired and reloaded in one query below
+    created_ids = {index: deployment.id for index, deployment in zip(accepted, inserted)}
+    db.commit()
+    created = _load_created(db, created_ids)
+
+    unscheduled: Set[int] = set()
+    if use_loop:
+        item_status = status.HTTP_202_ACCEPTED
+        rejected = []
+        for index, deployment in created.items():
+            try:
+                scheduler_loop.submit(deployment)
+            except SchedulerQueueFull:
+                rejected.append(index)
+        if rejected:
+            deployment_service.delete_many(db, ids=[created.pop(index).id for index in rejected])
+            db.commit()
+            for index in rejected:
+                reject(index, status.HTTP_503_SERVICE_UNAVAILABLE, "Scheduler queue is full, retry later")
+    else:
+        # One packing and fairness pass per cluster over everything queued there
+        item_status = status.HTTP_201_CREATED
+        scheduler = SchedulerService(db)
+        scheduler.sync_queue(created.values())
+        cluster_ids = {index: deployment.cluster_id for index, deployment in created.items()}
+        for cluster_id in sorted(set(cluster_ids.values())):
+            try:
+                scheduler.process_queue_batch(cluster_id)
+            except (StaleDataError, SQLAlchemyError):
+                # The rows are committed and queued, so the client must not retry them
+                db.rollback()
+                logger.warning("Scheduling pass failed for cluster %s", cluster_id, exc_info=True)
+                unscheduled.update(index for index, value in cluster_ids.items() if value == cluster_id)
+
+    # Reload the created rows with their scheduled state
+    for index, deployment in _load_created(db, {index: created_ids[index] for index in created}).items():
+        results[index] = DeploymentBatchResult(
+            index=index,
+            status_code=item_status,
+            deployment=Deployment.model_validate(deployment),
+            scheduled=False if index in unscheduled else None,
+            detail="Created but not scheduled yet, it stays queued" if index in unscheduled else None,
+        )
+    return results
+
+def _validation_detail(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'item'}: {error['msg']}" for error in exc.errors()
+    )
+
+def _load_created(db: Session, created_ids: Dict[int, int]) -> Dict[int, Any]:
+    # Batch item index -> deployment, fetched with a single SELECT
+    deployments = {
+        deployment.id: deployment
+        for deployment in deployment_service.get_many(db, ids=list(created_ids.values()))
+    }
+    return {index: deployments[deployment_id] for index, deployment_id in created_ids.items()}
+
+@router.post("/groups", response_model=DeploymentGroup)
+def create_deployment_group(
+    *,
+    db: Session = Depends(get_db),
+    group_in: DeploymentGroupCreate,
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
+) -> Any:
+    """
+    Create a group of deployments that must start together, e.g. the workers of
+    a distributed training job.
+
+    The scheduler starts every member at once or none of them, preempts the group
+    as a whole and fails it if it is still waiting after timeout_seconds. Without a
+    cluster_id the group is placed on a cluster that fits all members together.
+    """
+    if not 1 <= len(group_in.deployments) <= settings.DEPLOYMENT_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"A group has between 1 and {settings.DEPLOYMENT_BATCH_MAX_SIZE} deployments",
+        )
+
+    if group_in.cluster_id is None:
+        cluster_id = placement_service.place(
+            db,
+            organization_id=current_user.organization_id,
+            requirements=(
+                sum(member.required_cpu for member in group_in.deployments),
+                sum(member.required_ram for member in group_in.deployments),
+                sum(member.required_gpu for member in group_in.deployments),
+            ),
+        )
+        if cluster_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="No cluster in the organization can fit this group",
+            )
+        group_in.cluster_id = cluster_id
+    else:
+        cluster = cluster_service.get_owner(db, id=group_in.cluster_id)
+        if not cluster:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Cluster not found",
+            )
+        if cluster.organization_id != current_user.organization_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not authorized to deploy to this cluster",
+            )
+
+    use_loop = settings.SCHEDULER_LOOP_ENABLED and scheduler_loop.running
+    group, _ = deployment_service.create_group(
+        db,
+        obj_in=group_in,
+        user_id=current_user.id,
+        status=DeploymentStatus.PENDING if use_loop else DeploymentStatus.QUEUED,
+    )
+    group_id = group.id
+    db.commit()
+    # Reload the expired group and its members in two statements
+    deployments = deployment_service.get_group(db, id=group_id).deployments
+
+    if use_loop:
+        try:
+            # The first member the loop picks up starts the whole group
+            for deployment in deployments:
+                scheduler_loop.submit(deployment)
+        except SchedulerQueueFull:
+            deployment_service.delete_group(db, id=group_id)
+            db.commit()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Scheduler queue is full, retry later",
+                headers={"Retry-After": str(math.ceil(settings.SCHEDULER_TICK_INTERVAL))},
+            )
+        response.status_code = status.HTTP_202_ACCEPTED
+    else:
+        scheduler = SchedulerService(db)
+        scheduler.sync_queue(deployments)
+        scheduler.process_queue_batch(group_in.cluster_id)
+
+    return deployment_service.get_group(db, id=group_id)
+
+@router.get("/groups/{group_id}", response_model=DeploymentGroup)
+async def read_deployment_group(
+    *,
+    db: AsyncSession = Depends(get_async_read_db),
+    group_id: int,
+    current_user: Principal = Depends(get_current_user),
+) -> Any:
+    """
+    Get a deployment group and its members.
+    """
+    group = await async_deployment_service.get_group(db, id=group_id)
+    if not group:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Deployment group not found",
+        )
+    if group.cluster.organization_id != current_user.organization_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this deployment group",
+        )
+    return group
+
+@router.get("/", response_model=List[Deployment])
+async def read_deployments(
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    status_filter: Optional[DeploymentStatus] = Query(None, alias="status"),
+    cluster_id: Optional[int] = None,
+    current_user: Principal = Depends(get_current_user),
+) -> Any:
+    """
+    Retrieve deployments for the user's organization, newest first.
+
+    Pass the X-Next-Cursor response header back as cursor to get the next page.
+    """
+    try:
+        deployments, next_cursor = await async_deployment_service.get_multi_by_organization(
+            db,
+            organization_id=current_user.organization_id,
+            limit=limit,
+            cursor=cursor,
+            status=status_filter,
+            cluster_id=cluster_id,
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return deployments
 
 @router.get("/{deployment_id}", response_model=Deployment)
-def read_deployment(
+async def read_deployment(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     deployment_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
     Get deployment by ID.
     """
-    deployment = deployment_service.get(db, id=deployment_id)
+    deployment = await async_deployment_service.get(db, id=deployment_id)
     if not deployment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -86,18 +400,41 @@ def read_deployment(
         )
     return deployment
 
+@router.get("/{deployment_id}/preemption-plan", response_model=PreemptionPlan)
+def read_preemption_plan(
+    *,
+    db: Session = Depends(get_db),
+    deployment_id: int,
+    current_user: Principal = Depends(get_current_user),
+) -> Any:
+    """
+    Dry run: which running deployments would be evicted to start this one.
+    """
+    deployment = deployment_service.get_with_cluster(db, id=deployment_id, owner_only=True)
+    if not deployment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Deployment not found",
+        )
+    if deployment.cluster.organization_id != current_user.organization_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this deployment",
+        )
+    return SchedulerService(db).plan_preemption(deployment)
+
 @router.put("/{deployment_id}", response_model=Deployment)
 def update_deployment(
     *,
     db: Session = Depends(get_db),
     deployment_id: int,
     deployment_in: DeploymentUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
     Update deployment.
     """
-    deployment = deployment_service.get(db, id=deployment_id)
+    deployment = deployment_service.get_with_cluster(db, id=deployment_id, owner_only=True)
     if not deployment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -109,12 +446,33 @@ def update_deployment(
             detail="Not authorized to update this deployment",
         )
     
-    # If priority is being updated, we need to reschedule
-    if deployment_in.priority != deployment.priority:
-        scheduler = SchedulerService(db)
-        scheduler.process_queue(deployment.cluster_id)
-    
+    priority_changed = deployment_in.priority != deployment.priority
+    was_running = deployment.status == DeploymentStatus.RUNNING
+
+    # Completion or failure releases resources in the same transaction as the status change
+    if (
+        deployment_in.status in (DeploymentStatus.COMPLETED, DeploymentStatus.FAILED)
+        and deployment_in.status != deployment.status
+    ):
+        SchedulerService(db).finish_deployment(deployment, deployment_in.status)
+
     deployment = deployment_service.update(db, db_obj=deployment, obj_in=deployment_in)
+
+    if was_running and deployment.status in (DeploymentStatus.COMPLETED, DeploymentStatus.FAILED):
+        event = (
+            SchedulerEvent.COMPLETION
+            if deployment.status == DeploymentStatus.COMPLETED
+            else SchedulerEvent.FAILURE
+        )
+        dispatch_event(db, deployment.cluster_id, event)
+
+    # If priority was updated, reschedule the cluster's queue in one transaction
+    if priority_changed:
+        scheduler = SchedulerService(db)
+        scheduler.sync_queue([deployment])
+        scheduler.process_queue_batch(deployment.cluster_id)
+        db.refresh(deployment)
+
     return deployment
 
 @router.delete("/{deployment_id}", response_model=Deployment)
@@ -122,12 +480,13 @@ def delete_deployment(
     *,
     db: Session = Depends(get_db),
     deployment_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
     Delete a deployment.
     """
-    deployment = deployment_service.get(db, id=deployment_id)
+    # The full cluster: a running deployment's resources are released to it
+    deployment = deployment_service.get_with_cluster(db, id=deployment_id)
     if not deployment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -140,9 +499,14 @@ def delete_deployment(
         )
     
     # If deployment is running, release its resources
-    if deployment.status == DeploymentStatus.RUNNING:
+    released = deployment.status == DeploymentStatus.RUNNING
+    if released:
         scheduler = SchedulerService(db)
         scheduler.release_resources(deployment.cluster, deployment)
     
-    deployment = deployment_service.delete(db, id=deployment_id)
+    cluster_id = deployment.cluster_id
+    deployment = deployment_service.remove(db, db_obj=deployment)
+
+    if released:
+        dispatch_event(db, cluster_id, SchedulerEvent.RELEASE)
     return deployment 
\ No newline at end of file
@@ -1,105 +1,144 @@
-from typing import Any, List
+from typing import Any, List, Optional
+import hashlib
 import secrets
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.base import get_db
+from app.db.base import get_async_db
 from app.schemas.organization import Organization, OrganizationCreate, OrganizationUpdate
-from app.services.organization import organization_service
+from app.services.organization import async_organization_service
 from app.core.auth import get_current_user
-from app.db.models import User
+from app.db.replicas import get_async_read_db
+from app.core.principal_cache import Principal
+from app.core.response_cache import cached_response, conditional_response, etag_matches, not_modified
+from app.services.user import async_user_service
 
 router = APIRouter()
 
+def organization_etag(organization_id: int, version: int) -> str:
+    """Changes whenever the organization's version does, which covers its users."""
+    return '"' + hashlib.sha1(f"organization:{organization_id}:{version}".encode()).hexdigest() + '"'
+
 @router.post("/", response_model=Organization)
-def create_organization(
+async def create_organization(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     organization_in: OrganizationCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
     Create new organization.
     """
     # Generate a unique invite code
     invite_code = secrets.token_urlsafe(8)
-    organization = organization_service.create(
+    organization = await async_organization_service.create(
         db, obj_in=organization_in, invite_code=invite_code
     )
     return organization
 
 @router.get("/", response_model=List[Organization])
-def read_organizations(
-    db: Session = Depends(get_db),
-    skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(get_current_user),
+async def read_organizations(
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
-    Retrieve organizations.
+    Retrieve organizations, newest first.
+
+    Pass the X-Next-Cursor response header back as cursor to get the next page.
     """
-    organizations = organization_service.get_multi(db, skip=skip, limit=limit)
+    try:
+        organizations, next_cursor = await async_organization_service.get_multi(
+            db, limit=limit, cursor=cursor
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return organizations
 
 @router.get("/{organization_id}", response_model=Organization)
-def read_organization(
+async def read_organization(
     *,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_read_db),
     organization_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
     Get organization by ID.
+
+    Answers 304 when If-None-Match carries the current ETag.
     """
-    organization = organization_service.get(db, id=organization_id)
+    key = ("organization", organization_id)
+    cached = cached_response(request, "organization", key)
+    if cached is not None:
+        return cached
+    if request.headers.get("if-none-match"):
+        # A revalidation is answered from the version alone, without loading the users
+        version = await async_organization_service.get_version(db, id=organization_id)
+        if version is not None and etag_matches(request, organization_etag(organization_id, version)):
+            return not_modified("organization", organization_etag(organization_id, version))
+    organization = await async_organization_service.get(db, id=organization_id)
     if not organization:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Organization not found",
         )
-    return organization
+    return conditional_response(
+        request,
+        "organization",
+        organization_etag(organization.id, organization.version),
+        lambda: Organization.model_validate(organization).model_dump_json().encode(),
+        key=key,
+        tags=[key],
+    )
 
 @router.put("/{organization_id}", response_model=Organization)
-def update_organization(
+async def update_organization(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     organization_id: int,
     organization_in: OrganizationUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
     Update organization.
     """
-    organization = organization_service.get(db, id=organization_id)
+    organization = await async_organization_service.get(db, id=organization_id)
     if not organization:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Organization not found",
         )
-    organization = organization_service.update(db, db_obj=organization, obj_in=organization_in)
+    organization = await async_organization_service.update(db, db_obj=organization, obj_in=organization_in)
     return organization
 
 @router.post("/join/{invite_code}", response_model=Organization)
-def join_organization(
+async def join_organization(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     invite_code: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> Any:
     """
     Join organization using invite code.
     """
-    organization = organization_service.get_by_invite_code(db, invite_code=invite_code)
+    organization = await async_organization_service.get_by_invite_code(db, invite_code=invite_code)
     if not organization:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid invite code",
         )
     
-    # Add user to organization
-    current_user.organization_id = organization.id
-    db.add(current_user)
-    db.commit()
-    db.refresh(current_user)
+    # Add user to organization; current_user is a cached principal, not the row
+    user = await async_user_service.get(db, id=current_user.id)
+    await async_user_service.join_organization(db, db_obj=user, organization_id=organization.id)
+    await db.refresh(organization, attribute_names=["users"])
     
     return organization 
\ No newline at end of file
@@ -1,19 +1,25 @@
-from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.db.base import get_db
-from app.services.user import user_service
+from app.core.principal_cache import Principal, principal_cache
+from app.db.base import get_async_db
+from app.services.user import async_user_service
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
-def get_current_user(
-    db: Session = Depends(get_db),
+async def get_current_user(
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(oauth2_scheme)
-) -> Optional[dict]:
+) -> Principal:
+    """Resolve the bearer token to a Principal, from the cache when possible."""
+    if settings.AUTH_CACHE_ENABLED:
+        cached = principal_cache.get(token)
+        if cached is not None:
+            return cached[1]
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -29,7 +35,11 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = user_service.get(db, id=int(user_id))
+    user = await async_user_service.get(db, id=int(user_id))
     if user is None:
         raise credentials_exception
-    return user 
\ No newline at end of file
+    principal = Principal.from_user(user)
+    if settings.AUTH_CACHE_ENABLED:
+        principal_cache.put(token, payload, principal)
+    return principal
+ 
\ No newline at end of file
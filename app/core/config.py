@@ -1,4 +1,4 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 from pydantic import PostgresDsn, validator
 from pydantic_settings import BaseSettings
 
@@ -24,12 +24,91 @@ class Settings(BaseSettings):
             path=values.get('POSTGRES_DB') or '',
         )
 
+    # Defaults to SQLALCHEMY_DATABASE_URI through its asyncio driver (asyncpg, aiosqlite)
+    ASYNC_SQLALCHEMY_DATABASE_URI: Optional[str] = None
+
+    # Connection pools, see app/db/pool.py
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    # Seconds before a connection is replaced, -1 keeps connections forever
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Behind pgbouncer in transaction mode: no prepared statement caching
+    DB_PGBOUNCER: bool = False
+    # Open a connection per checkout and leave pooling to pgbouncer
+    DB_NULL_POOL: bool = False
+
+    # Read replicas for read-only endpoints, see app/db/replicas.py
+    READ_REPLICA_URLS: List[str] = []
+    # Replicas further behind than this many seconds are skipped
+    REPLICA_MAX_LAG: float = 5.0
+    REPLICA_LAG_CHECK_INTERVAL: float = 2.0
+    # Seconds a client's reads stay on the primary after it writes
+    READ_YOUR_WRITES_WINDOW: float = 5.0
+    # Bearer tokens remembered per worker for clients that do not keep cookies
+    READ_YOUR_WRITES_MAX_TOKENS: int = 10000
+
     REDIS_URL: str = "redis://localhost:6379/0"
     
     SECRET_KEY: str = "your-secret-key-here"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # bcrypt cost; hashes with any other cost are rehashed on the next login
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    # Processes doing bcrypt for login/register, 0 hashes on the threadpool instead
+    PASSWORD_HASH_WORKERS: int = 2
+    # bcrypt jobs submitted to the pool at once, the rest wait on the event loop
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    # In-process cache of authenticated principals, see app/core/principal_cache.py
+    AUTH_CACHE_ENABLED: bool = True
+    AUTH_CACHE_TTL: float = 30.0
+    AUTH_CACHE_MAX_SIZE: int = 10000
+    # Broadcast invalidations to other workers over Redis pub/sub
+    AUTH_CACHE_REDIS_INVALIDATION: bool = False
+    # Serialized cluster and organization reads, see app/core/response_cache.py
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_TTL: float = 2.0
+    RESPONSE_CACHE_MAX_SIZE: int = 10000
     DEBUG: bool = False
+    METRICS_ENABLED: bool = True
+
+    # Scheduler
+    SCHEDULER_CONFLICT_RETRIES: int = 3
+    SCHEDULER_RETRY_BACKOFF: float = 0.05
+    SCHEDULER_LOOP_ENABLED: bool = True
+    SCHEDULER_TICK_INTERVAL: float = 1.0
+    SCHEDULER_MAX_QUEUE_DEPTH: int = 1000
+    SCHEDULER_REDIS_QUEUE_ENABLED: bool = False
+    # "drf" (dominant resource fairness) or "round_robin"
+    SCHEDULER_FAIRNESS_POLICY: str = "drf"
+    SCHEDULER_INCREMENTAL_CANDIDATES: int = 32
+    # See app/services/packing.py: density, best_fit_decreasing, dot_product or dominant_share
+    SCHEDULER_PACKING_STRATEGY: str = "density"
+    # Automatic cluster placement: "best_fit" or "least_loaded"
+    SCHEDULER_PLACEMENT_POLICY: str = "best_fit"
+    # Eviction cost: "priority" (sum of priority + 1) or "resources" (normalized footprint)
+    SCHEDULER_PREEMPTION_COST: str = "priority"
+    SCHEDULER_PREEMPTION_EXACT_LIMIT: int = 24
+    SCHEDULER_PREEMPTION_TIME_BUDGET: float = 0.01
+    # Seconds a deployment group may wait to start before it is failed, unless it sets its own
+    SCHEDULER_GANG_TIMEOUT: float = 600.0
+    # EASY backfilling around the highest-priority blocked deployment, see app/services/backfill.py
+    SCHEDULER_BACKFILL_ENABLED: bool = True
+    # Largest array accepted by POST /deployments/batch
+    DEPLOYMENT_BATCH_MAX_SIZE: int = 500
+
+    # Cluster utilization history, see app/services/utilization.py
+    UTILIZATION_ENABLED: bool = True
+    # Snapshots are coalesced per cluster and written once per interval
+    UTILIZATION_FLUSH_INTERVAL: float = 10.0
+    UTILIZATION_PRUNE_INTERVAL: float = 3600.0
+    # Days kept for the 1-minute, 1-hour and 1-day rollups
+    UTILIZATION_RETENTION_MINUTE_DAYS: int = 2
+    UTILIZATION_RETENTION_HOUR_DAYS: int = 90
+    UTILIZATION_RETENTION_DAY_DAYS: int = 1825
+    # Most points GET /clusters/{id}/utilization returns
+    UTILIZATION_MAX_POINTS: int = 1440
 
     class Config:
         case_sensitive = True
@@ -0,0 +1,269 @@
+"""Prometheus metrics.
+
+Hot paths only touch pre-bound histogram/counter children. Per-cluster capacity
+and queue gauges are computed by a collector when /metrics is scraped, so they
+cost nothing between scrapes.
+"""
+import functools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import REGISTRY
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable)
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+SCHEDULER_LATENCY = Histogram(
+    "scheduler_operation_seconds",
+    "Time spent in SchedulerService operations",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+SCHEDULER_PREEMPTIONS = Counter(
+    "scheduler_preemptions_total",
+    "Running deployments evicted to make room for higher-priority work",
+)
+SCHEDULER_GANG_TIMEOUTS = Counter(
+    "scheduler_gang_timeouts_total",
+    "Deployment groups failed for waiting longer than their timeout to start",
+)
+SCHEDULER_BACKFILLS = Counter(
+    "scheduler_backfills_total",
+    "Deployments started ahead of a blocked deployment's reservation",
+)
+SCHEDULER_EVENTS = Counter(
+    "scheduler_events_total",
+    "Capacity events handled by the scheduler",
+    ["event"],
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_DB_TIME = Histogram(
+    "http_request_db_seconds",
+    "Time spent executing SQL per HTTP request",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_STATEMENT_LATENCY = Histogram(
+    "db_statement_seconds",
+    "SQL statement execution time",
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection, including opening a new one",
+    ["engine"],
+    buckets=LATENCY_BUCKETS + (10.0, 30.0),
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total",
+    "Checkouts that gave up after DB_POOL_TIMEOUT",
+    ["engine"],
+)
+DB_READ_ROUTING = Counter(
+    "db_read_routing_total",
+    "Read-only sessions by target engine and why it was chosen",
+    ["engine", "reason"],
+)
+HTTP_CONDITIONAL_READS = Counter(
+    "http_conditional_reads_total",
+    "Cacheable reads by outcome: hit, miss or not_modified",
+    ["resource", "result"],
+)
+
+# Mutable accumulator for the current request; copied into threadpool workers with the context
+_request_db_time: ContextVar[Optional[List[float]]] = ContextVar("request_db_time", default=None)
+
+def timed(operation: str) -> Callable[[F], F]:
+    """Record the wrapped scheduler method's duration under the given operation label."""
+    histogram = SCHEDULER_LATENCY.labels(operation)
+
+    def decorator(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+
+    return decorator
+
+def instrument_engine(engine: Engine) -> None:
+    """Time every statement and add it to the current request's DB time."""
+    observe = DB_STATEMENT_LATENCY.observe
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        observe(elapsed)
+        accumulator = _request_db_time.get()
+        if accumulator is not None:
+            accumulator[0] += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        # after_cursor_execute never runs for a failed statement, so drop its start time here
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts and context.execution_context is not None:
+            starts.pop()
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and DB time per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        accumulator = [0.0]
+        token = _request_db_time.set(accumulator)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_db_time.reset(token)
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners cannot blow up cardinality
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            HTTP_LATENCY.labels(method, path, str(status_code)).observe(elapsed)
+            HTTP_DB_TIME.labels(method, path).observe(accumulator[0])
+
+class ClusterCollector:
+    """Per-cluster capacity and queue depth, read from the database at scrape time."""
+
+    def __init__(self, session_factory, scheduler_loop=None):
+        self.session_factory = session_factory
+        self.scheduler_loop = scheduler_loop
+
+    def _families(self):
+        return (
+            GaugeMetricFamily(
+                "cluster_resource_total", "Cluster capacity", labels=["cluster", "resource"]
+            ),
+            GaugeMetricFamily(
+                "cluster_resource_allocated", "Cluster capacity in use", labels=["cluster", "resource"]
+            ),
+            GaugeMetricFamily(
+                "cluster_queue_depth", "QUEUED deployments per cluster", labels=["cluster"]
+            ),
+            GaugeMetricFamily(
+                "scheduler_loop_depth", "Deployments waiting for the background scheduler loop"
+            ),
+        )
+
+    def describe(self):
+        # Keeps registration from running collect(), which would query the database
+        return list(self._families())
+
+    def collect(self):
+        # Imported here: app.db.models can only be imported after app.db.base
+        from app.db.models import Cluster, Deployment, DeploymentStatus
+
+        total, allocated, queued, loop_depth = self._families()
+        db = self.session_factory()
+        try:
+            for row in db.query(
+                Cluster.id,
+                Cluster.total_cpu, Cluster.total_ram, Cluster.total_gpu,
+                Cluster.available_cpu, Cluster.available_ram, Cluster.available_gpu,
+            ):
+                cluster = str(row[0])
+                for resource, capacity, available in zip(("cpu", "ram", "gpu"), row[1:4], row[4:7]):
+                    total.add_metric([cluster, resource], capacity or 0)
+                    allocated.add_metric([cluster, resource], (capacity or 0) - (available or 0))
+            for cluster_id, depth in (
+                db.query(Deployment.cluster_id, func.count(Deployment.id))
+                .filter(Deployment.status == DeploymentStatus.QUEUED)
+                .group_by(Deployment.cluster_id)
+            ):
+                queued.add_metric([str(cluster_id)], depth)
+        except Exception:
+            # A database outage should not take the rest of /metrics down with it
+            logger.warning("Could not collect cluster metrics", exc_info=True)
+        else:
+            yield total
+            yield allocated
+            yield queued
+        finally:
+            db.close()
+
+        if self.scheduler_loop is not None:
+            loop_depth.add_metric([], self.scheduler_loop.depth())
+            yield loop_depth
+
+class PoolCollector:
+    """Connections in use and saturation of each engine's pool, read at scrape time."""
+
+    def __init__(self, engines: Dict[str, Engine]):
+        self.engines = engines
+
+    def _families(self):
+        return (
+            GaugeMetricFamily(
+                "db_pool_connections_in_use", "Connections checked out of the pool", labels=["engine"]
+            ),
+            GaugeMetricFamily(
+                "db_pool_capacity", "pool_size + max_overflow", labels=["engine"]
+            ),
+            GaugeMetricFamily(
+                "db_pool_saturation", "Fraction of the pool's capacity checked out", labels=["engine"]
+            ),
+        )
+
+    def describe(self):
+        return list(self._families())
+
+    def collect(self):
+        in_use, capacity, saturation = self._families()
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            # NullPool (pgbouncer mode) has no capacity to saturate
+            if not isinstance(pool, QueuePool):
+                continue
+            size = pool.size() + max(pool._max_overflow, 0)
+            in_use.add_metric([name], pool.checkedout())
+            capacity.add_metric([name], size)
+            saturation.add_metric([name], pool.checkedout() / size if size else 0.0)
+        yield in_use
+        yield capacity
+        yield saturation
+
+def register_collectors(
+    session_factory, scheduler_loop=None, engines: Optional[Dict[str, Engine]] = None
+) -> None:
+    REGISTRY.register(ClusterCollector(session_factory, scheduler_loop))
+    if engines:
+        REGISTRY.register(PoolCollector(engines))
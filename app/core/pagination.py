@@ -0,0 +1,54 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    """Opaque token for the position just after a row in (created_at, id) order."""
+    raw = json.dumps([created_at.isoformat(), id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError for anything it did not produce."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(id)
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+def keyset_paginate(
+    query: Query, model: Any, *, limit: int, cursor: Optional[str] = None
+) -> Tuple[List[Any], Optional[str]]:
+    """Newest-first page of query using (created_at, id) keyset pagination.
+
+    Returns the page and the cursor for the next one, or None on the last page.
+    Unlike OFFSET, the cost of a page does not grow with its depth, and the
+    order is stable because id breaks created_at ties.
+    """
+    if cursor is not None:
+        created_at, id = decode_cursor(cursor)
+        query = query.filter(tuple_(model.created_at, model.id) < tuple_(created_at, id))
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    return _page(rows, limit)
+
+async def keyset_paginate_async(
+    db: AsyncSession, statement: Select, model: Any, *, limit: int, cursor: Optional[str] = None
+) -> Tuple[List[Any], Optional[str]]:
+    """keyset_paginate for a select() statement on an AsyncSession."""
+    if cursor is not None:
+        created_at, id = decode_cursor(cursor)
+        statement = statement.where(tuple_(model.created_at, model.id) < tuple_(created_at, id))
+    statement = statement.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+    rows = list((await db.scalars(statement)).unique())
+    return _page(rows, limit)
+
+def _page(rows: List[Any], limit: int) -> Tuple[List[Any], Optional[str]]:
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(last.created_at, last.id)
@@ -0,0 +1,138 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set, Tuple
+
+import redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Principal:
+    """What request handlers need to know about the authenticated user."""
+    id: int
+    organization_id: Optional[int]
+    # A UserRole, which is a str enum
+    role: Optional[str]
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user: Any) -> "Principal":
+        return cls(
+            id=user.id,
+            organization_id=user.organization_id,
+            role=user.role,
+            is_active=bool(user.is_active),
+        )
+
+class PrincipalCache:
+    """Bounded TTL + LRU cache of bearer token -> (claims, principal).
+
+    Entries live for at most ttl seconds and never past the token's own expiry.
+    Handlers run on the threadpool, so every operation takes the lock.
+    """
+
+    def __init__(self, ttl: float = settings.AUTH_CACHE_TTL, max_size: int = settings.AUTH_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any], Principal]]" = OrderedDict()
+        self._tokens_by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Tuple[Dict[str, Any], Principal]]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, claims, principal = entry
+            if expires_at <= time.monotonic():
+                self._discard(token)
+                return None
+            self._entries.move_to_end(token)
+            return claims, principal
+
+    def put(self, token: str, claims: Dict[str, Any], principal: Principal) -> None:
+        expires_at = time.monotonic() + self.ttl
+        if "exp" in claims:
+            expires_at = min(expires_at, time.monotonic() + claims["exp"] - time.time())
+        with self._lock:
+            self._discard(token)
+            self._entries[token] = (expires_at, claims, principal)
+            self._tokens_by_user.setdefault(principal.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drop every cached token of a user in this process."""
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._discard(token)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _discard(self, token: str) -> None:
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        user_tokens = self._tokens_by_user.get(entry[2].id)
+        if user_tokens is not None:
+            user_tokens.discard(token)
+            if not user_tokens:
+                del self._tokens_by_user[entry[2].id]
+
+principal_cache = PrincipalCache()
+
+INVALIDATION_CHANNEL = "auth:principal:invalidate"
+
+_redis_client: Optional[redis.Redis] = None
+_listener: Optional[Any] = None
+
+def _get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis_client
+
+def invalidate_principal(user_id: int) -> None:
+    """Forget a user's cached principal here and, if enabled, in every other worker."""
+    principal_cache.invalidate_user(user_id)
+    if not settings.AUTH_CACHE_REDIS_INVALIDATION:
+        return
+    try:
+        _get_redis().publish(INVALIDATION_CHANNEL, user_id)
+    except redis.RedisError:
+        logger.warning("Could not publish principal invalidation, other workers expire it by TTL", exc_info=True)
+
+def _handle_invalidation(message: Dict[str, Any]) -> None:
+    try:
+        principal_cache.invalidate_user(int(message["data"]))
+    except (TypeError, ValueError):
+        logger.warning("Ignoring malformed principal invalidation %r", message.get("data"))
+
+def start_invalidation_listener() -> None:
+    """Startup hook: apply invalidations published by other workers."""
+    global _listener
+    if not settings.AUTH_CACHE_REDIS_INVALIDATION or _listener is not None:
+        return
+    try:
+        pubsub = _get_redis().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{INVALIDATION_CHANNEL: _handle_invalidation})
+        _listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+    except redis.RedisError:
+        logger.exception("Could not subscribe to principal invalidations, falling back to TTL expiry")
+
+def stop_invalidation_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
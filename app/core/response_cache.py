@@ -0,0 +1,202 @@
+"""Conditional GET and a short-TTL cache of serialized read responses.
+
+Cluster and organization responses carry an ETag built from the row's
+version, which every change to what the response shows bumps, so a poll with
+a matching If-None-Match gets 304 without the body being serialized again.
+
+With RESPONSE_CACHE_ENABLED the rendered bytes are also kept for
+RESPONSE_CACHE_TTL seconds and served, or answered with 304, without a query.
+Entries are tagged with the rows they were rendered from. Committing a change
+to those rows invalidates the tags in this process; other workers keep serving
+their copy for at most the TTL.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from fastapi import Request, Response, status
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, attributes
+from sqlalchemy.orm.base import PASSIVE_NO_INITIALIZE
+
+from app.core.config import settings
+from app.core.metrics import HTTP_CONDITIONAL_READS
+from app.db.models import Cluster, Organization, User
+
+# ("cluster", id) or ("organization", id)
+Tag = Tuple[str, int]
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    # Checked against the principal before the entry is served; None for public reads
+    organization_id: Optional[int] = None
+
+class ResponseCache:
+    """Bounded TTL + LRU cache of rendered responses, invalidated by tag.
+
+    Like PrincipalCache, every operation takes the lock.
+    """
+
+    def __init__(self, ttl: float = settings.RESPONSE_CACHE_TTL, max_size: int = settings.RESPONSE_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[float, CachedResponse, Set[Tag]]]" = OrderedDict()
+        self._keys_by_tag: Dict[Tag, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, response, _ = entry
+            if expires_at <= time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def put(self, key: Hashable, response: CachedResponse, tags: Iterable[Tag]) -> None:
+        tags = set(tags)
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + self.ttl, response, tags)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, tags: Iterable[Tag]) -> None:
+        with self._lock:
+            for tag in tags:
+                for key in list(self._keys_by_tag.get(tag, ())):
+                    self._discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+response_cache = ResponseCache()
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+def _headers(cached: CachedResponse) -> Dict[str, str]:
+    return {"ETag": cached.etag, "Cache-Control": "private, no-cache", **cached.headers}
+
+def not_modified(resource: str, etag: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    """304 for a request whose If-None-Match already matched etag."""
+    HTTP_CONDITIONAL_READS.labels(resource, "not_modified").inc()
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED, headers=_headers(CachedResponse(b"", etag, headers or {}))
+    )
+
+def _respond(request: Request, resource: str, cached: CachedResponse, result: str) -> Response:
+    if etag_matches(request, cached.etag):
+        return not_modified(resource, cached.etag, cached.headers)
+    headers = _headers(cached)
+    HTTP_CONDITIONAL_READS.labels(resource, result).inc()
+    return Response(cached.body, media_type="application/json", headers=headers)
+
+def cached_response(
+    request: Request, resource: str, key: Hashable, organization_id: Optional[int] = None
+) -> Optional[Response]:
+    """The cached response for key, or None to render it.
+
+    Entries owned by another organization are not served; the handler then
+    renders the request and rejects it as usual.
+    """
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return None
+    cached = response_cache.get(key)
+    if cached is None or cached.organization_id not in (None, organization_id):
+        return None
+    return _respond(request, resource, cached, "hit")
+
+def conditional_response(
+    request: Request,
+    resource: str,
+    etag: str,
+    render: Callable[[], bytes],
+    *,
+    key: Optional[Hashable] = None,
+    tags: Iterable[Tag] = (),
+    organization_id: Optional[int] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """304 if the client already has etag, else the rendered body, cached under key."""
+    if etag_matches(request, etag):
+        return not_modified(resource, etag, headers)
+    cached = CachedResponse(render(), etag, headers or {}, organization_id)
+    if settings.RESPONSE_CACHE_ENABLED and key is not None:
+        response_cache.put(key, cached, tags)
+    return _respond(request, resource, cached, "miss")
+
+PENDING_TAGS = "response_cache_tags"
+
+def mark_changed(session: Session, tags: Iterable[Tag]) -> None:
+    """Invalidate tags when session commits, for writes the ORM does not track."""
+    session.info.setdefault(PENDING_TAGS, set()).update(tags)
+
+def _tags_of(instance: object) -> Iterable[Tag]:
+    # Read loaded state only: a lazy load inside a flush fails under asyncio
+    state = inspect(instance)
+    if isinstance(instance, Cluster):
+        yield ("cluster", state.dict.get("id"))
+        yield ("organization", state.dict.get("organization_id"))
+    elif isinstance(instance, Organization):
+        yield ("organization", state.dict.get("id"))
+    elif isinstance(instance, User):
+        # An organization's response lists its users, before and after a move
+        history = attributes.get_history(instance, "organization_id", passive=PASSIVE_NO_INITIALIZE)
+        for organization_id in history.sum():
+            yield ("organization", organization_id)
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed(session: Session, flush_context) -> None:
+    mark_changed(
+        session,
+        (
+            tag
+            for instance in itertools.chain(session.new, session.dirty, session.deleted)
+            for tag in _tags_of(instance)
+            if tag[1] is not None
+        ),
+    )
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    tags = session.info.pop(PENDING_TAGS, None)
+    if tags:
+        response_cache.invalidate(tags)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session) -> None:
+    session.info.pop(PENDING_TAGS, None)
@@ -1,13 +1,23 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union
+from typing import Any, Callable, Optional, Tuple, TypeVar, Union
 from jose import jwt
 from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
 from app.core.config import settings
 
+T = TypeVar("T")
+
 pwd_context = CryptContext(
     schemes=["bcrypt"],
     deprecated="auto",
-    bcrypt__ident="2b"  # Explicitly set bcrypt version to 2b
+    bcrypt__ident="2b",  # Explicitly set bcrypt version to 2b
+    # Pinning min and max to the cost makes hashes of any other cost need an update
+    bcrypt__default_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
 )
 
 def create_access_token(
@@ -29,4 +39,51 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password) 
\ No newline at end of file
+    return pwd_context.hash(password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password and, if the hash uses another cost, return its replacement."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+# bcrypt is slow by design: on the request threadpool a login burst takes every slot,
+# so login and register hand it to a small process pool instead
+_hash_pool: Optional[ProcessPoolExecutor] = None
+_hash_slots: Optional[asyncio.Semaphore] = None
+
+def get_hash_pool() -> Optional[ProcessPoolExecutor]:
+    """Shared bcrypt process pool, or None when PASSWORD_HASH_WORKERS is 0."""
+    global _hash_pool
+    if settings.PASSWORD_HASH_WORKERS <= 0:
+        return None
+    if _hash_pool is None:
+        # spawn: forking a process that already runs threads is unsafe
+        _hash_pool = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _hash_pool
+
+def shutdown_hash_pool() -> None:
+    global _hash_pool, _hash_slots
+    if _hash_pool is not None:
+        _hash_pool.shutdown(cancel_futures=True)
+        _hash_pool = None
+    _hash_slots = None
+
+async def _run_hash_job(func: Callable[..., T], *args: Any) -> T:
+    global _hash_slots
+    pool = get_hash_pool()
+    if pool is None:
+        return await run_in_threadpool(func, *args)
+    if _hash_slots is None:
+        _hash_slots = asyncio.Semaphore(settings.PASSWORD_HASH_MAX_PENDING)
+    async with _hash_slots:
+        return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """verify_and_update_password on the bcrypt pool."""
+    return await _run_hash_job(verify_and_update_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the bcrypt pool."""
+    return await _run_hash_job(get_password_hash, password)
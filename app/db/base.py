@@ -1,16 +1,36 @@
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
 
 from app.core.config import settings
+from app.db.pool import engine_options
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+# asyncio drivers for the sync URL's backends
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def async_database_url(url: str) -> URL:
+    """The same database as a sync URL, addressed through its asyncio driver."""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI), **engine_options("primary"))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async endpoints; the sync engine stays for Alembic, the scheduler and tests
+async_engine = create_async_engine(
+    settings.ASYNC_SQLALCHEMY_DATABASE_URI
+    or async_database_url(str(settings.SQLALCHEMY_DATABASE_URI)),
+    **engine_options("primary_async", asyncio=True),
+)
+# Nothing may lazy-load after commit under asyncio, so keep committed state
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 # Import all models here for Alembic to detect them
-from app.db.models import User, Organization, Cluster, Deployment, UserRole, DeploymentStatus
+from app.db.models import User, Organization, Cluster, ClusterUtilization, Deployment, DeploymentGroup, Node, UserRole, DeploymentStatus
 
 # Dependency
 def get_db():
@@ -18,4 +38,8 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
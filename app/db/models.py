@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Enum
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Enum, Index, PrimaryKeyConstraint, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -35,10 +35,19 @@ class Organization(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     invite_code = Column(String, unique=True, index=True)
+    # Bumped on every write to the row and, by the user services, whenever a member
+    # joins, leaves or changes, so it covers the users listed with the organization
+    version = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime, default=datetime.utcnow)
     
     users = relationship("User", back_populates="organization")
     clusters = relationship("Cluster", back_populates="organization")
 
+    __mapper_args__ = {"version_id_col": version}
+    __table_args__ = (
+        Index("ix_organizations_created_at_id", "created_at", "id"),
+    )
+
 class Cluster(Base):
     __tablename__ = "clusters"
 
@@ -50,10 +59,67 @@ class Cluster(Base):
     available_cpu = Column(Float)
     available_ram = Column(Float)
     available_gpu = Column(Integer)
+    # Optimistic lock: bumped on every write, checked in the UPDATE's WHERE clause
+    version = Column(Integer, nullable=False, default=1)
+    # With nodes, the capacity columns above are the sums of the nodes' columns
+    node_count = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, default=datetime.utcnow)
     
     organization_id = Column(Integer, ForeignKey("organizations.id"))
     organization = relationship("Organization", back_populates="clusters")
     deployments = relationship("Deployment", back_populates="cluster")
+    nodes = relationship("Node", back_populates="cluster")
+
+    __mapper_args__ = {"version_id_col": version}
+    __table_args__ = (
+        Index("ix_clusters_organization_id_created_at_id", "organization_id", "created_at", "id"),
+    )
+
+class Node(Base):
+    """One machine of a cluster.
+
+    A deployment runs on a single node, so it fits a cluster with nodes only if
+    one of them has room for all of it. Node capacity only changes together with
+    the cluster's, so the cluster's version covers its nodes as well.
+    """
+    __tablename__ = "nodes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, index=True)
+    total_cpu = Column(Float, nullable=False)
+    total_ram = Column(Float, nullable=False)
+    total_gpu = Column(Integer, nullable=False)
+    available_cpu = Column(Float, nullable=False)
+    available_ram = Column(Float, nullable=False)
+    available_gpu = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    cluster_id = Column(Integer, ForeignKey("clusters.id"), nullable=False, index=True)
+    cluster = relationship("Cluster", back_populates="nodes")
+
+    deployments = relationship("Deployment", back_populates="node")
+
+class DeploymentGroup(Base):
+    """Deployments that must start together, such as the workers of a training job.
+
+    The scheduler starts a group's waiting members all at once or not at all, and
+    fails them if they are still waiting timeout_seconds after the group was
+    created or last preempted.
+    """
+    __tablename__ = "deployment_groups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, index=True)
+    timeout_seconds = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    cluster_id = Column(Integer, ForeignKey("clusters.id"))
+    cluster = relationship("Cluster")
+
+    user_id = Column(Integer, ForeignKey("users.id"))
+    user = relationship("User")
+
+    deployments = relationship("Deployment", back_populates="group")
 
 class Deployment(Base):
     __tablename__ = "deployments"
@@ -66,6 +132,8 @@ class Deployment(Base):
     required_cpu = Column(Float)
     required_ram = Column(Float)
     required_gpu = Column(Integer)
+    # Expected seconds from start to finish; lets the scheduler backfill around reservations
+    estimated_runtime = Column(Float, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
@@ -74,4 +142,81 @@ class Deployment(Base):
     cluster = relationship("Cluster", back_populates="deployments")
     
     user_id = Column(Integer, ForeignKey("users.id"))
-    user = relationship("User") 
\ No newline at end of file
+    user = relationship("User")
+
+    group_id = Column(Integer, ForeignKey("deployment_groups.id"), nullable=True, index=True)
+    group = relationship("DeploymentGroup", back_populates="deployments")
+
+    # Node the deployment runs on, while RUNNING on a cluster with nodes
+    node_id = Column(Integer, ForeignKey("nodes.id"), nullable=True, index=True)
+    node = relationship("Node", back_populates="deployments")
+
+    __table_args__ = (
+        # Keyset pagination on (created_at, id), optionally narrowed by cluster and status
+        Index("ix_deployments_created_at_id", "created_at", "id"),
+        Index("ix_deployments_cluster_id_created_at_id", "cluster_id", "created_at", "id"),
+        Index(
+            "ix_deployments_cluster_id_status_created_at_id",
+            "cluster_id", "status", "created_at", "id",
+        ),
+        # Scheduler lookups: by (cluster_id, status) ordered by priority, plus small
+        # partial indexes for the QUEUED and RUNNING sets it reads on every decision
+        Index("ix_deployments_cluster_id_status_priority", "cluster_id", "status", "priority"),
+        Index(
+            "ix_deployments_queued_cluster_id_priority",
+            "cluster_id", priority.desc(), "created_at",
+            postgresql_where=text("status = 'QUEUED'"),
+            sqlite_where=text("status = 'QUEUED'"),
+        ),
+        Index(
+            "ix_deployments_running_cluster_id_priority",
+            "cluster_id", "priority",
+            postgresql_where=text("status = 'RUNNING'"),
+            sqlite_where=text("status = 'RUNNING'"),
+        ),
+    ) 
+
+class ClusterUtilization(Base):
+    """Capacity in use on a cluster, rolled up into fixed buckets.
+
+    One row per cluster, resolution (bucket length in seconds) and bucket start.
+    Each coalesced snapshot adds a sample to the row of every resolution, and no
+    raw snapshots are stored. Usage holds from one sample to the next, so the
+    average is time-weighted: *_used_seconds integrates usage between the bucket's
+    first and last samples, and reads add the stretches before and after them.
+    """
+    __tablename__ = "cluster_utilization"
+
+    cluster_id = Column(Integer, ForeignKey("clusters.id"), nullable=False)
+    resolution = Column(Integer, nullable=False)
+    bucket = Column(DateTime, nullable=False)
+    samples = Column(Integer, nullable=False, default=0)
+    cpu_used_sum = Column(Float, nullable=False, default=0.0)
+    ram_used_sum = Column(Float, nullable=False, default=0.0)
+    gpu_used_sum = Column(Float, nullable=False, default=0.0)
+    cpu_used_max = Column(Float, nullable=False, default=0.0)
+    ram_used_max = Column(Float, nullable=False, default=0.0)
+    gpu_used_max = Column(Integer, nullable=False, default=0)
+    # State at the bucket's latest sample, carried forward across empty buckets
+    cpu_used_last = Column(Float, nullable=False, default=0.0)
+    ram_used_last = Column(Float, nullable=False, default=0.0)
+    gpu_used_last = Column(Integer, nullable=False, default=0)
+    total_cpu = Column(Float, nullable=False, default=0.0)
+    total_ram = Column(Float, nullable=False, default=0.0)
+    total_gpu = Column(Integer, nullable=False, default=0)
+    # Orders samples from several workers, so the latest one wins *_last
+    last_sampled_at = Column(DateTime, nullable=False)
+    # Usage x seconds between the first and the last sample
+    cpu_used_seconds = Column(Float, nullable=False, default=0.0)
+    ram_used_seconds = Column(Float, nullable=False, default=0.0)
+    gpu_used_seconds = Column(Float, nullable=False, default=0.0)
+    # Seconds from the bucket start to its first and last sample
+    first_sample_offset = Column(Float, nullable=False, default=0.0)
+    last_sample_offset = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        # Range reads for one cluster and resolution
+        PrimaryKeyConstraint("cluster_id", "resolution", "bucket"),
+        # Retention deletes by resolution and age
+        Index("ix_cluster_utilization_resolution_bucket", "resolution", "bucket"),
+    )
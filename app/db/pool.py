@@ -0,0 +1,66 @@
+"""Connection pool configuration and instrumentation.
+
+Every engine is built from the DB_* settings through engine_options(). Pools are
+named with pool_logging_name, which is also the "engine" label of the pool
+metrics and survives the pool being recreated after a dispose or invalidation.
+"""
+import time
+import uuid
+from typing import Any, Dict
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+from app.core.config import settings
+from app.core.metrics import DB_POOL_CHECKOUT_WAIT, DB_POOL_TIMEOUTS
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long checkouts wait and how often they time out."""
+
+    def _do_get(self):
+        label = self._orig_logging_name or "default"
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            DB_POOL_TIMEOUTS.labels(label).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(label).observe(time.perf_counter() - start)
+
+class TimedAsyncAdaptedQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """TimedQueuePool for asyncio engines."""
+
+def _pgbouncer_connect_args() -> Dict[str, Any]:
+    # pgbouncer in transaction mode hands each transaction to any server connection,
+    # so asyncpg must not cache prepared statements or reuse their names
+    return {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+    }
+
+def engine_options(name: str, *, asyncio: bool = False) -> Dict[str, Any]:
+    """create_engine / create_async_engine keyword arguments from the DB_* settings.
+
+    psycopg2 never uses server-side prepared statements, so DB_PGBOUNCER only
+    changes the asyncpg engine. DB_NULL_POOL opens a connection per checkout and
+    leaves pooling to pgbouncer.
+    """
+    options: Dict[str, Any] = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_logging_name": name,
+    }
+    if settings.DB_NULL_POOL:
+        options["poolclass"] = NullPool
+    else:
+        options.update(
+            poolclass=TimedAsyncAdaptedQueuePool if asyncio else TimedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    if settings.DB_PGBOUNCER and asyncio:
+        options["connect_args"] = _pgbouncer_connect_args()
+    return options
@@ -0,0 +1,204 @@
+"""Read-replica routing for read-only endpoints.
+
+Read handlers depend on get_async_read_db instead of get_async_db. With
+READ_REPLICA_URLS set, their session is bound to a replica unless
+
+* the client wrote within READ_YOUR_WRITES_WINDOW seconds, so it must see its
+  own write, or
+* every replica lags more than REPLICA_MAX_LAG seconds, or cannot be reached.
+
+In those cases, and without replicas, the session is on the primary.
+
+ReadYourWritesMiddleware marks a client that wrote with a cookie, and also
+remembers its bearer token for API clients that drop cookies. Tokens are kept
+per worker, so such a client is only pinned on the worker that took its write;
+across workers it can read data up to REPLICA_MAX_LAG seconds old.
+"""
+import itertools
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional
+
+from fastapi import Request
+from sqlalchemy import text
+from starlette.datastructures import Headers
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.core.metrics import DB_READ_ROUTING
+from app.db.base import AsyncSessionLocal, async_database_url
+from app.db.pool import engine_options
+
+logger = logging.getLogger(__name__)
+
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+# Zero when the replica has replayed everything it received, so an idle primary
+# does not look like lag
+LAG_QUERY = text(
+    "SELECT CASE"
+    " WHEN NOT pg_is_in_recovery() THEN 0"
+    " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+    " END"
+)
+
+class Replica:
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.sessionmaker = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        self.lag = 0.0
+        self.checked_at = -math.inf
+
+    async def current_lag(self, check_interval: float) -> float:
+        """Replication lag in seconds, re-measured at most every check_interval."""
+        now = time.monotonic()
+        if now - self.checked_at < check_interval:
+            return self.lag
+        # Claim the check first so concurrent requests keep using the last value
+        self.checked_at = now
+        try:
+            self.lag = await self._measure()
+        except Exception:
+            logger.warning("Could not read replication lag of %s", self.name, exc_info=True)
+            self.lag = math.inf
+        return self.lag
+
+    async def _measure(self) -> float:
+        if self.engine.dialect.name != "postgresql":
+            return 0.0
+        async with self.engine.connect() as conn:
+            return float(await conn.scalar(LAG_QUERY))
+
+class ReplicaRouter:
+    """Pick the sessionmaker for a read-only request."""
+
+    def __init__(
+        self,
+        urls: List[str],
+        max_lag: float = settings.REPLICA_MAX_LAG,
+        check_interval: float = settings.REPLICA_LAG_CHECK_INTERVAL,
+    ):
+        self.replicas = [
+            Replica(
+                f"replica{index}",
+                create_async_engine(
+                    async_database_url(url), **engine_options(f"replica{index}", asyncio=True)
+                ),
+            )
+            for index, url in enumerate(urls)
+        ]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._next = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def engines(self) -> Dict[str, Engine]:
+        return {replica.name: replica.engine.sync_engine for replica in self.replicas}
+
+    async def choose(self, sticky: bool = False) -> async_sessionmaker:
+        if not self.replicas:
+            return AsyncSessionLocal
+        if sticky:
+            DB_READ_ROUTING.labels("primary", "sticky").inc()
+            return AsyncSessionLocal
+        # Round-robin, skipping replicas that lag too far behind
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self._next)]
+            if await replica.current_lag(self.check_interval) <= self.max_lag:
+                DB_READ_ROUTING.labels(replica.name, "replica").inc()
+                return replica.sessionmaker
+        DB_READ_ROUTING.labels("primary", "lag").inc()
+        return AsyncSessionLocal
+
+replica_router = ReplicaRouter(settings.READ_REPLICA_URLS)
+
+class RecentWriters:
+    """Bounded map of Authorization header -> end of its read-your-writes window.
+
+    Only the middleware and the read dependency use it, both on the event loop,
+    so it needs no lock.
+    """
+
+    def __init__(self, max_size: int = settings.READ_YOUR_WRITES_MAX_TOKENS):
+        self.max_size = max_size
+        self._until: "OrderedDict[str, float]" = OrderedDict()
+
+    def mark(self, authorization: str, until: float) -> None:
+        self._until.pop(authorization, None)
+        self._until[authorization] = until
+        while len(self._until) > self.max_size:
+            self._until.popitem(last=False)
+
+    def wrote_recently(self, authorization: str) -> bool:
+        until = self._until.get(authorization)
+        if until is None:
+            return False
+        if until <= time.time():
+            del self._until[authorization]
+            return False
+        return True
+
+    def clear(self) -> None:
+        self._until.clear()
+
+    def __len__(self) -> int:
+        return len(self._until)
+
+recent_writers = RecentWriters()
+
+def wrote_recently(request: Request) -> bool:
+    authorization = request.headers.get("authorization")
+    if authorization and recent_writers.wrote_recently(authorization):
+        return True
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+async def get_async_read_db(request: Request) -> AsyncIterator[AsyncSession]:
+    """get_async_db for read-only handlers: a replica session when one is fresh enough."""
+    sessionmaker = await replica_router.choose(sticky=wrote_recently(request))
+    async with sessionmaker() as db:
+        yield db
+
+class ReadYourWritesMiddleware:
+    """After a successful write, pin the client's reads to the primary for a while.
+
+    Sets READ_PRIMARY_COOKIE to the end of the window on every 2xx/3xx response to
+    a method other than GET, HEAD or OPTIONS, and marks the request's bearer token
+    in recent_writers until then.
+    """
+
+    SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+    def __init__(self, app, window: Optional[float] = None):
+        self.app = app
+        self.window = settings.READ_YOUR_WRITES_WINDOW if window is None else window
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in self.SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+        authorization = Headers(scope=scope).get("authorization")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + self.window
+                if authorization:
+                    recent_writers.mark(authorization, until)
+                cookie = (
+                    f"{READ_PRIMARY_COOKIE}={until:.3f}; Max-Age={math.ceil(self.window)}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie.encode())]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
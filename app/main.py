@@ -1,8 +1,21 @@
-from fastapi import FastAPI
+import asyncio
+
+from fastapi import FastAPI, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy.orm.exc import StaleDataError
 
 from app.core.config import settings
+from app.core.metrics import MetricsMiddleware, instrument_engine, register_collectors
+from app.core.principal_cache import start_invalidation_listener, stop_invalidation_listener
+from app.core.security import shutdown_hash_pool
 from app.api.v1.api import api_router
+from app.db.base import SessionLocal, async_engine, engine
+from app.db.replicas import ReadYourWritesMiddleware, replica_router
+from app.services.queue_store import reconcile_queue_store
+from app.services.scheduler_loop import scheduler_loop
+from app.services.utilization import utilization_recorder
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -16,10 +29,58 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+if replica_router.enabled:
+    app.add_middleware(ReadYourWritesMiddleware)
+
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+    register_collectors(
+        SessionLocal,
+        scheduler_loop,
+        engines={
+            "primary": engine,
+            "primary_async": async_engine.sync_engine,
+            **replica_router.engines(),
+        },
+    )
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.on_event("startup")
+async def startup():
+    if settings.AUTH_CACHE_REDIS_INVALIDATION:
+        await asyncio.to_thread(start_invalidation_listener)
+    if settings.SCHEDULER_REDIS_QUEUE_ENABLED:
+        await asyncio.to_thread(reconcile_queue_store)
+    if settings.SCHEDULER_LOOP_ENABLED:
+        await scheduler_loop.start()
+    if settings.UTILIZATION_ENABLED:
+        await utilization_recorder.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await scheduler_loop.stop()
+    await utilization_recorder.stop()
+    stop_invalidation_listener()
+    shutdown_hash_pool()
+
+@app.exception_handler(StaleDataError)
+async def stale_data_handler(request: Request, exc: StaleDataError):
+    # Raised once the scheduler has exhausted its retries on a cluster write conflict
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"detail": "Cluster was modified concurrently, please retry"},
+    )
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to MLOps Platform API"} 
\ No newline at end of file
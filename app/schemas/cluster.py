@@ -19,6 +19,8 @@ class ClusterInDBBase(ClusterBase):
     available_ram: float
     available_gpu: int
     organization_id: int
+    # Capacity above is the sum of the nodes' when there are any
+    node_count: int = 0
 
     class Config:
         from_attributes = True
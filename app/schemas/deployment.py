@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from app.db.models import DeploymentStatus
 
@@ -10,9 +10,12 @@ class DeploymentBase(BaseModel):
     required_cpu: float
     required_ram: float
     required_gpu: int
+    # Expected seconds from start to finish, used for backfill scheduling
+    estimated_runtime: Optional[float] = None
 
 class DeploymentCreate(DeploymentBase):
-    cluster_id: int
+    # Omit to let the scheduler place the deployment on a cluster in the user's organization
+    cluster_id: Optional[int] = None
 
 class DeploymentUpdate(DeploymentBase):
     status: Optional[DeploymentStatus] = None
@@ -25,6 +28,7 @@ class DeploymentInDBBase(DeploymentBase):
     completed_at: Optional[datetime] = None
     cluster_id: int
     user_id: int
+    group_id: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -33,4 +37,53 @@ class Deployment(DeploymentInDBBase):
     pass
 
 class DeploymentInDB(DeploymentInDBBase):
-    pass 
\ No newline at end of file
+    pass 
+
+class DeploymentBatchResult(BaseModel):
+    # Position of the item in the submitted array
+    index: int
+    status_code: int
+    deployment: Optional[Deployment] = None
+    detail: Optional[str] = None
+    # False when the item was created but its cluster's scheduling pass failed
+    scheduled: Optional[bool] = None
+
+class PreemptionPlan(BaseModel):
+    deployment_id: int
+    feasible: bool
+    victim_ids: List[int] = []
+    cost: float = 0.0
+    exact: bool = True
+
+    class Config:
+        from_attributes = True
+
+class DeploymentGroupMember(BaseModel):
+    name: str
+    docker_image: str
+    required_cpu: float
+    required_ram: float
+    required_gpu: int
+
+class DeploymentGroupCreate(BaseModel):
+    name: str
+    priority: int = 0
+    # Omit to place the whole group on one cluster in the user's organization
+    cluster_id: Optional[int] = None
+    # Seconds the group may wait to start before it is failed; SCHEDULER_GANG_TIMEOUT if omitted
+    timeout_seconds: Optional[float] = None
+    # Shared by every member, see DeploymentBase
+    estimated_runtime: Optional[float] = None
+    deployments: List[DeploymentGroupMember]
+
+class DeploymentGroup(BaseModel):
+    id: int
+    name: str
+    timeout_seconds: float
+    created_at: datetime
+    cluster_id: int
+    user_id: int
+    deployments: List[Deployment] = []
+
+    class Config:
+        from_attributes = True
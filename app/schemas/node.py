@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+
+class NodeBase(BaseModel):
+    name: str
+    total_cpu: float
+    total_ram: float
+    total_gpu: int
+
+class NodeCreate(NodeBase):
+    pass
+
+class NodeInDBBase(NodeBase):
+    id: int
+    available_cpu: float
+    available_ram: float
+    available_gpu: int
+    cluster_id: int
+
+    class Config:
+        from_attributes = True
+
+class Node(NodeInDBBase):
+    pass
+
+class NodeInDB(NodeInDBBase):
+    pass
@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from typing import List
+from datetime import datetime
+
+class UtilizationPoint(BaseModel):
+    # Start of the bucket, UTC
+    bucket: datetime
+    # Snapshots in the bucket; 0 when the state was carried over from an earlier one
+    samples: int
+    # Weighted by how long each state held, up to now for the current bucket
+    cpu_used_avg: float
+    ram_used_avg: float
+    gpu_used_avg: float
+    cpu_used_max: float
+    ram_used_max: float
+    gpu_used_max: int
+    total_cpu: float
+    total_ram: float
+    total_gpu: int
+
+class UtilizationSeries(BaseModel):
+    cluster_id: int
+    step: str
+    points: List[UtilizationPoint] = []
@@ -0,0 +1,100 @@
+"""EASY backfilling.
+
+The highest-priority queued deployment that does not fit gets a reservation: the
+earliest time enough capacity frees up for it, going by when running deployments
+should end (started_at + estimated_runtime). Anything else may start ahead of it
+only if it is estimated to finish by then, or fits into what will still be free
+at that time once the reserved deployment is placed. Deployments that rank above
+the reserved one (higher priority, or equal priority and queued earlier) are not
+held back, but what they take is charged to the reservation.
+
+Running deployments without an estimate are assumed to keep their resources, and
+a deployment without one can only use that leftover. Without any estimates there
+is no reservation and the scheduler behaves as before.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Sequence, Tuple
+
+from app.db.models import Deployment
+from app.services.gang import Unit
+from app.services.preemption import Resources, requirements
+
+_EPSILON = 1e-9
+
+def _fits(need: Sequence[float], free: Sequence[float]) -> bool:
+    return all(n <= f + _EPSILON for n, f in zip(need, free))
+
+def _combine(a: Sequence[float], b: Sequence[float], sign: int = 1) -> Resources:
+    return (a[0] + sign * b[0], a[1] + sign * b[1], a[2] + sign * b[2])
+
+def estimated_end(unit: Unit, start: datetime) -> Optional[datetime]:
+    """When unit would finish if it started at start; None without an estimate."""
+    runtime = unit.estimated_runtime
+    return None if runtime is None else start + timedelta(seconds=runtime)
+
+@dataclass
+class Reservation:
+    """Start time held for a blocked deployment, and the capacity it leaves to backfill."""
+    deployment_id: int
+    start: datetime
+    # Free at start once the reserved deployment is placed
+    leftover: Resources
+    # Rank of the reserved deployment in the queue
+    priority: int = 0
+    created_at: Optional[datetime] = None
+
+    def ranks_above(self, unit: Unit) -> bool:
+        """Whether the reserved deployment is queued ahead of unit, so unit must not delay it."""
+        if unit.id == self.deployment_id:
+            return False
+        priority = unit.priority or 0
+        if priority != self.priority:
+            return priority < self.priority
+        if self.created_at is None or unit.created_at is None:
+            return False
+        return unit.created_at > self.created_at
+
+    def allows(self, unit: Unit, now: datetime) -> bool:
+        """Whether starting unit now leaves the reservation's start time intact."""
+        end = estimated_end(unit, now)
+        if end is not None and end <= self.start:
+            return True
+        return _fits(requirements(unit), self.leftover)
+
+    def claim(self, unit: Unit, now: datetime) -> None:
+        """Charge a started unit that will still be running at the start to the leftover."""
+        end = estimated_end(unit, now)
+        if end is None or end > self.start:
+            self.leftover = _combine(self.leftover, requirements(unit), -1)
+
+def reserve(
+    unit: Unit, available: Resources, running: Iterable[Deployment], now: datetime
+) -> Optional[Reservation]:
+    """Earliest start for unit given what is free now and when running deployments should end.
+
+    Deployments already past their estimate count as ending now. None if the
+    estimates never free enough, e.g. because the capacity is held by deployments
+    without one.
+    """
+    need = requirements(unit)
+    ends = sorted(
+        (
+            (max(now, estimated_end(deployment, deployment.started_at)), requirements(deployment))
+            for deployment in running
+            if deployment.estimated_runtime is not None and deployment.started_at is not None
+        ),
+        key=lambda end: end[0],
+    )
+    free = tuple(available)
+    for end, freed in ends:
+        free = _combine(free, freed)
+        if _fits(need, free):
+            return Reservation(
+                deployment_id=unit.id,
+                start=end,
+                leftover=_combine(free, need, -1),
+                priority=unit.priority or 0,
+                created_at=unit.created_at,
+            )
+    return None
@@ -1,5 +1,8 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only
+from app.core.pagination import keyset_paginate, keyset_paginate_async
 from app.db.models import Cluster
 from app.schemas.cluster import ClusterCreate, ClusterUpdate
 
@@ -7,24 +10,35 @@ class ClusterService:
     def get(self, db: Session, id: int) -> Optional[Cluster]:
         return db.query(Cluster).filter(Cluster.id == id).first()
 
+    def get_owner(self, db: Session, id: int) -> Optional[Cluster]:
+        """Cluster with only id and organization_id loaded, for ownership checks."""
+        return db.scalar(
+            select(Cluster).options(load_only(Cluster.id, Cluster.organization_id)).where(Cluster.id == id)
+        )
+
     def get_multi(
         self, db: Session, *, skip: int = 0, limit: int = 100
     ) -> List[Cluster]:
         return db.query(Cluster).offset(skip).limit(limit).all()
 
     def get_multi_by_organization(
-        self, db: Session, *, organization_id: int, skip: int = 0, limit: int = 100
-    ) -> List[Cluster]:
-        return (
-            db.query(Cluster)
-            .filter(Cluster.organization_id == organization_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        self, db: Session, *, organization_id: int, limit: int = 100, cursor: Optional[str] = None
+    ) -> Tuple[List[Cluster], Optional[str]]:
+        """Newest-first page of the organization's clusters and the next page's cursor."""
+        query = db.query(Cluster).filter(Cluster.organization_id == organization_id)
+        return keyset_paginate(query, Cluster, limit=limit, cursor=cursor)
 
     def create(self, db: Session, *, obj_in: ClusterCreate) -> Cluster:
-        db_obj = Cluster(
+        db_obj = self.build(obj_in)
+        db.add(db_obj)
+        db.commit()
+        db.refresh(db_obj)
+        return db_obj
+
+    @staticmethod
+    def build(obj_in: ClusterCreate) -> Cluster:
+        """A new cluster with all of its capacity available."""
+        return Cluster(
             name=obj_in.name,
             total_cpu=obj_in.total_cpu,
             total_ram=obj_in.total_ram,
@@ -34,10 +48,6 @@ class ClusterService:
             available_gpu=obj_in.total_gpu,
             organization_id=obj_in.organization_id,
         )
-        db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
-        return db_obj
 
     def update(
         self, db: Session, *, db_obj: Cluster, obj_in: ClusterUpdate
@@ -63,4 +73,30 @@ class ClusterService:
         db.refresh(db_obj)
         return db_obj
 
-cluster_service = ClusterService() 
\ No newline at end of file
+class AsyncClusterService:
+    """ClusterService for AsyncSession."""
+
+    async def get(self, db: AsyncSession, id: int) -> Optional[Cluster]:
+        return await db.get(Cluster, id)
+
+    async def get_owner(self, db: AsyncSession, id: int) -> Optional[Cluster]:
+        """Cluster with only id and organization_id loaded, for ownership checks."""
+        return await db.scalar(
+            select(Cluster).options(load_only(Cluster.id, Cluster.organization_id)).where(Cluster.id == id)
+        )
+
+    async def get_multi_by_organization(
+        self, db: AsyncSession, *, organization_id: int, limit: int = 100, cursor: Optional[str] = None
+    ) -> Tuple[List[Cluster], Optional[str]]:
+        statement = select(Cluster).where(Cluster.organization_id == organization_id)
+        return await keyset_paginate_async(db, statement, Cluster, limit=limit, cursor=cursor)
+
+    async def create(self, db: AsyncSession, *, obj_in: ClusterCreate) -> Cluster:
+        db_obj = ClusterService.build(obj_in)
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+cluster_service = ClusterService()
+async_cluster_service = AsyncClusterService() 
\ No newline at end of file
@@ -1,28 +1,60 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from app.db.models import Deployment
-from app.schemas.deployment import DeploymentCreate, DeploymentUpdate
+from typing import List, Optional, Tuple
+from sqlalchemy import Select, delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, contains_eager, selectinload
+from app.core.config import settings
+from app.core.pagination import keyset_paginate, keyset_paginate_async
+from app.db.models import Cluster, Deployment, DeploymentGroup, DeploymentStatus
+from app.schemas.deployment import DeploymentCreate, DeploymentGroupCreate, DeploymentUpdate
+
+def with_cluster(statement: Select, *, owner_only: bool = False) -> Select:
+    """Join a deployment statement to its cluster and populate Deployment.cluster from the join."""
+    loader = contains_eager(Deployment.cluster)
+    if owner_only:
+        loader = loader.load_only(Cluster.id, Cluster.organization_id)
+    return statement.join(Deployment.cluster).options(loader)
 
 class DeploymentService:
     def get(self, db: Session, id: int) -> Optional[Deployment]:
         return db.query(Deployment).filter(Deployment.id == id).first()
 
+    def get_with_cluster(self, db: Session, id: int, *, owner_only: bool = False) -> Optional[Deployment]:
+        """Deployment and its cluster in one SELECT.
+
+        With owner_only the cluster has just id and organization_id loaded, which is
+        all the ownership check needs.
+        """
+        return db.scalar(with_cluster(select(Deployment), owner_only=owner_only).where(Deployment.id == id))
+
+    def get_many(self, db: Session, *, ids: List[int]) -> List[Deployment]:
+        return db.query(Deployment).filter(Deployment.id.in_(ids)).all() if ids else []
+
     def get_multi(
         self, db: Session, *, skip: int = 0, limit: int = 100
     ) -> List[Deployment]:
         return db.query(Deployment).offset(skip).limit(limit).all()
 
     def get_multi_by_organization(
-        self, db: Session, *, organization_id: int, skip: int = 0, limit: int = 100
-    ) -> List[Deployment]:
-        return (
+        self,
+        db: Session,
+        *,
+        organization_id: int,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        status: Optional[DeploymentStatus] = None,
+        cluster_id: Optional[int] = None,
+    ) -> Tuple[List[Deployment], Optional[str]]:
+        """Newest-first page of the organization's deployments and the next page's cursor."""
+        query = (
             db.query(Deployment)
             .join(Deployment.cluster)
-            .filter(Deployment.cluster.has(organization_id=organization_id))
-            .offset(skip)
-            .limit(limit)
-            .all()
+            .filter(Cluster.organization_id == organization_id)
         )
+        if status is not None:
+            query = query.filter(Deployment.status == status)
+        if cluster_id is not None:
+            query = query.filter(Deployment.cluster_id == cluster_id)
+        return keyset_paginate(query, Deployment, limit=limit, cursor=cursor)
 
     def create(
         self, db: Session, *, obj_in: DeploymentCreate, user_id: int
@@ -34,6 +66,7 @@ class DeploymentService:
             required_cpu=obj_in.required_cpu,
             required_ram=obj_in.required_ram,
             required_gpu=obj_in.required_gpu,
+            estimated_runtime=obj_in.estimated_runtime,
             cluster_id=obj_in.cluster_id,
             user_id=user_id,
         )
@@ -42,6 +75,100 @@ class DeploymentService:
         db.refresh(db_obj)
         return db_obj
 
+    def create_many(
+        self,
+        db: Session,
+        *,
+        objs_in: List[DeploymentCreate],
+        user_id: int,
+        status: DeploymentStatus = DeploymentStatus.PENDING,
+        group_id: Optional[int] = None,
+    ) -> List[Deployment]:
+        """Insert deployments with one INSERT ... RETURNING, in input order, without committing."""
+        if not objs_in:
+            return []
+        rows = [
+            dict(
+                name=obj_in.name,
+                docker_image=obj_in.docker_image,
+                priority=obj_in.priority,
+                required_cpu=obj_in.required_cpu,
+                required_ram=obj_in.required_ram,
+                required_gpu=obj_in.required_gpu,
+                estimated_runtime=obj_in.estimated_runtime,
+                cluster_id=obj_in.cluster_id,
+                user_id=user_id,
+                status=status,
+                group_id=group_id,
+            )
+            for obj_in in objs_in
+        ]
+        return list(
+            db.scalars(insert(Deployment).returning(Deployment, sort_by_parameter_order=True), rows)
+        )
+
+    def create_group(
+        self,
+        db: Session,
+        *,
+        obj_in: DeploymentGroupCreate,
+        user_id: int,
+        status: DeploymentStatus = DeploymentStatus.PENDING,
+    ) -> Tuple[DeploymentGroup, List[Deployment]]:
+        """Insert a group and its members, which share its priority and cluster, without committing."""
+        group = DeploymentGroup(
+            name=obj_in.name,
+            cluster_id=obj_in.cluster_id,
+            user_id=user_id,
+            timeout_seconds=(
+                obj_in.timeout_seconds
+                if obj_in.timeout_seconds is not None
+                else settings.SCHEDULER_GANG_TIMEOUT
+            ),
+        )
+        db.add(group)
+        db.flush()
+        deployments = self.create_many(
+            db,
+            objs_in=[
+                DeploymentCreate(
+                    **member.model_dump(),
+                    priority=obj_in.priority,
+                    estimated_runtime=obj_in.estimated_runtime,
+                    cluster_id=obj_in.cluster_id,
+                )
+                for member in obj_in.deployments
+            ],
+            user_id=user_id,
+            status=status,
+            group_id=group.id,
+        )
+        return group, deployments
+
+    def get_group(self, db: Session, id: int) -> Optional[DeploymentGroup]:
+        """A group with its members loaded."""
+        return db.scalar(
+            select(DeploymentGroup)
+            .options(selectinload(DeploymentGroup.deployments))
+            .where(DeploymentGroup.id == id)
+        )
+
+    def delete_group(self, db: Session, *, id: int) -> None:
+        """Delete a group and its members, without committing."""
+        db.execute(
+            delete(Deployment).where(Deployment.group_id == id).execution_options(synchronize_session=False)
+        )
+        db.execute(
+            delete(DeploymentGroup).where(DeploymentGroup.id == id).execution_options(synchronize_session=False)
+        )
+
+    def delete_many(self, db: Session, *, ids: List[int]) -> None:
+        """Delete deployments by id with one statement, without committing."""
+        if ids:
+            db.execute(
+                delete(Deployment).where(Deployment.id.in_(ids)).execution_options(synchronize_session=False)
+            )
+
     def update(
         self, db: Session, *, db_obj: Deployment, obj_in: DeploymentUpdate
     ) -> Deployment:
@@ -57,8 +184,57 @@ class DeploymentService:
         """Delete a deployment."""
         deployment = self.get(db, id=id)
         if deployment:
-            db.delete(deployment)
-            db.commit()
+            self.remove(db, db_obj=deployment)
         return deployment
 
-deployment_service = DeploymentService() 
\ No newline at end of file
+    def remove(self, db: Session, *, db_obj: Deployment) -> Deployment:
+        """Delete an already loaded deployment."""
+        db.delete(db_obj)
+        db.commit()
+        return db_obj
+
+class AsyncDeploymentService:
+    """Read side of DeploymentService for AsyncSession.
+
+    Writes stay on DeploymentService: they go through the synchronous scheduler.
+    """
+
+    async def get(self, db: AsyncSession, id: int) -> Optional[Deployment]:
+        """Deployment with its cluster's owner loaded, since nothing can lazy-load under asyncio."""
+        return await db.scalar(with_cluster(select(Deployment), owner_only=True).where(Deployment.id == id))
+
+    async def get_multi_by_organization(
+        self,
+        db: AsyncSession,
+        *,
+        organization_id: int,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        status: Optional[DeploymentStatus] = None,
+        cluster_id: Optional[int] = None,
+    ) -> Tuple[List[Deployment], Optional[str]]:
+        statement = (
+            select(Deployment)
+            .join(Deployment.cluster)
+            .where(Cluster.organization_id == organization_id)
+        )
+        if status is not None:
+            statement = statement.where(Deployment.status == status)
+        if cluster_id is not None:
+            statement = statement.where(Deployment.cluster_id == cluster_id)
+        return await keyset_paginate_async(db, statement, Deployment, limit=limit, cursor=cursor)
+
+    async def get_group(self, db: AsyncSession, id: int) -> Optional[DeploymentGroup]:
+        """A group with its members and its cluster's owner loaded."""
+        return await db.scalar(
+            select(DeploymentGroup)
+            .join(DeploymentGroup.cluster)
+            .options(
+                contains_eager(DeploymentGroup.cluster).load_only(Cluster.id, Cluster.organization_id),
+                selectinload(DeploymentGroup.deployments),
+            )
+            .where(DeploymentGroup.id == id)
+        )
+
+deployment_service = DeploymentService()
+async_deployment_service = AsyncDeploymentService() 
\ No newline at end of file
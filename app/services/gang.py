@@ -0,0 +1,145 @@
+"""Gang scheduling for deployment groups.
+
+The members of a DeploymentGroup that are still waiting to start (PENDING or
+QUEUED) form one scheduling unit, a Gang. The scheduler starts all of them in one
+decision or none, so part of a distributed job never holds capacity the rest is
+waiting for. Running members of a group are evicted together in the same way.
+
+A gang still waiting past its deadline is failed, and members of the group that
+are already running give their resources back.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, contains_eager
+
+from app.db.models import Deployment, DeploymentGroup, DeploymentStatus
+
+WAITING = (DeploymentStatus.PENDING, DeploymentStatus.QUEUED)
+LIVE = WAITING + (DeploymentStatus.RUNNING,)
+
+@dataclass(eq=False)
+class Gang:
+    """Deployments of one group, scheduled and evicted as if they were one deployment.
+
+    Has the attributes the packing, fairness and preemption code read from a
+    Deployment: summed requirements, the highest member priority, and the first
+    member's id, user and creation time.
+    """
+    group_id: int
+    members: List[Deployment]
+    # Members of the group already running while these wait; set for waiting gangs only
+    running: List[Deployment] = field(default_factory=list)
+    deadline: Optional[datetime] = None
+
+    @property
+    def id(self) -> int:
+        return self.members[0].id
+
+    @property
+    def user_id(self) -> int:
+        return self.members[0].user_id
+
+    @property
+    def cluster_id(self) -> int:
+        return self.members[0].cluster_id
+
+    @property
+    def created_at(self) -> datetime:
+        return self.members[0].created_at
+
+    @property
+    def priority(self) -> int:
+        return max(member.priority or 0 for member in self.members)
+
+    @property
+    def required_cpu(self) -> float:
+        return sum(member.required_cpu for member in self.members)
+
+    @property
+    def required_ram(self) -> float:
+        return sum(member.required_ram for member in self.members)
+
+    @property
+    def required_gpu(self) -> int:
+        return sum(member.required_gpu for member in self.members)
+
+    @property
+    def estimated_runtime(self) -> Optional[float]:
+        """The longest member's estimate, or None if any member has none."""
+        runtimes = [member.estimated_runtime for member in self.members]
+        return None if None in runtimes else max(runtimes)
+
+    def expired(self, now: datetime) -> bool:
+        return self.deadline is not None and now >= self.deadline
+
+# What the scheduler places or evicts in one step
+Unit = Union[Deployment, Gang]
+
+def members(unit: Unit) -> List[Deployment]:
+    return unit.members if isinstance(unit, Gang) else [unit]
+
+def running_units(deployments: Sequence[Deployment]) -> List[Unit]:
+    """Running deployments with each group's members merged into one Gang, in input order."""
+    units: List[Unit] = []
+    gangs: Dict[int, Gang] = {}
+    for deployment in deployments:
+        if deployment.group_id is None:
+            units.append(deployment)
+        elif deployment.group_id in gangs:
+            gangs[deployment.group_id].members.append(deployment)
+        else:
+            gangs[deployment.group_id] = Gang(deployment.group_id, [deployment])
+            units.append(gangs[deployment.group_id])
+    return units
+
+def load_waiting_gangs(
+    db: Session, group_ids: Iterable[int] = (), *, cluster_id: Optional[int] = None
+) -> Dict[int, Gang]:
+    """The waiting gang of each of group_ids, or of every group waiting on cluster_id.
+
+    Groups without waiting members are left out. A gang's wait starts when its
+    group is created, or again when its members are preempted back into the queue.
+    """
+    if cluster_id is not None:
+        # A plain column query first: most clusters have no gang waiting most of the time
+        group_ids = db.scalars(
+            select(Deployment.group_id).distinct().where(
+                Deployment.cluster_id == cluster_id,
+                Deployment.status.in_(WAITING),
+                Deployment.group_id.is_not(None),
+            )
+        ).all()
+    group_ids = set(group_ids)
+    if not group_ids:
+        return {}
+    deployments = (
+        db.query(Deployment)
+        .join(Deployment.group)
+        .options(contains_eager(Deployment.group))
+        .filter(Deployment.group_id.in_(group_ids), Deployment.status.in_(LIVE))
+        .order_by(Deployment.id)
+        .all()
+    )
+    by_group: Dict[int, List[Deployment]] = {}
+    for deployment in deployments:
+        by_group.setdefault(deployment.group_id, []).append(deployment)
+
+    gangs = {}
+    for group_id, group_members in by_group.items():
+        waiting = [member for member in group_members if member.status in WAITING]
+        if not waiting:
+            continue
+        group: DeploymentGroup = waiting[0].group
+        since = max(
+            [group.created_at] + [member.completed_at for member in waiting if member.completed_at]
+        )
+        gangs[group_id] = Gang(
+            group_id,
+            waiting,
+            running=[member for member in group_members if member.status == DeploymentStatus.RUNNING],
+            deadline=since + timedelta(seconds=group.timeout_seconds),
+        )
+    return gangs
@@ -0,0 +1,73 @@
+from typing import List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.db.models import Cluster, Deployment, DeploymentStatus, Node
+from app.schemas.node import NodeCreate
+
+class NodeService:
+    """Nodes of a cluster, keeping the cluster's capacity columns their sums."""
+
+    def get(self, db: Session, id: int) -> Optional[Node]:
+        return db.query(Node).filter(Node.id == id).first()
+
+    def has_running(self, db: Session, *, cluster_id: int, node_id: Optional[int] = None) -> bool:
+        """Whether a deployment runs on the cluster, or on one node of it."""
+        query = select(Deployment.id).where(
+            Deployment.cluster_id == cluster_id, Deployment.status == DeploymentStatus.RUNNING
+        )
+        if node_id is not None:
+            query = query.where(Deployment.node_id == node_id)
+        return db.scalar(query.limit(1)) is not None
+
+    def create(self, db: Session, *, cluster: Cluster, obj_in: NodeCreate) -> Node:
+        """Add a node and its capacity to the cluster.
+
+        The first node replaces the capacity the cluster had as one pool.
+        """
+        db_obj = Node(
+            name=obj_in.name,
+            total_cpu=obj_in.total_cpu,
+            total_ram=obj_in.total_ram,
+            total_gpu=obj_in.total_gpu,
+            available_cpu=obj_in.total_cpu,
+            available_ram=obj_in.total_ram,
+            available_gpu=obj_in.total_gpu,
+            cluster_id=cluster.id,
+        )
+        if not cluster.node_count:
+            cluster.total_cpu = cluster.total_ram = cluster.total_gpu = 0
+            cluster.available_cpu = cluster.available_ram = cluster.available_gpu = 0
+        self._add_capacity(cluster, db_obj, 1)
+        db.add(db_obj)
+        db.commit()
+        db.refresh(db_obj)
+        return db_obj
+
+    def remove(self, db: Session, *, cluster: Cluster, db_obj: Node) -> Node:
+        """Take a node and its capacity out of the cluster."""
+        self._add_capacity(cluster, db_obj, -1)
+        db.delete(db_obj)
+        db.commit()
+        return db_obj
+
+    @staticmethod
+    def _add_capacity(cluster: Cluster, node: Node, sign: int) -> None:
+        # Bumps the cluster's version, which is what invalidates cached node indexes
+        cluster.total_cpu += sign * node.total_cpu
+        cluster.total_ram += sign * node.total_ram
+        cluster.total_gpu += sign * node.total_gpu
+        cluster.available_cpu += sign * node.available_cpu
+        cluster.available_ram += sign * node.available_ram
+        cluster.available_gpu += sign * node.available_gpu
+        cluster.node_count += sign
+
+class AsyncNodeService:
+    """NodeService for AsyncSession."""
+
+    async def get_multi_by_cluster(self, db: AsyncSession, *, cluster_id: int) -> List[Node]:
+        result = await db.scalars(select(Node).where(Node.cluster_id == cluster_id).order_by(Node.id))
+        return list(result.all())
+
+node_service = NodeService()
+async_node_service = AsyncNodeService()
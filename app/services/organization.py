@@ -1,8 +1,23 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import Update, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from app.core.pagination import keyset_paginate, keyset_paginate_async
 from app.db.models import Organization
 from app.schemas.organization import OrganizationCreate, OrganizationUpdate
 
+def bump_versions(organization_ids: Iterable[Optional[int]]) -> Optional[Update]:
+    """UPDATE moving the organizations' versions on, for writes to their members; None if there are none."""
+    ids = {organization_id for organization_id in organization_ids if organization_id is not None}
+    if not ids:
+        return None
+    return (
+        update(Organization)
+        .where(Organization.id.in_(ids))
+        .values(version=Organization.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
 class OrganizationService:
     def get(self, db: Session, id: int) -> Optional[Organization]:
         return db.query(Organization).filter(Organization.id == id).first()
@@ -11,9 +26,10 @@ class OrganizationService:
         return db.query(Organization).filter(Organization.invite_code == invite_code).first()
 
     def get_multi(
-        self, db: Session, *, skip: int = 0, limit: int = 100
-    ) -> List[Organization]:
-        return db.query(Organization).offset(skip).limit(limit).all()
+        self, db: Session, *, limit: int = 100, cursor: Optional[str] = None
+    ) -> Tuple[List[Organization], Optional[str]]:
+        """Newest-first page of organizations and the next page's cursor."""
+        return keyset_paginate(db.query(Organization), Organization, limit=limit, cursor=cursor)
 
     def create(
         self, db: Session, *, obj_in: OrganizationCreate, invite_code: str
@@ -38,4 +54,54 @@ class OrganizationService:
         db.refresh(db_obj)
         return db_obj
 
-organization_service = OrganizationService() 
\ No newline at end of file
+class AsyncOrganizationService:
+    """OrganizationService for AsyncSession.
+
+    The Organization schema includes its users, which cannot be lazy-loaded under
+    asyncio, so every read loads them up front.
+    """
+
+    async def get(self, db: AsyncSession, id: int) -> Optional[Organization]:
+        return await db.get(Organization, id, options=[selectinload(Organization.users)])
+
+    async def get_version(self, db: AsyncSession, id: int) -> Optional[int]:
+        """The organization's version alone, without loading it or its users."""
+        return await db.scalar(select(Organization.version).where(Organization.id == id))
+
+    async def get_by_invite_code(self, db: AsyncSession, invite_code: str) -> Optional[Organization]:
+        return await db.scalar(
+            select(Organization)
+            .options(selectinload(Organization.users))
+            .where(Organization.invite_code == invite_code)
+        )
+
+    async def get_multi(
+        self, db: AsyncSession, *, limit: int = 100, cursor: Optional[str] = None
+    ) -> Tuple[List[Organization], Optional[str]]:
+        statement = select(Organization).options(selectinload(Organization.users))
+        return await keyset_paginate_async(db, statement, Organization, limit=limit, cursor=cursor)
+
+    async def create(
+        self, db: AsyncSession, *, obj_in: OrganizationCreate, invite_code: str
+    ) -> Organization:
+        db_obj = Organization(
+            name=obj_in.name,
+            invite_code=invite_code,
+            users=[],
+        )
+        db.add(db_obj)
+        await db.commit()
+        return db_obj
+
+    async def update(
+        self, db: AsyncSession, *, db_obj: Organization, obj_in: OrganizationUpdate
+    ) -> Organization:
+        update_data = obj_in.dict(exclude_unset=True)
+        for field in update_data:
+            setattr(db_obj, field, update_data[field])
+        db.add(db_obj)
+        await db.commit()
+        return db_obj
+
+organization_service = OrganizationService()
+async_organization_service = AsyncOrganizationService() 
\ No newline at end of file
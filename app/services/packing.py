@@ -0,0 +1,89 @@
+import math
+from typing import Callable, Dict, List, Tuple
+
+from app.db.models import Cluster, Deployment
+
+Vector = Tuple[float, float, float]
+PackingStrategy = Callable[[Cluster, List[Deployment]], List[Deployment]]
+
+def _normalized(values: Vector, totals: Vector) -> Vector:
+    """Express CPU cores, RAM and GPU counts as fractions of the cluster so they are comparable."""
+    return tuple(value / total if total else 0.0 for value, total in zip(values, totals))
+
+def _totals(cluster: Cluster) -> Vector:
+    return (cluster.total_cpu, cluster.total_ram, cluster.total_gpu)
+
+def _demand(cluster: Cluster, deployment: Deployment) -> Vector:
+    return _normalized(
+        (deployment.required_cpu, deployment.required_ram, deployment.required_gpu),
+        _totals(cluster),
+    )
+
+def density(cluster: Cluster, deployments: List[Deployment]) -> List[Deployment]:
+    """Legacy ordering: raw resource sum over priority + 1, ascending."""
+    def get_resource_density(deployment: Deployment) -> float:
+        total_resources = deployment.required_cpu + deployment.required_ram + deployment.required_gpu
+        return total_resources / (deployment.priority + 1)  # Add 1 to avoid division by zero
+
+    return sorted(deployments, key=lambda d: (get_resource_density(d), -d.priority))
+
+def best_fit_decreasing(cluster: Cluster, deployments: List[Deployment]) -> List[Deployment]:
+    """Largest normalized demand first, so big items claim space before it fragments."""
+    return sorted(
+        deployments,
+        key=lambda d: (-math.hypot(*_demand(cluster, d)), -d.priority),
+    )
+
+def dot_product(cluster: Cluster, deployments: List[Deployment]) -> List[Deployment]:
+    """Tetris-style alignment: repeatedly take the deployment whose demand best matches
+    what is still free, charging it against a scratch copy of the free capacity.
+
+    Deployments that no longer fit anywhere follow in alignment order with the
+    capacity left at that point.
+    """
+    totals = _totals(cluster)
+    free = list(_normalized(
+        (cluster.available_cpu, cluster.available_ram, cluster.available_gpu), totals
+    ))
+    demands = {id(d): _demand(cluster, d) for d in deployments}
+    remaining = list(deployments)
+    ordered: List[Deployment] = []
+
+    def alignment(deployment: Deployment) -> Tuple[float, int]:
+        return (sum(need * left for need, left in zip(demands[id(deployment)], free)), deployment.priority)
+
+    while remaining:
+        fitting = [
+            d for d in remaining
+            if all(need <= left + 1e-9 for need, left in zip(demands[id(d)], free))
+        ]
+        if not fitting:
+            break
+        best = max(fitting, key=alignment)
+        ordered.append(best)
+        remaining.remove(best)
+        free = [left - need for left, need in zip(free, demands[id(best)])]
+
+    return ordered + sorted(remaining, key=alignment, reverse=True)
+
+def dominant_share(cluster: Cluster, deployments: List[Deployment]) -> List[Deployment]:
+    """Smallest dominant share (largest normalized dimension) first, fitting the most deployments."""
+    return sorted(
+        deployments,
+        key=lambda d: (max(_demand(cluster, d)), -d.priority),
+    )
+
+PACKING_STRATEGIES: Dict[str, PackingStrategy] = {
+    "density": density,
+    "best_fit_decreasing": best_fit_decreasing,
+    "dot_product": dot_product,
+    "dominant_share": dominant_share,
+}
+
+def get_packing_strategy(name: str) -> PackingStrategy:
+    try:
+        return PACKING_STRATEGIES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown packing strategy {name!r}, expected one of {sorted(PACKING_STRATEGIES)}"
+        )
@@ -0,0 +1,273 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+from app.core.config import settings
+from app.db.models import Cluster, Deployment, Node
+from app.services.preemption import Resources, requirements
+
+def score_clusters(
+    available: np.ndarray, totals: np.ndarray, demand: np.ndarray, policy: str = "best_fit"
+) -> np.ndarray:
+    """Score every cluster for a deployment in one vectorized pass.
+
+    available and totals are (n, 3) arrays of CPU, RAM and GPU; demand is (3,).
+    Clusters that cannot take the deployment right now score -inf.
+
+    "best_fit" prefers the cluster left with the least normalized free capacity
+    (tight packing); "least_loaded" prefers the one whose scarcest resource keeps
+    the largest free fraction (spreading load).
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        leftover = np.where(totals > 0, (available - demand) / totals, 1.0)
+    if policy == "least_loaded":
+        scores = leftover.min(axis=1)
+    else:
+        scores = -leftover.sum(axis=1)
+    feasible = (available >= demand).all(axis=1)
+    return np.where(feasible, scores, -np.inf)
+
+class NodeIndex:
+    """Free capacity of a cluster's nodes, for best-fit placement without a query per decision.
+
+    available and totals are (n, 3) arrays of CPU, RAM and GPU, one row per node.
+    Deployments placed or released through the index are remembered in placed,
+    since their node_id columns are only written when the transaction is.
+    """
+
+    def __init__(self, ids: List[int], available: np.ndarray, totals: np.ndarray):
+        self.ids = ids
+        self.rows = {node_id: row for row, node_id in enumerate(ids)}
+        self.available = available
+        self.totals = totals
+        self.placed: Dict[int, Optional[int]] = {}
+
+    @classmethod
+    def load(cls, db: Session, cluster_id: int) -> "NodeIndex":
+        rows = (
+            db.query(
+                Node.id,
+                Node.available_cpu,
+                Node.available_ram,
+                Node.available_gpu,
+                Node.total_cpu,
+                Node.total_ram,
+                Node.total_gpu,
+            )
+            .filter(Node.cluster_id == cluster_id)
+            .order_by(Node.id)
+            .all()
+        )
+        matrix = np.array([row[1:] for row in rows], dtype=float).reshape(-1, 6)
+        return cls([row[0] for row in rows], matrix[:, :3].copy(), matrix[:, 3:].copy())
+
+    def copy(self) -> "NodeIndex":
+        index = NodeIndex(self.ids, self.available.copy(), self.totals)
+        index.placed = dict(self.placed)
+        return index
+
+    def node_of(self, deployment: Deployment) -> Optional[int]:
+        return self.placed.get(deployment.id, deployment.node_id)
+
+    def free(self, node_id: int) -> Resources:
+        return tuple(self.available[self.rows[node_id]])
+
+    def capacity(self, node_id: int) -> Resources:
+        return tuple(self.totals[self.rows[node_id]])
+
+    def _assign(self, demands: Sequence[Resources]) -> Optional[Tuple[np.ndarray, List[int]]]:
+        # Largest first, so small demands do not take the only node a large one fits on
+        available = self.available.copy()
+        nodes: List[int] = [0] * len(demands)
+        for position in sorted(range(len(demands)), key=lambda i: demands[i][::-1], reverse=True):
+            demand = np.asarray(demands[position], dtype=float)
+            if not self.ids:
+                return None
+            scores = score_clusters(available, self.totals, demand, "best_fit")
+            best = int(np.argmax(scores))
+            if not np.isfinite(scores[best]):
+                return None
+            available[best] -= demand
+            nodes[position] = self.ids[best]
+        return available, nodes
+
+    def fits(self, demands: Sequence[Resources]) -> bool:
+        """Whether every demand can go on some node at once."""
+        return self._assign(demands) is not None
+
+    def could_hold(self, demand: Resources) -> bool:
+        """Whether some node is large enough for demand once it is empty."""
+        return bool((self.totals >= np.asarray(demand, dtype=float)).all(axis=1).any())
+
+    def assign(self, demands: Sequence[Resources]) -> Optional[List[int]]:
+        """Best-fit node for each demand, charged to the index.
+
+        None, with the index untouched, unless they all fit.
+        """
+        assigned = self._assign(demands)
+        if assigned is None:
+            return None
+        self.available, nodes = assigned
+        return nodes
+
+    def place(self, deployments: Sequence[Deployment]) -> Optional[List[int]]:
+        """assign() for deployments, remembering where each went."""
+        nodes = self.assign([requirements(deployment) for deployment in deployments])
+        if nodes is not None:
+            for deployment, node_id in zip(deployments, nodes):
+                self.placed[deployment.id] = node_id
+        return nodes
+
+    def release(self, deployment: Deployment) -> Optional[int]:
+        """Give deployment's resources back to its node, and return it; None if it had none."""
+        node_id = self.node_of(deployment)
+        if node_id is not None:
+            self.available[self.rows[node_id]] += requirements(deployment)
+            self.placed[deployment.id] = None
+        return node_id
+
+    def stranded(self, deployment: Deployment) -> bool:
+        """Whether deployment fits the nodes' free capacity added up, but no single node of it."""
+        demand = np.asarray(requirements(deployment), dtype=float)
+        return bool((self.available.sum(axis=0) >= demand).all()) and not self.fits([tuple(demand)])
+
+# Last committed index of each cluster, by cluster id, with the cluster version it is for
+_node_indexes: Dict[int, Tuple[int, NodeIndex]] = {}
+
+PENDING_NODE_INDEXES = "node_indexes"
+
+def node_index(session: Session, cluster: Any) -> NodeIndex:
+    """Free capacity of cluster's nodes as session's transaction sees it.
+
+    An index staged earlier in the transaction comes first, then the one cached
+    for the cluster's version, and only then a query. cluster needs id and
+    version, so a Cluster or a row of those columns.
+    """
+    staged = session.info.get(PENDING_NODE_INDEXES, {}).get(cluster.id)
+    if staged is not None:
+        return staged[1]
+    cached = _node_indexes.get(cluster.id)
+    if cached is not None and cached[0] == cluster.version:
+        return cached[1].copy()
+    index = NodeIndex.load(session, cluster.id)
+    _node_indexes[cluster.id] = (cluster.version, index.copy())
+    return index
+
+def stage_node_index(
+    session: Session, cluster_id: int, index: NodeIndex, version: Optional[int] = None
+) -> None:
+    """Cache index as the cluster's when session commits.
+
+    version is the one the commit leaves the cluster at; without it, it is taken
+    from the Cluster in the session once the session has flushed it.
+    """
+    session.info.setdefault(PENDING_NODE_INDEXES, {})[cluster_id] = [version, index, None]
+
+@event.listens_for(Session, "after_flush")
+def _track_cluster_versions(session: Session, flush_context) -> None:
+    for cluster_id, staged in session.info.get(PENDING_NODE_INDEXES, {}).items():
+        cluster = session.identity_map.get(identity_key(Cluster, cluster_id))
+        if cluster is not None:
+            staged[2] = inspect(cluster).dict.get("version")
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed(session: Session) -> None:
+    for cluster_id, (version, index, flushed_version) in session.info.pop(PENDING_NODE_INDEXES, {}).items():
+        version = version if version is not None else flushed_version
+        if version is not None:
+            committed = index.copy()
+            committed.placed = {}
+            _node_indexes[cluster_id] = (version, committed)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session) -> None:
+    session.info.pop(PENDING_NODE_INDEXES, None)
+
+class PlacementService:
+    def place(
+        self,
+        db: Session,
+        *,
+        organization_id: int,
+        requirements: Tuple[float, float, float],
+        policy: Optional[str] = None,
+    ) -> Optional[int]:
+        """Pick a cluster in the organization for a deployment.
+
+        Returns the best cluster that can start it now; failing that, the least
+        loaded cluster large enough to ever hold it (where it will queue), or None
+        if no cluster in the organization is big enough.
+        """
+        return self.place_many(
+            db, organization_id=organization_id, requirements=[requirements], policy=policy
+        )[0]
+
+    def place_many(
+        self,
+        db: Session,
+        *,
+        organization_id: int,
+        requirements: List[Tuple[float, float, float]],
+        policy: Optional[str] = None,
+    ) -> List[Optional[int]]:
+        """Place several deployments with one cluster query.
+
+        Each deployment is placed as by place(), and capacity it will start on is
+        reserved before the next one is placed so a batch spreads instead of piling
+        onto the cluster that looked best for the first item. A cluster with nodes
+        only counts if one of them can take the deployment.
+        """
+        rows = (
+            db.query(
+                Cluster.id,
+                Cluster.available_cpu,
+                Cluster.available_ram,
+                Cluster.available_gpu,
+                Cluster.total_cpu,
+                Cluster.total_ram,
+                Cluster.total_gpu,
+                Cluster.version,
+                Cluster.node_count,
+            )
+            .filter(Cluster.organization_id == organization_id)
+            .all()
+        )
+        if not rows:
+            return [None] * len(requirements)
+
+        matrix = np.array([row[1:7] for row in rows], dtype=float)
+        available, totals = matrix[:, :3], matrix[:, 3:]
+        ids = np.array([row[0] for row in rows])
+        nodes = {position: node_index(db, row) for position, row in enumerate(rows) if row.node_count}
+        policy = policy or settings.SCHEDULER_PLACEMENT_POLICY
+
+        placements: List[Optional[int]] = []
+        for item in requirements:
+            demand = np.asarray(item, dtype=float)
+            scores = score_clusters(available, totals, demand, policy)
+            for position, index in nodes.items():
+                if np.isfinite(scores[position]) and not index.fits([item]):
+                    scores[position] = -np.inf
+            best = int(np.argmax(scores))
+            if np.isfinite(scores[best]):
+                available[best] -= demand
+                if best in nodes:
+                    nodes[best].assign([item])
+                placements.append(int(ids[best]))
+                continue
+
+            # Nothing fits right now: queue where the deployment will fit soonest
+            scores = score_clusters(totals, totals, demand, "least_loaded")
+            for position, index in nodes.items():
+                if not index.could_hold(item):
+                    scores[position] = -np.inf
+            fallback = score_clusters(available, totals, np.zeros(3), "least_loaded")
+            scores = np.where(np.isfinite(scores), fallback, -np.inf)
+            best = int(np.argmax(scores))
+            placements.append(int(ids[best]) if np.isfinite(scores[best]) else None)
+        return placements
+
+placement_service = PlacementService()
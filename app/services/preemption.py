@@ -0,0 +1,174 @@
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+from app.db.models import Deployment
+from app.services.gang import Unit, members
+
+Resources = Tuple[float, float, float]
+
+_EPSILON = 1e-9
+
+@dataclass
+class PreemptionPlan:
+    """Eviction set that lets a deployment start, computed before any state changes."""
+    deployment_id: int
+    feasible: bool
+    victims: List[Deployment] = field(default_factory=list)
+    cost: float = 0.0
+    # False when the bounded search ran out of time or candidates and the heuristic answer was used
+    exact: bool = True
+
+    @property
+    def victim_ids(self) -> List[int]:
+        return [victim.id for victim in self.victims]
+
+def requirements(deployment: Unit) -> Resources:
+    return (deployment.required_cpu, deployment.required_ram, deployment.required_gpu)
+
+def eviction_cost(deployment: Unit, totals: Resources, cost_model: str) -> float:
+    """Cost of evicting a deployment, or every member of a gang.
+
+    "priority" charges priority + 1, so among equal priorities fewer evictions win.
+    "resources" charges the deployment's footprint normalized by cluster capacity.
+    """
+    if cost_model == "resources":
+        return sum(used / total for used, total in zip(requirements(deployment), totals) if total)
+    return sum(float(member.priority + 1) for member in members(deployment))
+
+def _covers(freed: Sequence[float], shortfall: Resources) -> bool:
+    return all(f >= s - _EPSILON for f, s in zip(freed, shortfall))
+
+def _add(a: Sequence[float], b: Sequence[float]) -> Resources:
+    return (a[0] + b[0], a[1] + b[1], a[2] + b[2])
+
+def _greedy(
+    resources: List[Resources], costs: List[float], shortfall: Resources
+) -> Optional[List[int]]:
+    """Cheapest cost per unit of remaining (normalized) shortfall first, then drop redundant picks."""
+    remaining = list(shortfall)
+    pool = set(range(len(resources)))
+    chosen: List[int] = []
+    while not _covers((0.0, 0.0, 0.0), tuple(remaining)):
+        best, best_ratio = None, None
+        for index in pool:
+            gain = sum(
+                min(resources[index][k], remaining[k]) / shortfall[k]
+                for k in range(3)
+                if remaining[k] > _EPSILON
+            )
+            if gain <= _EPSILON:
+                continue
+            ratio = costs[index] / gain
+            if best_ratio is None or ratio < best_ratio:
+                best, best_ratio = index, ratio
+        if best is None:
+            return None
+        pool.remove(best)
+        chosen.append(best)
+        remaining = [r - used for r, used in zip(remaining, resources[best])]
+
+    for index in sorted(chosen, key=lambda i: -costs[i]):
+        rest = [i for i in chosen if i != index]
+        freed = (0.0, 0.0, 0.0)
+        for i in rest:
+            freed = _add(freed, resources[i])
+        if _covers(freed, shortfall):
+            chosen = rest
+    return chosen
+
+class _OutOfTime(Exception):
+    pass
+
+def select_victims(
+    resources: List[Resources],
+    costs: List[float],
+    shortfall: Resources,
+    exact_limit: int,
+    time_budget: float,
+) -> Tuple[Optional[List[int]], bool]:
+    """Minimum-cost subset of candidates whose resources cover the shortfall.
+
+    A small multi-dimensional covering knapsack: branch and bound for up to
+    exact_limit candidates within time_budget seconds, seeded with (and falling
+    back to) the greedy answer. Returns (indices or None if infeasible, exact).
+    """
+    total = (0.0, 0.0, 0.0)
+    for r in resources:
+        total = _add(total, r)
+    if not _covers(total, shortfall):
+        return None, True
+
+    greedy = _greedy(resources, costs, shortfall)
+    if len(resources) > exact_limit:
+        return greedy, False
+
+    order = sorted(range(len(resources)), key=lambda i: costs[i])
+    suffix: List[Resources] = [(0.0, 0.0, 0.0)] * (len(order) + 1)
+    for position in range(len(order) - 1, -1, -1):
+        suffix[position] = _add(suffix[position + 1], resources[order[position]])
+
+    best = list(greedy)
+    best_cost = sum(costs[i] for i in best)
+    deadline = time.perf_counter() + time_budget
+    nodes = 0
+
+    def search(position: int, freed: Resources, cost: float, chosen: List[int]) -> None:
+        nonlocal best, best_cost, nodes
+        nodes += 1
+        if nodes % 256 == 0 and time.perf_counter() > deadline:
+            raise _OutOfTime()
+        if _covers(freed, shortfall):
+            if cost < best_cost - _EPSILON:
+                best, best_cost = list(chosen), cost
+            return
+        if position == len(order):
+            return
+        # Candidates are sorted by cost, so at least costs[order[position]] more is needed
+        if cost + costs[order[position]] >= best_cost - _EPSILON:
+            return
+        if not _covers(_add(freed, suffix[position]), shortfall):
+            return
+        index = order[position]
+        chosen.append(index)
+        search(position + 1, _add(freed, resources[index]), cost + costs[index], chosen)
+        chosen.pop()
+        search(position + 1, freed, cost, chosen)
+
+    try:
+        search(0, (0.0, 0.0, 0.0), 0.0, [])
+    except _OutOfTime:
+        return best, False
+    return best, True
+
+def plan_preemption(
+    deployment: Unit,
+    candidates: List[Unit],
+    available: Resources,
+    totals: Resources,
+    cost_model: str,
+    exact_limit: int,
+    time_budget: float,
+) -> PreemptionPlan:
+    """Choose which candidates to evict so deployment fits into available plus what they free.
+
+    A gang candidate is evicted whole, so its members all end up in the victims.
+    """
+    shortfall = tuple(
+        max(0.0, needed - free) for needed, free in zip(requirements(deployment), available)
+    )
+    if _covers((0.0, 0.0, 0.0), shortfall):
+        return PreemptionPlan(deployment_id=deployment.id, feasible=True)
+
+    resources = [requirements(candidate) for candidate in candidates]
+    costs = [eviction_cost(candidate, totals, cost_model) for candidate in candidates]
+    chosen, exact = select_victims(resources, costs, shortfall, exact_limit, time_budget)
+    if chosen is None:
+        return PreemptionPlan(deployment_id=deployment.id, feasible=False, exact=exact)
+    return PreemptionPlan(
+        deployment_id=deployment.id,
+        feasible=True,
+        victims=[victim for i in chosen for victim in members(candidates[i])],
+        cost=sum(costs[i] for i in chosen),
+        exact=exact,
+    )
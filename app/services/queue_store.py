@@ -0,0 +1,135 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple, Union
+
+import redis
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.db.models import Deployment, DeploymentStatus
+
+logger = logging.getLogger(__name__)
+
+# (cluster_id, member, queued, score)
+QueueEntry = Tuple[int, str, bool, float]
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+class QueueStore:
+    """Per-cluster queued deployments mirrored into Redis sorted sets.
+
+    Postgres stays the source of truth: entries are written after the scheduling
+    transaction commits, readers re-check status in SQL, and reconcile() rebuilds
+    every set from the deployments table.
+
+    The score is only the negated priority, which a double holds exactly. Members
+    with the same score are ordered byte-wise by Redis, so each member is the
+    zero-padded creation time in microseconds followed by the zero-padded id: the
+    set then sorts by priority, then age, then id, without any float rounding.
+    """
+
+    KEY_PREFIX = "scheduler:queue:"
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+
+    @classmethod
+    def key(cls, cluster_id: int) -> str:
+        return f"{cls.KEY_PREFIX}{cluster_id}"
+
+    @staticmethod
+    def score(deployment: Deployment) -> float:
+        """Lower scores are served first: highest priority."""
+        return float(-(deployment.priority or 0))
+
+    @staticmethod
+    def member(deployment: Deployment) -> str:
+        """Sorted-set member: oldest first, then lowest id, among equal priorities."""
+        created = deployment.created_at
+        if created is None:
+            micros = 0
+        else:
+            if created.tzinfo is not None:
+                created = created.astimezone(timezone.utc).replace(tzinfo=None)
+            micros = max((created - _EPOCH) // _MICROSECOND, 0)
+        return f"{micros:020d}:{deployment.id:020d}"
+
+    @staticmethod
+    def deployment_id(member: Union[bytes, str]) -> int:
+        if isinstance(member, bytes):
+            member = member.decode()
+        return int(member.rsplit(":", 1)[1])
+
+    @classmethod
+    def entry(cls, deployment: Deployment, queued: Optional[bool] = None) -> QueueEntry:
+        if queued is None:
+            queued = deployment.status == DeploymentStatus.QUEUED
+        return (deployment.cluster_id, cls.member(deployment), queued, cls.score(deployment))
+
+    def apply(self, entries: Iterable[QueueEntry]) -> None:
+        """Add queued entries and remove everything else, in one round trip."""
+        pipe = self.client.pipeline(transaction=False)
+        for cluster_id, member, queued, score in entries:
+            if queued:
+                pipe.zadd(self.key(cluster_id), {member: score})
+            else:
+                pipe.zrem(self.key(cluster_id), member)
+        pipe.execute()
+
+    def remove(self, cluster_id: int, members: Iterable[str]) -> None:
+        members = list(members)
+        if members:
+            self.client.zrem(self.key(cluster_id), *members)
+
+    def head(self, cluster_id: int, limit: Optional[int] = None, offset: int = 0) -> List[str]:
+        """Members at the head of a cluster's queue, in scheduling order."""
+        end = -1 if limit is None else offset + limit - 1
+        return [
+            member.decode() if isinstance(member, bytes) else member
+            for member in self.client.zrange(self.key(cluster_id), offset, end)
+        ]
+
+    def size(self, cluster_id: int) -> int:
+        return self.client.zcard(self.key(cluster_id))
+
+    def reconcile(self, db: Session) -> int:
+        """Rebuild every cluster queue from Postgres. Returns the number of entries."""
+        queued = (
+            db.query(Deployment)
+            .filter(Deployment.status == DeploymentStatus.QUEUED)
+            .all()
+        )
+        pipe = self.client.pipeline(transaction=True)
+        for key in self.client.scan_iter(match=f"{self.KEY_PREFIX}*"):
+            pipe.delete(key)
+        for deployment in queued:
+            pipe.zadd(self.key(deployment.cluster_id), {self.member(deployment): self.score(deployment)})
+        pipe.execute()
+        return len(queued)
+
+_queue_store: Optional[QueueStore] = None
+
+def get_queue_store() -> Optional[QueueStore]:
+    """Shared store built from REDIS_URL, or None when Redis queues are disabled."""
+    global _queue_store
+    if not settings.SCHEDULER_REDIS_QUEUE_ENABLED:
+        return None
+    if _queue_store is None:
+        _queue_store = QueueStore(redis.Redis.from_url(settings.REDIS_URL))
+    return _queue_store
+
+def reconcile_queue_store() -> None:
+    """Startup hook: rebuild Redis queues from the deployments table."""
+    store = get_queue_store()
+    if store is None:
+        return
+    db = SessionLocal()
+    try:
+        count = store.reconcile(db)
+        logger.info("Reconciled %s queued deployments into Redis", count)
+    except Exception:
+        logger.exception("Could not reconcile Redis scheduler queues")
+    finally:
+        db.close()
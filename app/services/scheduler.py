@@ -1,94 +1,447 @@
-from typing import List, Optional, Dict
+from typing import Any, Callable, Iterable, List, Optional, Dict, Tuple, TypeVar
+from collections import deque
+from dataclasses import dataclass, field
 from datetime import datetime
+import enum
+import heapq
+import logging
+import random
+import time
+import redis
+from sqlalchemy import and_, func, or_, select, update
 from sqlalchemy.orm import Session
-from app.db.models import Cluster, Deployment, DeploymentStatus
+from sqlalchemy.orm.exc import StaleDataError
+from app.core.config import settings
+from app.core.metrics import (
+    SCHEDULER_BACKFILLS,
+    SCHEDULER_EVENTS,
+    SCHEDULER_GANG_TIMEOUTS,
+    SCHEDULER_PREEMPTIONS,
+    timed,
+)
+from app.core.response_cache import mark_changed
+from app.db.models import Cluster, Deployment, DeploymentStatus, Node
 from app.schemas.deployment import DeploymentCreate
+from app.services.backfill import Reservation, reserve
+from app.services.gang import LIVE, Gang, Unit, load_waiting_gangs, members, running_units
+from app.services.packing import get_packing_strategy
+from app.services.placement import NodeIndex, node_index, stage_node_index
+from app.services.preemption import PreemptionPlan, Resources, plan_preemption, requirements
+from app.services.queue_store import QueueEntry, QueueStore, get_queue_store
+from app.services.utilization import UtilizationSnapshot, stage_snapshot
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+def demands(unit: Unit) -> List[Resources]:
+    """What each member of unit needs, as it must be placed on nodes."""
+    return [requirements(member) for member in members(unit)]
+
+class SchedulerEvent(str, enum.Enum):
+    """Capacity changes that trigger an incremental scheduling pass."""
+    RELEASE = "release"
+    COMPLETION = "completion"
+    FAILURE = "failure"
+    CLUSTER_RESIZE = "cluster_resize"
+
+@dataclass
+class SchedulingPlan:
+    """In-memory scheduling decisions for one cluster, written in a single transaction."""
+    cluster_id: int
+    available_cpu: float
+    available_ram: float
+    available_gpu: int
+    version: int = 1
+    # (cpu, ram, gpu) capacity, for the utilization snapshot the plan leaves behind
+    total: Tuple[float, float, int] = (0.0, 0.0, 0)
+    cluster_changed: bool = False
+    changes: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    deployments: Dict[int, Deployment] = field(default_factory=dict)
+    preempted: int = 0
+    # Gangs failed for waiting past their deadline
+    expired: int = 0
+    # Deployments started ahead of a reservation
+    backfilled: int = 0
+    # Free capacity per node, for a cluster with nodes
+    nodes: Optional[NodeIndex] = None
+    # (cpu, ram, gpu) to add to each node's available capacity, by node id
+    node_changes: Dict[int, List[float]] = field(default_factory=dict)
+
+    @classmethod
+    def from_cluster(cls, cluster: Cluster, nodes: Optional[NodeIndex] = None) -> "SchedulingPlan":
+        return cls(
+            cluster_id=cluster.id,
+            available_cpu=cluster.available_cpu,
+            available_ram=cluster.available_ram,
+            available_gpu=cluster.available_gpu,
+            version=cluster.version,
+            total=(cluster.total_cpu, cluster.total_ram, cluster.total_gpu),
+            nodes=nodes,
+        )
+
+    def fits(self, deployment: Unit) -> bool:
+        return (
+            self.available_cpu >= deployment.required_cpu
+            and self.available_ram >= deployment.required_ram
+            and self.available_gpu >= deployment.required_gpu
+            and (self.nodes is None or self.nodes.fits(demands(deployment)))
+        )
+
+    def allocate(self, deployment: Unit) -> None:
+        self.available_cpu -= deployment.required_cpu
+        self.available_ram -= deployment.required_ram
+        self.available_gpu -= deployment.required_gpu
+        self.cluster_changed = True
+        if self.nodes is not None:
+            placed = self.nodes.place(members(deployment))
+            if placed is None:
+                raise ValueError(f"Deployment {deployment.id} does not fit on any node of cluster {self.cluster_id}")
+            for member, node_id in zip(members(deployment), placed):
+                self._charge_node(member, node_id, -1)
+
+    def release(self, deployment: Deployment) -> None:
+        self.available_cpu += deployment.required_cpu
+        self.available_ram += deployment.required_ram
+        self.available_gpu += deployment.required_gpu
+        self.cluster_changed = True
+        if self.nodes is not None:
+            node_id = self.nodes.release(deployment)
+            if node_id is not None:
+                self._charge_node(deployment, node_id, 1)
+
+    def _charge_node(self, deployment: Deployment, node_id: int, sign: int) -> None:
+        change = self.node_changes.setdefault(node_id, [0.0, 0.0, 0])
+        for position, value in enumerate(requirements(deployment)):
+            change[position] += sign * value
+        self.changes.setdefault(deployment.id, {})["node_id"] = node_id if sign < 0 else None
+        self.deployments[deployment.id] = deployment
+
+    def save(self) -> Tuple[Any, ...]:
+        """State to undo tentative decisions with restore(); for clusters without nodes."""
+        return (
+            self.available_cpu, self.available_ram, self.available_gpu, self.cluster_changed,
+            {deployment_id: dict(values) for deployment_id, values in self.changes.items()},
+            dict(self.deployments), self.preempted, self.backfilled,
+        )
+
+    def restore(self, saved: Tuple[Any, ...]) -> None:
+        (
+            self.available_cpu, self.available_ram, self.available_gpu, self.cluster_changed,
+            self.changes, self.deployments, self.preempted, self.backfilled,
+        ) = saved
+
+    def set_status(self, deployment: Deployment, status: DeploymentStatus, **values: Any) -> None:
+        self.changes.setdefault(deployment.id, {}).update(status=status, **values)
+        self.deployments[deployment.id] = deployment
+
+    def grouped_changes(self) -> List[Tuple[Dict[str, Any], List[int]]]:
+        """Group deployment changes with identical values so each group is one UPDATE."""
+        groups: Dict[Tuple, List[int]] = {}
+        for deployment_id, values in self.changes.items():
+            key = tuple(sorted(values.items(), key=lambda item: item[0]))
+            groups.setdefault(key, []).append(deployment_id)
+        return [(dict(key), ids) for key, ids in groups.items()]
 
 class SchedulerService:
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        queue_store: Optional[QueueStore] = None,
+        fairness_policy: Optional[str] = None,
+        packing_strategy: Optional[str] = None,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ):
         self.db = db
+        # Source of started_at/completed_at and gang deadlines; the simulator passes a virtual clock
+        self.clock = clock
+        self.queue_store = queue_store if queue_store is not None else get_queue_store()
+        self.fairness_policy = fairness_policy or settings.SCHEDULER_FAIRNESS_POLICY
+        self.packing_strategy = get_packing_strategy(
+            packing_strategy or settings.SCHEDULER_PACKING_STRATEGY
+        )
 
-    def can_allocate_resources(self, cluster: Cluster, deployment: Deployment) -> bool:
-        """Check if cluster has enough resources for the deployment."""
+    def can_allocate_resources(self, cluster: Cluster, deployment: Unit) -> bool:
+        """Check if cluster has enough resources for the deployment, on a single node if it has nodes."""
         return (
             cluster.available_cpu >= deployment.required_cpu
             and cluster.available_ram >= deployment.required_ram
             and cluster.available_gpu >= deployment.required_gpu
+            and (not cluster.node_count or node_index(self.db, cluster).fits(demands(deployment)))
         )
 
-    def allocate_resources(self, cluster: Cluster, deployment: Deployment) -> None:
+    def allocate_resources(self, cluster: Cluster, deployment: Unit, commit: bool = True) -> None:
         """Allocate resources from cluster to deployment."""
-        cluster.available_cpu -= deployment.required_cpu
-        cluster.available_ram -= deployment.required_ram
-        cluster.available_gpu -= deployment.required_gpu
-        self.db.commit()
+        self._adjust_capacity(cluster, deployment, -1, commit)
 
-    def release_resources(self, cluster: Cluster, deployment: Deployment) -> None:
+    def release_resources(self, cluster: Cluster, deployment: Deployment, commit: bool = True) -> None:
         """Release resources back to cluster."""
-        cluster.available_cpu += deployment.required_cpu
-        cluster.available_ram += deployment.required_ram
-        cluster.available_gpu += deployment.required_gpu
-        self.db.commit()
+        self._adjust_capacity(cluster, deployment, 1, commit)
 
-    def get_queued_deployments(self, cluster_id: int) -> List[Deployment]:
-        """Get all queued deployments for a cluster."""
-        return (
+    def _adjust_capacity(self, cluster: Cluster, deployment: Unit, sign: int, commit: bool) -> None:
+        def adjust() -> None:
+            cluster.available_cpu += sign * deployment.required_cpu
+            cluster.available_ram += sign * deployment.required_ram
+            cluster.available_gpu += sign * deployment.required_gpu
+            if cluster.node_count:
+                self._adjust_nodes(cluster, deployment, sign)
+            if commit:
+                self.db.commit()
+
+        if commit:
+            self._retry_on_conflict(adjust)
+        else:
+            adjust()
+
+    def _adjust_nodes(self, cluster: Cluster, unit: Unit, sign: int) -> None:
+        """Place unit's members on nodes, or take them off theirs, in the transaction's node index."""
+        nodes = node_index(self.db, cluster)
+        if sign < 0:
+            placed = nodes.place(members(unit))
+            if placed is None:
+                raise ValueError(f"Deployment {unit.id} does not fit on any node of cluster {cluster.id}")
+        else:
+            placed = [nodes.release(member) for member in members(unit)]
+        changes: Dict[int, List[float]] = {}
+        for member, node_id in zip(members(unit), placed):
+            if node_id is None:
+                continue
+            change = changes.setdefault(node_id, [0.0, 0.0, 0])
+            for position, value in enumerate(requirements(member)):
+                change[position] += sign * value
+            member.node_id = node_id if sign < 0 else None
+        self._update_nodes(changes)
+        stage_node_index(self.db, cluster.id, nodes)
+
+    def _update_nodes(self, changes: Dict[int, List[float]]) -> None:
+        # Relative, so the rows stay right whatever the index was built from
+        for node_id, (cpu, ram, gpu) in changes.items():
+            self.db.execute(
+                update(Node)
+                .where(Node.id == node_id)
+                .values(
+                    available_cpu=Node.available_cpu + cpu,
+                    available_ram=Node.available_ram + ram,
+                    available_gpu=Node.available_gpu + gpu,
+                )
+            )
+
+    def _nodes(self, cluster: Cluster) -> Optional[NodeIndex]:
+        """The node index of a cluster with nodes, None for a cluster that is one pool."""
+        return node_index(self.db, cluster) if cluster.node_count else None
+
+    def _retry_on_conflict(self, operation: Callable[[], T]) -> T:
+        """Run operation, retrying when another worker changed the cluster row first.
+
+        Clusters carry an optimistic version column, so a concurrent write surfaces
+        as StaleDataError on flush. The session is rolled back, which expires every
+        loaded object, and the operation is re-run against fresh rows.
+        """
+        for attempt in range(settings.SCHEDULER_CONFLICT_RETRIES + 1):
+            try:
+                return operation()
+            except StaleDataError:
+                self.db.rollback()
+                if attempt == settings.SCHEDULER_CONFLICT_RETRIES:
+                    raise
+                time.sleep(random.uniform(0, settings.SCHEDULER_RETRY_BACKOFF * 2 ** attempt))
+
+    def get_queued_deployments(self, cluster_id: int, limit: Optional[int] = None) -> List[Deployment]:
+        """Get queued deployments for a cluster, head of the queue first."""
+        if self.queue_store is not None:
+            try:
+                return self._get_queued_from_store(cluster_id, limit)
+            except redis.RedisError:
+                logger.warning("Redis queue unavailable, falling back to Postgres", exc_info=True)
+
+        query = (
             self.db.query(Deployment)
             .filter(
                 Deployment.cluster_id == cluster_id,
                 Deployment.status == DeploymentStatus.QUEUED
             )
-            .all()
+            .order_by(Deployment.priority.desc(), Deployment.created_at.asc())
         )
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    def _get_queued_from_store(self, cluster_id: int, limit: Optional[int]) -> List[Deployment]:
+        members = self.queue_store.head(cluster_id, limit)
+        if not members:
+            return []
+        return self._queued_from_members(cluster_id, members)
+
+    def _queued_from_members(self, cluster_id: int, members: List[str]) -> List[Deployment]:
+        """Load queue-store members that are still queued in SQL, in store order."""
+        deployment_ids = [QueueStore.deployment_id(member) for member in members]
+        deployments = {
+            deployment.id: deployment
+            for deployment in self.db.query(Deployment).filter(
+                Deployment.id.in_(deployment_ids),
+                Deployment.cluster_id == cluster_id,
+                Deployment.status == DeploymentStatus.QUEUED,
+            )
+        }
+        # Drop entries whose deployment left the queue without the store hearing about it
+        stale = [
+            member for member, deployment_id in zip(members, deployment_ids)
+            if deployment_id not in deployments
+        ]
+        if stale:
+            self.queue_store.remove(cluster_id, stale)
+        return [deployments[deployment_id] for deployment_id in deployment_ids if deployment_id in deployments]
+
+    def sync_queue(self, deployments: Iterable[Deployment]) -> None:
+        """Mirror the deployments' current queue membership and score into the queue store."""
+        if self.queue_store is not None:
+            self._apply_queue_entries([QueueStore.entry(deployment) for deployment in deployments])
+
+    def _commit(self, deployments: Iterable[Deployment] = ()) -> None:
+        """Commit, then mirror the touched deployments into the queue store."""
+        entries = [QueueStore.entry(deployment) for deployment in deployments] if self.queue_store else []
+        self.db.commit()
+        self._apply_queue_entries(entries)
+
+    def _apply_queue_entries(self, entries: List[QueueEntry]) -> None:
+        if not entries:
+            return
+        try:
+            self.queue_store.apply(entries)
+        except redis.RedisError:
+            logger.warning("Could not update Redis queue, it will be reconciled on restart", exc_info=True)
 
     def optimize_resource_packing(self, cluster: Cluster, queued_deployments: List[Deployment]) -> List[Deployment]:
         """Optimize resource utilization by packing deployments efficiently."""
-        # Calculate resource density (resource requirements / priority)
-        def get_resource_density(deployment: Deployment) -> float:
-            total_resources = deployment.required_cpu + deployment.required_ram + deployment.required_gpu
-            return total_resources / (deployment.priority + 1)  # Add 1 to avoid division by zero
-
-        # Sort by resource density (ascending) and priority (descending)
-        return sorted(
-            queued_deployments,
-            key=lambda d: (get_resource_density(d), -d.priority)
-        )
+        return self.packing_strategy(cluster, queued_deployments)
 
     def ensure_fairness(self, cluster: Cluster, queued_deployments: List[Deployment]) -> List[Deployment]:
         """Ensure fair resource distribution among users/organizations."""
-        # Group deployments by user
+        if self.fairness_policy == "round_robin":
+            return self.round_robin_fairness(queued_deployments)
+        return self.dominant_resource_fairness(cluster, queued_deployments)
+
+    def _group_by_user(self, queued_deployments: List[Deployment]) -> Dict[int, List[Deployment]]:
+        # Each user's deployments by priority, keeping the packing order for ties
         user_deployments: Dict[int, List[Deployment]] = {}
         for deployment in queued_deployments:
-            if deployment.user_id not in user_deployments:
-                user_deployments[deployment.user_id] = []
-            user_deployments[deployment.user_id].append(deployment)
-
-        # Sort each user's deployments by priority
+            user_deployments.setdefault(deployment.user_id, []).append(deployment)
         for user_id in user_deployments:
             user_deployments[user_id].sort(key=lambda d: -d.priority)
+        return user_deployments
+
+    def round_robin_fairness(self, queued_deployments: List[Deployment]) -> List[Deployment]:
+        """Legacy policy: take one deployment per user in turn."""
+        user_queues = {
+            user_id: deque(deployments)
+            for user_id, deployments in self._group_by_user(queued_deployments).items()
+        }
+
+        fair_queue = []
+        while user_queues:
+            for user_id in list(user_queues):
+                user_queue = user_queues[user_id]
+                fair_queue.append(user_queue.popleft())
+                if not user_queue:
+                    del user_queues[user_id]
+
+        return fair_queue
+
+    def get_user_allocations(self, cluster_id: int) -> Dict[int, Tuple[float, float, float]]:
+        """Sum of (cpu, ram, gpu) currently RUNNING on the cluster, per user."""
+        rows = (
+            self.db.query(
+                Deployment.user_id,
+                func.sum(Deployment.required_cpu),
+                func.sum(Deployment.required_ram),
+                func.sum(Deployment.required_gpu),
+            )
+            .filter(
+                Deployment.cluster_id == cluster_id,
+                Deployment.status == DeploymentStatus.RUNNING
+            )
+            .group_by(Deployment.user_id)
+            .all()
+        )
+        return {
+            user_id: (cpu or 0.0, ram or 0.0, gpu or 0.0)
+            for user_id, cpu, ram, gpu in rows
+        }
+
+    def dominant_resource_fairness(self, cluster: Cluster, queued_deployments: List[Deployment]) -> List[Deployment]:
+        """Order the queue by Dominant Resource Fairness.
+
+        The user with the smallest dominant share (their largest fraction of the
+        cluster's CPU, RAM or GPU, counting what they already run) goes next; their
+        share is then charged for the deployment handed out. O(n log n) via a heap.
+        """
+        totals = (cluster.total_cpu, cluster.total_ram, cluster.total_gpu)
+
+        def dominant_share(usage: Tuple[float, float, float]) -> float:
+            return max(
+                (used / total for used, total in zip(usage, totals) if total),
+                default=0.0,
+            )
+
+        user_deployments = self._group_by_user(queued_deployments)
+        allocations = self.get_user_allocations(cluster.id)
+        usage = {
+            user_id: allocations.get(user_id, (0.0, 0.0, 0.0))
+            for user_id in user_deployments
+        }
+        # Ties go to the user whose first deployment came first in the input order
+        heap = [
+            (dominant_share(usage[user_id]), order, user_id)
+            for order, user_id in enumerate(user_deployments)
+        ]
+        heapq.heapify(heap)
+        positions = {user_id: 0 for user_id in user_deployments}
 
-        # Round-robin scheduling among users
         fair_queue = []
-        while any(user_deployments.values()):
-            for user_id in list(user_deployments.keys()):
-                if user_deployments[user_id]:
-                    fair_queue.append(user_deployments[user_id].pop(0))
+        while heap:
+            _, order, user_id = heapq.heappop(heap)
+            deployments = user_deployments[user_id]
+            deployment = deployments[positions[user_id]]
+            positions[user_id] += 1
+            fair_queue.append(deployment)
+
+            if positions[user_id] < len(deployments):
+                cpu, ram, gpu = usage[user_id]
+                usage[user_id] = (
+                    cpu + deployment.required_cpu,
+                    ram + deployment.required_ram,
+                    gpu + deployment.required_gpu,
+                )
+                heapq.heappush(heap, (dominant_share(usage[user_id]), order, user_id))
 
         return fair_queue
 
-    def handle_resource_fragmentation(self, cluster: Cluster) -> None:
-        """Handle resource fragmentation by consolidating resources."""
-        # Calculate fragmentation metrics
-        cpu_fragmentation = cluster.available_cpu / cluster.total_cpu
-        ram_fragmentation = cluster.available_ram / cluster.total_ram
-        gpu_fragmentation = cluster.available_gpu / cluster.total_gpu
+    def handle_resource_fragmentation(self, cluster: Cluster, queued_deployments: Iterable[Unit] = ()) -> None:
+        """Handle resource fragmentation by consolidating resources.
 
-        # If fragmentation is high, consider preempting and rescheduling
-        if min(cpu_fragmentation, ram_fragmentation, gpu_fragmentation) < 0.2:
+        On a cluster with nodes only queued_deployments stranded between nodes are
+        helped, each by evicting lower-priority deployments from a single node.
+        """
+        if cluster.node_count:
+            queued_deployments = list(queued_deployments)
+            self._retry_on_conflict(lambda: self._unstrand(cluster, queued_deployments))
+            return
+        available = (cluster.available_cpu, cluster.available_ram, cluster.available_gpu)
+        if self._is_fragmented(cluster, available):
             self.defragment_resources(cluster)
 
+    def _unstrand(self, cluster: Cluster, queued_deployments: List[Unit]) -> int:
+        plan = SchedulingPlan.from_cluster(cluster, self._nodes(cluster))
+        running_deployments = self.get_running_deployments(cluster.id)
+        self._plan_defragmentation(cluster, plan, queued_deployments, running_deployments, self.clock())
+        return self.apply_plan(plan)
+
+    @timed("defragment_resources")
     def defragment_resources(self, cluster: Cluster) -> None:
         """Defragment resources by preempting and rescheduling deployments."""
+        self._retry_on_conflict(lambda: self._defragment_resources(cluster))
+
+    def _defragment_resources(self, cluster: Cluster) -> None:
         # Get all running deployments
         running_deployments = (
             self.db.query(Deployment)
@@ -100,103 +453,711 @@ class SchedulerService:
             .all()
         )
 
-        # Preempt lower priority deployments
-        for deployment in running_deployments:
-            if deployment.priority < 5:  # Only preempt low priority deployments
-                self.release_resources(cluster, deployment)
-                deployment.status = DeploymentStatus.QUEUED
-                deployment.completed_at = datetime.utcnow()
-                self.db.commit()
+        # Preempt lower priority deployments, and gangs whole
+        preempted = []
+        now = self.clock()
+        for unit in running_units(running_deployments):
+            if unit.priority < 5:  # Only preempt low priority deployments
+                for deployment in members(unit):
+                    self.release_resources(cluster, deployment, commit=False)
+                    deployment.status = DeploymentStatus.QUEUED
+                    deployment.completed_at = now
+                    preempted.append(deployment)
+        self._commit(preempted)
+        SCHEDULER_PREEMPTIONS.inc(len(preempted))
 
+    @timed("schedule_deployment")
     def schedule_deployment(self, deployment: Deployment) -> bool:
         """Attempt to schedule a deployment."""
+        return self._retry_on_conflict(lambda: self._schedule_deployment(deployment))
+
+    def _schedule_deployment(self, deployment: Deployment) -> bool:
         cluster = self.db.query(Cluster).filter(Cluster.id == deployment.cluster_id).first()
         
         if not cluster:
             return False
 
-        if self.can_allocate_resources(cluster, deployment):
-            self.allocate_resources(cluster, deployment)
-            deployment.status = DeploymentStatus.RUNNING
-            deployment.started_at = datetime.utcnow()
-            self.db.commit()
+        unit = self._waiting_unit(cluster, deployment)
+        if unit is None:
+            return deployment.status == DeploymentStatus.RUNNING
+
+        now = self.clock()
+        if self.can_allocate_resources(cluster, unit) and self._backfill_allows(cluster, unit, now):
+            self.allocate_resources(cluster, unit, commit=False)
+            for member in members(unit):
+                member.status = DeploymentStatus.RUNNING
+                member.started_at = now
+            self._commit(members(unit))
             return True
         
-        deployment.status = DeploymentStatus.QUEUED
-        self.db.commit()
+        for member in members(unit):
+            member.status = DeploymentStatus.QUEUED
+        self._commit(members(unit))
         return False
 
+    @timed("preempt_deployments")
     def preempt_deployments(self, new_deployment: Deployment) -> bool:
         """Attempt to preempt lower priority deployments to schedule a higher priority one."""
+        return self._retry_on_conflict(lambda: self._preempt_deployments(new_deployment))
+
+    def _preempt_deployments(self, new_deployment: Deployment) -> bool:
         cluster = self.db.query(Cluster).filter(Cluster.id == new_deployment.cluster_id).first()
         if not cluster:
             return False
 
-        # Get all running deployments ordered by priority (ascending)
-        running_deployments = (
+        unit = self._waiting_unit(cluster, new_deployment)
+        if unit is None:
+            return new_deployment.status == DeploymentStatus.RUNNING
+
+        # Choose the eviction set up front; nothing is touched unless it works
+        plan = self.select_preemption(
+            cluster,
+            unit,
+            self.get_running_deployments(cluster.id),
+            (cluster.available_cpu, cluster.available_ram, cluster.available_gpu),
+            self._nodes(cluster),
+        )
+        now = self.clock()
+        if not plan.feasible or not self._backfill_allows(cluster, unit, now):
+            for member in members(unit):
+                member.status = DeploymentStatus.QUEUED
+            self._commit(members(unit))
+            return False
+
+        for deployment in plan.victims:
+            self.release_resources(cluster, deployment, commit=False)
+            deployment.status = DeploymentStatus.QUEUED
+            deployment.completed_at = now
+
+        self.allocate_resources(cluster, unit, commit=False)
+        for member in members(unit):
+            member.status = DeploymentStatus.RUNNING
+            member.started_at = now
+        self._commit(plan.victims + members(unit))
+        SCHEDULER_PREEMPTIONS.inc(len(plan.victims))
+        return True
+
+    @timed("plan_preemption")
+    def plan_preemption(self, new_deployment: Deployment) -> PreemptionPlan:
+        """Dry run: the eviction set preempt_deployments would use, without changing anything.
+
+        For a waiting member of a group the plan starts its whole gang.
+        """
+        cluster = self.db.query(Cluster).filter(Cluster.id == new_deployment.cluster_id).first()
+        if not cluster:
+            return PreemptionPlan(deployment_id=new_deployment.id, feasible=False)
+        unit: Unit = new_deployment
+        if new_deployment.group_id is not None:
+            gang = load_waiting_gangs(self.db, [new_deployment.group_id]).get(new_deployment.group_id)
+            if gang is not None and new_deployment in gang.members:
+                unit = gang
+        plan = self.select_preemption(
+            cluster,
+            unit,
+            self.get_running_deployments(cluster.id),
+            (cluster.available_cpu, cluster.available_ram, cluster.available_gpu),
+            self._nodes(cluster),
+        )
+        plan.deployment_id = new_deployment.id
+        return plan
+
+    def select_preemption(
+        self,
+        cluster: Cluster,
+        new_deployment: Unit,
+        running_deployments: List[Deployment],
+        available: Tuple[float, float, float],
+        nodes: Optional[NodeIndex] = None,
+    ) -> PreemptionPlan:
+        """Minimal-cost eviction set among strictly lower-priority running deployments.
+
+        Running members of a group are one candidate, evicted together, and never
+        victims of their own gang. With nodes, the set must also free room on
+        them; if the cluster-wide set frees it on the wrong ones, the cheapest set
+        on a single node is used instead.
+        """
+        candidates = [
+            unit
+            for unit in running_units(running_deployments)
+            if unit.priority < new_deployment.priority
+            and unit.id != new_deployment.id
+            and (new_deployment.group_id is None or unit.group_id != new_deployment.group_id)
+        ]
+        plan = plan_preemption(
+            new_deployment,
+            candidates,
+            available,
+            (cluster.total_cpu, cluster.total_ram, cluster.total_gpu),
+            cost_model=settings.SCHEDULER_PREEMPTION_COST,
+            exact_limit=settings.SCHEDULER_PREEMPTION_EXACT_LIMIT,
+            time_budget=settings.SCHEDULER_PREEMPTION_TIME_BUDGET,
+        )
+        if nodes is None or not plan.feasible:
+            return plan
+        freed = nodes.copy()
+        for victim in plan.victims:
+            freed.release(victim)
+        if freed.fits(demands(new_deployment)):
+            return plan
+        return self._node_preemption(new_deployment, candidates, nodes)
+
+    def _node_preemption(self, new_deployment: Unit, candidates: List[Unit], nodes: NodeIndex) -> PreemptionPlan:
+        """Cheapest eviction set among the candidates running entirely on one node.
+
+        Members of a gang may need several nodes, so a gang gets no plan here.
+        """
+        best = PreemptionPlan(deployment_id=new_deployment.id, feasible=False)
+        if isinstance(new_deployment, Gang):
+            return best
+        by_node: Dict[int, List[Unit]] = {}
+        for unit in candidates:
+            placed = {nodes.node_of(member) for member in members(unit)}
+            if len(placed) == 1 and None not in placed:
+                by_node.setdefault(placed.pop(), []).append(unit)
+        demand = requirements(new_deployment)
+        for node_id, on_node in by_node.items():
+            if any(need > total for need, total in zip(demand, nodes.capacity(node_id))):
+                continue
+            plan = plan_preemption(
+                new_deployment,
+                on_node,
+                nodes.free(node_id),
+                nodes.capacity(node_id),
+                cost_model=settings.SCHEDULER_PREEMPTION_COST,
+                exact_limit=settings.SCHEDULER_PREEMPTION_EXACT_LIMIT,
+                time_budget=settings.SCHEDULER_PREEMPTION_TIME_BUDGET,
+            )
+            if plan.feasible and (not best.feasible or plan.cost < best.cost):
+                best = plan
+        return best
+
+    def process_queue(self, cluster_id: int) -> None:
+        """Process the deployment queue; same as process_queue_batch."""
+        self.process_queue_batch(cluster_id)
+
+    def get_running_deployments(self, cluster_id: int) -> List[Deployment]:
+        """Get all running deployments for a cluster, lowest priority first."""
+        return (
             self.db.query(Deployment)
             .filter(
-                Deployment.cluster_id == cluster.id,
+                Deployment.cluster_id == cluster_id,
                 Deployment.status == DeploymentStatus.RUNNING
             )
             .order_by(Deployment.priority.asc())
             .all()
         )
 
-        # Calculate total resources needed
-        needed_cpu = new_deployment.required_cpu
-        needed_ram = new_deployment.required_ram
-        needed_gpu = new_deployment.required_gpu
+    def plan_queue(self, cluster: Cluster) -> SchedulingPlan:
+        """Build the scheduling plan for a cluster's queue without touching the database."""
+        plan = SchedulingPlan.from_cluster(cluster, self._nodes(cluster))
+        queued_deployments = self.get_queued_deployments(cluster.id)
+        running_deployments = self.get_running_deployments(cluster.id)
+        now = self.clock()
 
-        # Try to preempt lower priority deployments
-        for deployment in running_deployments:
-            if deployment.priority >= new_deployment.priority:
+        queued_units, expired = self._queued_units(queued_deployments, now)
+        for gang in expired:
+            self._plan_expiry(plan, gang, running_deployments, now)
+
+        started = self._plan_defragmentation(cluster, plan, queued_units, running_deployments, now)
+        queued_units = [unit for unit in queued_units if unit not in started]
+
+        placed = self._plan_units(cluster, plan, queued_units, running_deployments, now)
+        if placed or started or plan.nodes is not None or not queued_units:
+            return plan
+        # Nothing could start or preempt its way in: mirror defragment_resources, let
+        # the queue use the freed capacity, and put back evicted units that still fit
+        available = (plan.available_cpu, plan.available_ram, plan.available_gpu)
+        if not self._is_fragmented(cluster, available):
+            return plan
+        saved = plan.save(), list(running_deployments)
+        evicted = [unit for unit in running_units(running_deployments) if unit.priority < 5]
+        self._plan_evictions(
+            plan, [deployment for unit in evicted for deployment in members(unit)], running_deployments, now
+        )
+        placed = self._plan_units(cluster, plan, queued_units, running_deployments, now)
+        displaced = []
+        for unit in reversed(evicted):
+            if not plan.fits(unit):
+                displaced.append(unit)
                 continue
+            plan.allocate(unit)
+            running_deployments.extend(members(unit))
+            running_deployments.sort(key=lambda d: d.priority)
+            # Back where it was: neither an eviction nor a new start
+            for deployment in members(unit):
+                del plan.changes[deployment.id]
+                plan.preempted -= 1
+        # Keep it only if everything started outranks everything it displaced, so
+        # equal or lower priorities never take turns evicting each other
+        if not placed or (displaced and min(unit.priority for unit in placed) <= max(
+            unit.priority for unit in displaced
+        )):
+            plan.restore(saved[0])
+            running_deployments[:] = saved[1]
+        return plan
 
-            # Release resources from lower priority deployment
-            self.release_resources(cluster, deployment)
-            deployment.status = DeploymentStatus.QUEUED
-            deployment.completed_at = datetime.utcnow()
-
-            # Check if we have enough resources now
-            if (
-                cluster.available_cpu >= needed_cpu
-                and cluster.available_ram >= needed_ram
-                and cluster.available_gpu >= needed_gpu
-            ):
-                # Schedule the new deployment
-                self.allocate_resources(cluster, new_deployment)
-                new_deployment.status = DeploymentStatus.RUNNING
-                new_deployment.started_at = datetime.utcnow()
-                self.db.commit()
-                return True
+    def _plan_units(
+        self,
+        cluster: Cluster,
+        plan: SchedulingPlan,
+        queued_units: List[Unit],
+        running_deployments: List[Deployment],
+        now: datetime,
+    ) -> List[Unit]:
+        """Start or preempt for queued units in packing and fairness order; returns those started."""
+        optimized_deployments = self.optimize_resource_packing(cluster, queued_units)
+        fair_deployments = self.ensure_fairness(cluster, optimized_deployments)
+        reserved, reservation = self._plan_reservation(plan, fair_deployments, running_deployments, now)
 
-        # If we couldn't schedule the deployment, queue it
-        new_deployment.status = DeploymentStatus.QUEUED
-        self.db.commit()
-        return False
+        placed: List[Unit] = []
+        for unit in fair_deployments:
+            backfill = reservation is not None and unit is not reserved and reservation.ranks_above(unit)
+            if backfill and not reservation.allows(unit, now):
+                continue
 
-    def process_queue(self, cluster_id: int) -> None:
-        """Process the deployment queue with improved optimization."""
-        queued_deployments = self.get_queued_deployments(cluster_id)
-        cluster = self.db.query(Cluster).filter(Cluster.id == cluster_id).first()
-        
-        if not cluster:
-            return
+            if plan.fits(unit):
+                self._plan_start(plan, unit, running_deployments, now)
+            elif unit.priority <= 0 or not self._plan_preemption(cluster, plan, unit, running_deployments, now):
+                continue
+            placed.append(unit)
 
-        # Handle resource fragmentation
-        self.handle_resource_fragmentation(cluster)
-        
-        # Optimize resource packing
-        optimized_deployments = self.optimize_resource_packing(cluster, queued_deployments)
-        
-        # Ensure fairness
-        fair_deployments = self.ensure_fairness(cluster, optimized_deployments)
-        
-        # Schedule deployments
-        for deployment in fair_deployments:
-            if self.schedule_deployment(deployment):
+            if unit is reserved:
+                reservation = None
+            elif reservation is not None:
+                # Units ranked above the reserved one are not held back but still use up its leftover
+                reservation.claim(unit, now)
+                if backfill:
+                    plan.backfilled += 1
+
+        return placed
+
+    def apply_plan(self, plan: SchedulingPlan) -> int:
+        """Write a scheduling plan with bulk UPDATEs in one transaction.
+
+        Returns the number of rows changed. Nothing is written if any statement fails.
+        """
+        rows_changed = 0
+        try:
+            for values, deployment_ids in plan.grouped_changes():
+                result = self.db.execute(
+                    update(Deployment)
+                    .where(Deployment.id.in_(deployment_ids))
+                    .values(**values)
+                )
+                rows_changed += result.rowcount
+            if plan.cluster_changed:
+                result = self.db.execute(
+                    update(Cluster)
+                    .where(Cluster.id == plan.cluster_id, Cluster.version == plan.version)
+                    .values(
+                        available_cpu=plan.available_cpu,
+                        available_ram=plan.available_ram,
+                        available_gpu=plan.available_gpu,
+                        version=plan.version + 1,
+                    )
+                )
+                if result.rowcount != 1:
+                    raise StaleDataError(
+                        f"Cluster {plan.cluster_id} changed since version {plan.version}"
+                    )
+                rows_changed += result.rowcount
+                self._update_nodes(plan.node_changes)
+                if plan.nodes is not None:
+                    stage_node_index(self.db, plan.cluster_id, plan.nodes, plan.version + 1)
+                # A Core UPDATE bypasses the flush hooks, so report the change directly
+                mark_changed(self.db, [("cluster", plan.cluster_id)])
+                stage_snapshot(self.db, UtilizationSnapshot.from_capacity(
+                    plan.cluster_id, plan.total, (plan.available_cpu, plan.available_ram, plan.available_gpu)
+                ))
+            entries = [
+                QueueStore.entry(plan.deployments[deployment_id], values["status"] == DeploymentStatus.QUEUED)
+                for deployment_id, values in plan.changes.items()
+            ] if self.queue_store else []
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        self._apply_queue_entries(entries)
+        SCHEDULER_PREEMPTIONS.inc(plan.preempted)
+        SCHEDULER_GANG_TIMEOUTS.inc(plan.expired)
+        SCHEDULER_BACKFILLS.inc(plan.backfilled)
+        return rows_changed
+
+    @timed("process_queue_batch")
+    def process_queue_batch(self, cluster_id: int) -> int:
+        """Process the deployment queue in a single transaction.
+
+        The whole pass is planned in memory and written with a handful of bulk
+        UPDATEs instead of one commit per decision. Returns the number of rows
+        changed.
+        """
+        def process() -> int:
+            cluster = self.db.query(Cluster).filter(Cluster.id == cluster_id).first()
+            if not cluster:
+                return 0
+            return self.apply_plan(self.plan_queue(cluster))
+
+        return self._retry_on_conflict(process)
+
+    @timed("finish_deployment")
+    def finish_deployment(self, deployment: Deployment, status: DeploymentStatus) -> None:
+        """Mark a deployment COMPLETED or FAILED, releasing its resources if it was running.
+
+        A gang cannot go on without a member, so a failure also fails the rest of
+        its group and releases what they hold.
+        """
+        def finish() -> None:
+            finished = [deployment]
+            if status == DeploymentStatus.FAILED and deployment.group_id is not None:
+                finished += (
+                    self.db.query(Deployment)
+                    .filter(
+                        Deployment.group_id == deployment.group_id,
+                        Deployment.id != deployment.id,
+                        Deployment.status.in_(LIVE),
+                    )
+                    .all()
+                )
+            cluster = None
+            now = self.clock()
+            for member in finished:
+                if member.status == DeploymentStatus.RUNNING:
+                    if cluster is None:
+                        cluster = self.db.query(Cluster).filter(Cluster.id == member.cluster_id).first()
+                    if cluster:
+                        self.release_resources(cluster, member, commit=False)
+                member.status = status
+                member.completed_at = now
+            self._commit(finished)
+
+        self._retry_on_conflict(finish)
+
+    def get_fitting_candidates(self, cluster: Cluster, limit: int) -> List[Deployment]:
+        """Queue-head deployments that fit into the cluster's currently free resources."""
+        if self.queue_store is not None:
+            try:
+                return self._get_fitting_from_store(cluster, limit)
+            except redis.RedisError:
+                logger.warning("Redis queue unavailable, falling back to Postgres", exc_info=True)
+        return (
+            self.db.query(Deployment)
+            .filter(
+                Deployment.cluster_id == cluster.id,
+                Deployment.status == DeploymentStatus.QUEUED,
+                Deployment.required_cpu <= cluster.available_cpu,
+                Deployment.required_ram <= cluster.available_ram,
+                Deployment.required_gpu <= cluster.available_gpu,
+            )
+            .order_by(Deployment.priority.desc(), Deployment.created_at.asc())
+            .limit(limit)
+            .all()
+        )
+
+    def _get_fitting_from_store(self, cluster: Cluster, limit: int) -> List[Deployment]:
+        # Page through the queue like the SQL filter does, until enough fit or it runs out
+        candidates: List[Deployment] = []
+        offset = 0
+        while len(candidates) < limit:
+            members = self.queue_store.head(cluster.id, limit, offset)
+            if not members:
+                break
+            queued = self._queued_from_members(cluster.id, members)
+            candidates.extend(
+                deployment for deployment in queued if self.can_allocate_resources(cluster, deployment)
+            )
+            # Stale members were just removed, so the next page starts after the live ones
+            offset += len(queued)
+            if len(members) < limit:
+                break
+        return candidates[:limit]
+
+    def handle_event(self, cluster_id: int, event: SchedulerEvent) -> int:
+        """React to freed or added capacity with an incremental pass.
+
+        Unlike process_queue_batch this only considers the first
+        SCHEDULER_INCREMENTAL_CANDIDATES queued deployments that fit what is free,
+        never preempts, and writes the result in one transaction. Returns the
+        number of rows changed.
+        """
+        return self.handle_events(cluster_id, [event])
+
+    @timed("handle_event")
+    def handle_events(self, cluster_id: int, events: Iterable[SchedulerEvent]) -> int:
+        """handle_event for events coalesced on one cluster: each is counted, one pass serves all."""
+        for event in events:
+            logger.debug("Scheduler event %s on cluster %s", event.value, cluster_id)
+            SCHEDULER_EVENTS.labels(event.value).inc()
+
+        def reschedule() -> int:
+            cluster = self.db.query(Cluster).filter(Cluster.id == cluster_id).first()
+            if not cluster:
+                return 0
+            candidates = self.get_fitting_candidates(
+                cluster, settings.SCHEDULER_INCREMENTAL_CANDIDATES
+            )
+            # Every gang waiting here, so those too large for the candidates still time out
+            gangs = load_waiting_gangs(self.db, cluster_id=cluster.id)
+            now = self.clock()
+            units, expired = self._queued_units(candidates, now, gangs)
+            if not units and not expired:
+                return 0
+
+            plan = SchedulingPlan.from_cluster(cluster, self._nodes(cluster))
+            for gang in expired:
+                self._plan_expiry(plan, gang, [], now)
+            reservation = self._reservation(
+                cluster, (plan.available_cpu, plan.available_ram, plan.available_gpu), now
+            )
+            for unit in self.ensure_fairness(cluster, units):
+                if not plan.fits(unit):
+                    continue
+                if reservation is not None and unit.id == reservation.deployment_id:
+                    reservation = None
+                elif reservation is not None:
+                    backfill = reservation.ranks_above(unit)
+                    if backfill and not reservation.allows(unit, now):
+                        continue
+                    reservation.claim(unit, now)
+                    if backfill:
+                        plan.backfilled += 1
+                plan.allocate(unit)
+                for deployment in members(unit):
+                    plan.set_status(deployment, DeploymentStatus.RUNNING, started_at=now)
+            return self.apply_plan(plan)
+
+        return self._retry_on_conflict(reschedule)
+
+    def _reservation(
+        self,
+        cluster: Cluster,
+        available: Tuple[float, float, float],
+        now: datetime,
+        ahead_of: Optional[Unit] = None,
+    ) -> Optional[Reservation]:
+        """Reservation of the highest-priority queued deployment that does not fit into available.
+
+        With ahead_of, only deployments queued before it count. One statement
+        finds out there is nothing to reserve: backfilling is off, nothing is
+        blocked, or no running deployment has an estimate to reserve against.
+        """
+        if not settings.SCHEDULER_BACKFILL_ENABLED:
+            return None
+        estimated = (
+            Deployment.cluster_id == cluster.id,
+            Deployment.status == DeploymentStatus.RUNNING,
+            Deployment.estimated_runtime.is_not(None),
+        )
+        query = (
+            self.db.query(Deployment)
+            .filter(
+                Deployment.cluster_id == cluster.id,
+                Deployment.status == DeploymentStatus.QUEUED,
+                or_(
+                    Deployment.required_cpu > available[0],
+                    Deployment.required_ram > available[1],
+                    Deployment.required_gpu > available[2],
+                ),
+                select(Deployment.id).where(*estimated).exists(),
+            )
+            .order_by(Deployment.priority.desc(), Deployment.created_at.asc())
+        )
+        if ahead_of is not None:
+            query = query.filter(or_(
+                Deployment.priority > ahead_of.priority,
+                and_(Deployment.priority == ahead_of.priority, Deployment.created_at < ahead_of.created_at),
+            ))
+            if ahead_of.group_id is not None:
+                query = query.filter(or_(Deployment.group_id.is_(None), Deployment.group_id != ahead_of.group_id))
+        head = query.first()
+        if head is None:
+            return None
+        blocked: Unit = head
+        if head.group_id is not None:
+            blocked = load_waiting_gangs(self.db, [head.group_id]).get(head.group_id, head)
+        running = self.db.query(Deployment).filter(*estimated).all()
+        return reserve(blocked, available, running, now)
+
+    def _backfill_allows(self, cluster: Cluster, unit: Unit, now: datetime) -> bool:
+        """Whether unit may start now without delaying a reservation queued ahead of it."""
+        reservation = self._reservation(
+            cluster, (cluster.available_cpu, cluster.available_ram, cluster.available_gpu), now, ahead_of=unit
+        )
+        if reservation is None:
+            return True
+        if not reservation.allows(unit, now):
+            return False
+        SCHEDULER_BACKFILLS.inc()
+        return True
+
+    def _plan_reservation(
+        self,
+        plan: SchedulingPlan,
+        queue: List[Unit],
+        running_deployments: List[Deployment],
+        now: datetime,
+    ) -> Tuple[Optional[Unit], Optional[Reservation]]:
+        """The highest-priority unit of the queue that does not fit the plan, and its reservation."""
+        if not settings.SCHEDULER_BACKFILL_ENABLED:
+            return None, None
+        # max() keeps the first of equal priorities, so queue order breaks ties
+        reserved = max((unit for unit in queue if not plan.fits(unit)), key=lambda unit: unit.priority, default=None)
+        if reserved is None:
+            return None, None
+        return reserved, reserve(
+            reserved, (plan.available_cpu, plan.available_ram, plan.available_gpu), running_deployments, now
+        )
+
+    def _is_fragmented(self, cluster: Cluster, available: Tuple[float, float, float]) -> bool:
+        """Whether a cluster without nodes counts as fragmented: any resource less than 20% free."""
+        ratios = [
+            available[0] / cluster.total_cpu if cluster.total_cpu else 1.0,
+            available[1] / cluster.total_ram if cluster.total_ram else 1.0,
+            available[2] / cluster.total_gpu if cluster.total_gpu else 1.0,
+        ]
+        return min(ratios) < 0.2
+
+    def _queued_units(
+        self, deployments: List[Deployment], now: datetime, gangs: Optional[Dict[int, Gang]] = None
+    ) -> Tuple[List[Unit], List[Gang]]:
+        """Replace waiting group members by their gang, at its first member's place in the queue.
+
+        Returns the units to schedule and the gangs, of deployments' groups or of
+        gangs, that waited past their deadline.
+        """
+        if gangs is None:
+            gangs = load_waiting_gangs(
+                self.db, {deployment.group_id for deployment in deployments if deployment.group_id is not None}
+            )
+        expired = [gang for gang in gangs.values() if gang.expired(now)]
+        units: List[Unit] = []
+        placed = {gang.group_id for gang in expired}
+        for deployment in deployments:
+            if deployment.group_id is None:
+                units.append(deployment)
+            elif deployment.group_id not in placed and deployment.group_id in gangs:
+                placed.add(deployment.group_id)
+                units.append(gangs[deployment.group_id])
+        return units, expired
+
+    def _waiting_unit(self, cluster: Cluster, deployment: Deployment) -> Optional[Unit]:
+        """What starting deployment means: itself, or its whole waiting gang.
+
+        None if deployment no longer waits: it started with its gang, or the gang
+        has just been failed for waiting past its deadline.
+        """
+        if deployment.group_id is None:
+            return deployment
+        gang = load_waiting_gangs(self.db, [deployment.group_id]).get(deployment.group_id)
+        if gang is None or deployment not in gang.members:
+            return None
+        now = self.clock()
+        if not gang.expired(now):
+            return gang
+        for member in gang.running:
+            self.release_resources(cluster, member, commit=False)
+        for member in gang.members + gang.running:
+            member.status = DeploymentStatus.FAILED
+            member.completed_at = now
+        self._commit(gang.members + gang.running)
+        SCHEDULER_GANG_TIMEOUTS.inc()
+        return None
+
+    def _plan_expiry(
+        self,
+        plan: SchedulingPlan,
+        gang: Gang,
+        running_deployments: List[Deployment],
+        now: datetime,
+    ) -> None:
+        """Fail a gang that waited too long, releasing members of its group already running."""
+        for deployment in gang.running:
+            plan.release(deployment)
+            if deployment in running_deployments:
+                running_deployments.remove(deployment)
+        for deployment in gang.members + gang.running:
+            plan.set_status(deployment, DeploymentStatus.FAILED, completed_at=now)
+        plan.expired += 1
+
+    def _plan_start(
+        self,
+        plan: SchedulingPlan,
+        unit: Unit,
+        running_deployments: List[Deployment],
+        now: datetime,
+    ) -> None:
+        plan.allocate(unit)
+        for deployment in members(unit):
+            plan.set_status(deployment, DeploymentStatus.RUNNING, started_at=now)
+            running_deployments.append(deployment)
+        running_deployments.sort(key=lambda d: d.priority)
+
+    def _plan_preemption(
+        self,
+        cluster: Cluster,
+        plan: SchedulingPlan,
+        new_deployment: Unit,
+        running_deployments: List[Deployment],
+        now: datetime,
+    ) -> bool:
+        """Plan evictions for new_deployment; nothing is planned unless it then fits."""
+        preemption = self.select_preemption(
+            cluster,
+            new_deployment,
+            running_deployments,
+            (plan.available_cpu, plan.available_ram, plan.available_gpu),
+            plan.nodes,
+        )
+        if not preemption.feasible:
+            return False
+
+        self._plan_evictions(plan, preemption.victims, running_deployments, now)
+        self._plan_start(plan, new_deployment, running_deployments, now)
+        return True
+
+    def _plan_evictions(
+        self,
+        plan: SchedulingPlan,
+        victims: Iterable[Deployment],
+        running_deployments: List[Deployment],
+        now: datetime,
+    ) -> None:
+        for deployment in victims:
+            plan.release(deployment)
+            plan.set_status(deployment, DeploymentStatus.QUEUED, completed_at=now)
+            plan.preempted += 1
+            running_deployments.remove(deployment)
+
+    def _plan_defragmentation(
+        self,
+        cluster: Cluster,
+        plan: SchedulingPlan,
+        queue: List[Unit],
+        running_deployments: List[Deployment],
+        now: datetime,
+    ) -> List[Unit]:
+        """Help queued deployments stranded between nodes, before the regular pass.
+
+        Each queued deployment that fits the free capacity but no single node gets
+        the cheapest set of strictly lower-priority deployments on one node evicted,
+        and is started there. Returns the units started; none without nodes, where
+        plan_queue only defragments once the regular pass could place nothing.
+        """
+        if plan.nodes is None:
+            return []
+
+        started: List[Unit] = []
+        for unit in queue:
+            if isinstance(unit, Gang) or not plan.nodes.stranded(unit):
+                continue
+            candidates = [
+                candidate
+                for candidate in running_units(running_deployments)
+                if candidate.priority < unit.priority
+            ]
+            preemption = self._node_preemption(unit, candidates, plan.nodes)
+            if not preemption.feasible:
                 continue
-            
-            if deployment.priority > 0:
-                self.preempt_deployments(deployment) 
\ No newline at end of file
+            self._plan_evictions(plan, preemption.victims, running_deployments, now)
+            self._plan_start(plan, unit, running_deployments, now)
+            started.append(unit)
+        return started
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import queue
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.db.models import Deployment, DeploymentStatus
+from app.services.scheduler import SchedulerEvent, SchedulerService
+
+logger = logging.getLogger(__name__)
+
+class SchedulerQueueFull(Exception):
+    """Raised when the submission queue has reached SCHEDULER_MAX_QUEUE_DEPTH."""
+
+class SchedulerLoop:
+    """In-process background scheduler.
+
+    HTTP handlers only enqueue (cluster_id, deployment_id) submissions. Every tick the
+    loop drains them into per-cluster work queues and schedules each cluster on a
+    worker thread with its own session, so request latency no longer depends on how
+    much is already running on the cluster. Capacity events (releases, completions,
+    resizes) are coalesced per cluster and handled with one incremental pass.
+    """
+
+    def __init__(
+        self,
+        tick_interval: float = settings.SCHEDULER_TICK_INTERVAL,
+        max_queue_depth: int = settings.SCHEDULER_MAX_QUEUE_DEPTH,
+        session_factory=SessionLocal,
+    ):
+        self.tick_interval = tick_interval
+        self.max_queue_depth = max_queue_depth
+        self.session_factory = session_factory
+        # Submissions come from threadpool handlers, so this must be a thread-safe queue
+        self._submissions: "queue.Queue[Tuple[int, int]]" = queue.Queue(maxsize=max_queue_depth)
+        self._cluster_queues: Dict[int, Set[int]] = {}
+        # depth() reads the per-cluster queues from request threads while the loop mutates them
+        self._cluster_queues_lock = threading.Lock()
+        # Events are never rejected, they are deduplicated per cluster each tick
+        self._events: "queue.SimpleQueue[Tuple[int, SchedulerEvent]]" = queue.SimpleQueue()
+        self._cluster_events: Dict[int, Set[SchedulerEvent]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def depth(self) -> int:
+        """Number of deployments waiting for the loop."""
+        with self._cluster_queues_lock:
+            queued = sum(len(ids) for ids in self._cluster_queues.values())
+        return self._submissions.qsize() + queued
+
+    def submit(self, deployment: Deployment) -> None:
+        """Hand a PENDING deployment to the loop without blocking."""
+        if self.depth() >= self.max_queue_depth:
+            raise SchedulerQueueFull()
+        try:
+            self._submissions.put_nowait((deployment.cluster_id, deployment.id))
+        except queue.Full:
+            raise SchedulerQueueFull()
+
+    def notify(self, cluster_id: int, event: SchedulerEvent) -> None:
+        """Report a capacity change on a cluster without blocking."""
+        self._events.put((cluster_id, event))
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._stopping = asyncio.Event()
+        await asyncio.to_thread(self._recover_pending)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    async def tick(self) -> None:
+        """Drain submissions and schedule every cluster that has work."""
+        self._drain_submissions()
+        with self._cluster_queues_lock:
+            cluster_ids = set(self._cluster_queues) | set(self._cluster_events)
+            work = [
+                (cluster_id, self._cluster_queues.pop(cluster_id, set()), self._cluster_events.pop(cluster_id, set()))
+                for cluster_id in cluster_ids
+            ]
+        if not work:
+            return
+        await asyncio.gather(*(
+            asyncio.to_thread(self._schedule_cluster, cluster_id, deployment_ids, events)
+            for cluster_id, deployment_ids, events in work
+        ))
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Scheduler tick failed")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.tick_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _drain_submissions(self) -> None:
+        while True:
+            try:
+                cluster_id, deployment_id = self._submissions.get_nowait()
+            except queue.Empty:
+                break
+            self._enqueue([(cluster_id, deployment_id)])
+        while True:
+            try:
+                cluster_id, event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            self._cluster_events.setdefault(cluster_id, set()).add(event)
+
+    def _enqueue(self, items: Iterable[Tuple[int, int]]) -> None:
+        with self._cluster_queues_lock:
+            for cluster_id, deployment_id in items:
+                self._cluster_queues.setdefault(cluster_id, set()).add(deployment_id)
+
+    def _recover_pending(self) -> None:
+        """Pick up deployments that were accepted but not scheduled before a restart."""
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(Deployment.cluster_id, Deployment.id)
+                .filter(Deployment.status == DeploymentStatus.PENDING)
+                .all()
+            )
+        except Exception:
+            logger.exception("Could not recover pending deployments")
+            return
+        finally:
+            db.close()
+        self._enqueue(rows)
+
+    def _schedule_cluster(
+        self, cluster_id: int, deployment_ids: Set[int], events: Set[SchedulerEvent]
+    ) -> None:
+        db = self.session_factory()
+        try:
+            scheduler = SchedulerService(db)
+            if events:
+                # One incremental pass covers every event coalesced for this cluster
+                scheduler.handle_events(cluster_id, sorted(events, key=lambda event: event.value))
+            if not deployment_ids:
+                return
+            deployments: List[Deployment] = (
+                db.query(Deployment)
+                .filter(
+                    Deployment.id.in_(deployment_ids),
+                    Deployment.status == DeploymentStatus.PENDING,
+                )
+                .order_by(Deployment.priority.desc(), Deployment.created_at.asc())
+                .all()
+            )
+            for deployment in deployments:
+                if not scheduler.schedule_deployment(deployment):
+                    if deployment.priority > 0:
+                        scheduler.preempt_deployments(deployment)
+        except Exception:
+            logger.exception("Scheduling failed for cluster %s", cluster_id)
+        finally:
+            db.close()
+
+scheduler_loop = SchedulerLoop()
+
+def dispatch_event(db: Session, cluster_id: int, event: SchedulerEvent) -> None:
+    """Hand a capacity event to the background loop, or handle it inline without one."""
+    if settings.SCHEDULER_LOOP_ENABLED and scheduler_loop.running:
+        scheduler_loop.notify(cluster_id, event)
+    else:
+        SchedulerService(db).handle_event(cluster_id, event)
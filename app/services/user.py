@@ -1,8 +1,12 @@
-from typing import Optional
+from typing import Optional, Tuple
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.core.security import get_password_hash
+from app.core.principal_cache import invalidate_principal
+from app.core.security import get_password_hash, get_password_hash_async
 from app.db.models import User
 from app.schemas.user import UserCreate, UserUpdate
+from app.services.organization import bump_versions
 
 class UserService:
     def get(self, db: Session, id: int) -> Optional[User]:
@@ -33,8 +37,85 @@ class UserService:
             setattr(db_obj, field, update_data[field])
         
         db.add(db_obj)
+        # The organization lists its users, so its version moves with them
+        statement = bump_versions([db_obj.organization_id])
+        if statement is not None:
+            db.execute(statement)
         db.commit()
         db.refresh(db_obj)
+        invalidate_principal(db_obj.id)
         return db_obj
 
-user_service = UserService() 
\ No newline at end of file
+    def join_organization(self, db: Session, db_obj: User, organization_id: int) -> User:
+        statement = bump_versions([db_obj.organization_id, organization_id])
+        if statement is not None:
+            db.execute(statement)
+        db_obj.organization_id = organization_id
+        db.add(db_obj)
+        db.commit()
+        db.refresh(db_obj)
+        invalidate_principal(db_obj.id)
+        return db_obj
+
+class AsyncUserService:
+    """UserService for AsyncSession; bcrypt goes to the password hashing pool."""
+
+    async def get(self, db: AsyncSession, id: int) -> Optional[User]:
+        return await db.get(User, id)
+
+    async def get_by_email(self, db: AsyncSession, email: str) -> Optional[User]:
+        return await db.scalar(select(User).where(User.email == email))
+
+    async def get_credentials(self, db: AsyncSession, email: str) -> Optional[Tuple[int, str]]:
+        """(id, hashed_password) by email, returning the connection to the pool before bcrypt runs."""
+        row = (await db.execute(
+            select(User.id, User.hashed_password).where(User.email == email)
+        )).first()
+        await db.rollback()
+        return tuple(row) if row else None
+
+    async def create(self, db: AsyncSession, obj_in: UserCreate) -> User:
+        db_obj = User(
+            email=obj_in.email,
+            hashed_password=await get_password_hash_async(obj_in.password),
+            role=obj_in.role,
+        )
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def update(self, db: AsyncSession, db_obj: User, obj_in: UserUpdate) -> User:
+        update_data = obj_in.dict(exclude_unset=True)
+        if "password" in update_data:
+            update_data["hashed_password"] = await get_password_hash_async(update_data.pop("password"))
+
+        for field in update_data:
+            setattr(db_obj, field, update_data[field])
+
+        db.add(db_obj)
+        statement = bump_versions([db_obj.organization_id])
+        if statement is not None:
+            await db.execute(statement)
+        await db.commit()
+        await db.refresh(db_obj)
+        invalidate_principal(db_obj.id)
+        return db_obj
+
+    async def set_password_hash(self, db: AsyncSession, id: int, hashed_password: str) -> None:
+        await db.execute(update(User).where(User.id == id).values(hashed_password=hashed_password))
+        await db.commit()
+
+    async def join_organization(self, db: AsyncSession, db_obj: User, organization_id: int) -> User:
+        statement = bump_versions([db_obj.organization_id, organization_id])
+        if statement is not None:
+            await db.execute(statement)
+        db_obj.organization_id = organization_id
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        invalidate_principal(db_obj.id)
+        return db_obj
+
+user_service = UserService()
+async_user_service = AsyncUserService() 
\ No newline at end of file
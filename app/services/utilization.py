@@ -0,0 +1,392 @@
+"""Cluster utilization history.
+
+Every committed capacity change becomes a snapshot of what is in use on the
+cluster. The ORM writes are picked up by a flush hook, and SchedulerService stages
+its bulk UPDATEs itself. UtilizationRecorder coalesces snapshots per cluster and
+once per UTILIZATION_FLUSH_INTERVAL upserts them into the 1-minute, 1-hour and
+1-day rollups with a single statement. Only rollups are stored, so reads never
+scan raw samples, and each resolution has its own retention. Averages weight
+each sample by how long its state held, to the precision of the flush interval.
+"""
+import asyncio
+import itertools
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import case, delete, event, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.db.models import Cluster, ClusterUtilization
+
+logger = logging.getLogger(__name__)
+
+# Step name -> bucket length in seconds
+RESOLUTIONS: Dict[str, int] = {"1m": 60, "1h": 3600, "1d": 86400}
+
+Capacity = Tuple[float, float, int]
+
+CAPACITY_COLUMNS = ("total_cpu", "total_ram", "total_gpu", "available_cpu", "available_ram", "available_gpu")
+
+@dataclass(frozen=True)
+class UtilizationSnapshot:
+    cluster_id: int
+    sampled_at: datetime
+    used: Capacity
+    total: Capacity
+
+    @classmethod
+    def from_capacity(
+        cls, cluster_id: int, total: Capacity, available: Capacity, sampled_at: Optional[datetime] = None
+    ) -> "UtilizationSnapshot":
+        return cls(
+            cluster_id=cluster_id,
+            sampled_at=sampled_at or datetime.utcnow(),
+            used=(total[0] - available[0], total[1] - available[1], total[2] - available[2]),
+            total=total,
+        )
+
+EPOCH = datetime(1970, 1, 1)
+
+def bucket_start(moment: datetime, resolution: int) -> datetime:
+    """Start of the resolution-second bucket containing moment, a naive UTC datetime."""
+    seconds = (moment - EPOCH).total_seconds()
+    return EPOCH + timedelta(seconds=seconds // resolution * resolution)
+
+class UtilizationRecorder:
+    """Coalesces snapshots in memory and writes them as rollups in the background.
+
+    record() is called after commits on threadpool workers, so it takes the lock.
+    Each flush writes one sample per changed cluster: its latest snapshot, plus the
+    peak it reached since the previous flush so that short spikes still show up
+    in *_used_max.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = settings.UTILIZATION_FLUSH_INTERVAL,
+        prune_interval: float = settings.UTILIZATION_PRUNE_INTERVAL,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        self.flush_interval = flush_interval
+        self.prune_interval = prune_interval
+        self.session_factory = session_factory
+        self._pending: Dict[int, Tuple[UtilizationSnapshot, Capacity]] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def record(self, snapshot: UtilizationSnapshot) -> None:
+        with self._lock:
+            self._merge(snapshot, snapshot.used)
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """Write every pending snapshot; returns the number of clusters written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        rows = [
+            row
+            for snapshot, peak in pending.values()
+            for row in rollup_rows(snapshot, peak)
+        ]
+        db = self.session_factory()
+        try:
+            db.execute(upsert_statement(db.get_bind().dialect.name), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Could not write utilization for %d clusters, keeping them for the next flush", len(pending))
+            with self._lock:
+                for snapshot, peak in pending.values():
+                    self._merge(snapshot, peak)
+            return 0
+        finally:
+            db.close()
+        return len(pending)
+
+    def prune(self, now: Optional[datetime] = None) -> int:
+        """Delete rollups older than their resolution's retention; returns rows deleted."""
+        now = now or datetime.utcnow()
+        retention = {
+            RESOLUTIONS["1m"]: settings.UTILIZATION_RETENTION_MINUTE_DAYS,
+            RESOLUTIONS["1h"]: settings.UTILIZATION_RETENTION_HOUR_DAYS,
+            RESOLUTIONS["1d"]: settings.UTILIZATION_RETENTION_DAY_DAYS,
+        }
+        db = self.session_factory()
+        try:
+            deleted = 0
+            for resolution, days in retention.items():
+                result = db.execute(
+                    delete(ClusterUtilization)
+                    .where(
+                        ClusterUtilization.resolution == resolution,
+                        ClusterUtilization.bucket < now - timedelta(days=days),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                deleted += result.rowcount
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write what is still pending."""
+        if self.running:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_prune = loop.time()
+        while not self._stopping.is_set():
+            try:
+                await asyncio.to_thread(self.flush)
+                if loop.time() >= next_prune:
+                    await asyncio.to_thread(self.prune)
+                    next_prune = loop.time() + self.prune_interval
+            except Exception:
+                logger.exception("Utilization flush failed")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _merge(self, snapshot: UtilizationSnapshot, peak: Capacity) -> None:
+        current = self._pending.get(snapshot.cluster_id)
+        if current is not None:
+            if current[0].sampled_at > snapshot.sampled_at:
+                snapshot = current[0]
+            peak = tuple(max(a, b) for a, b in zip(current[1], peak))
+        self._pending[snapshot.cluster_id] = (snapshot, peak)
+
+utilization_recorder = UtilizationRecorder()
+
+def rollup_rows(snapshot: UtilizationSnapshot, peak: Capacity) -> List[dict]:
+    """One sample of snapshot for the bucket of every resolution."""
+    cpu, ram, gpu = snapshot.used
+    rows = []
+    for resolution in RESOLUTIONS.values():
+        bucket = bucket_start(snapshot.sampled_at, resolution)
+        offset = (snapshot.sampled_at - bucket).total_seconds()
+        rows.append(dict(
+            cluster_id=snapshot.cluster_id,
+            resolution=resolution,
+            bucket=bucket,
+            samples=1,
+            cpu_used_sum=cpu,
+            ram_used_sum=ram,
+            gpu_used_sum=gpu,
+            cpu_used_max=peak[0],
+            ram_used_max=peak[1],
+            gpu_used_max=peak[2],
+            cpu_used_last=cpu,
+            ram_used_last=ram,
+            gpu_used_last=gpu,
+            total_cpu=snapshot.total[0],
+            total_ram=snapshot.total[1],
+            total_gpu=snapshot.total[2],
+            last_sampled_at=snapshot.sampled_at,
+            cpu_used_seconds=0.0,
+            ram_used_seconds=0.0,
+            gpu_used_seconds=0.0,
+            first_sample_offset=offset,
+            last_sample_offset=offset,
+        ))
+    return rows
+
+def upsert_statement(dialect_name: str):
+    """INSERT ... ON CONFLICT that adds a sample to an existing bucket."""
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = insert(ClusterUtilization)
+    row, new = ClusterUtilization.__table__.c, statement.excluded
+
+    def greatest(column: str):
+        return case((new[column] > row[column], new[column]), else_=row[column])
+
+    def latest(column: str):
+        # Workers flush independently, so an older sample must not overwrite *_last
+        return case((new.last_sampled_at >= row.last_sampled_at, new[column]), else_=row[column])
+
+    def used_seconds(resource: str):
+        # The stretch between the bucket's samples and the new ones is charged to
+        # whichever side's state held over it. A late sample that falls between
+        # the bucket's first and last adds none, that time is already charged.
+        gap = case(
+            (
+                new.first_sample_offset >= row.last_sample_offset,
+                row[f"{resource}_used_last"] * (new.first_sample_offset - row.last_sample_offset),
+            ),
+            (
+                new.last_sample_offset <= row.first_sample_offset,
+                new[f"{resource}_used_last"] * (row.first_sample_offset - new.last_sample_offset),
+            ),
+            else_=0.0,
+        )
+        return row[f"{resource}_used_seconds"] + new[f"{resource}_used_seconds"] + gap
+
+    values = {"samples": row.samples + new.samples}
+    for resource in ("cpu", "ram", "gpu"):
+        values[f"{resource}_used_sum"] = row[f"{resource}_used_sum"] + new[f"{resource}_used_sum"]
+        values[f"{resource}_used_max"] = greatest(f"{resource}_used_max")
+        values[f"{resource}_used_last"] = latest(f"{resource}_used_last")
+        values[f"{resource}_used_seconds"] = used_seconds(resource)
+        values[f"total_{resource}"] = latest(f"total_{resource}")
+    values["last_sampled_at"] = greatest("last_sampled_at")
+    values["first_sample_offset"] = case(
+        (new.first_sample_offset < row.first_sample_offset, new.first_sample_offset),
+        else_=row.first_sample_offset,
+    )
+    values["last_sample_offset"] = greatest("last_sample_offset")
+    return statement.on_conflict_do_update(
+        index_elements=["cluster_id", "resolution", "bucket"], set_=values
+    )
+
+async def get_rollups(
+    db: AsyncSession, *, cluster_id: int, resolution: int, start: datetime, end: datetime
+) -> Tuple[Optional[ClusterUtilization], List[ClusterUtilization]]:
+    """The last bucket before start, to carry its state forward, and the buckets in [start, end)."""
+    where = (ClusterUtilization.cluster_id == cluster_id, ClusterUtilization.resolution == resolution)
+    first = bucket_start(start, resolution)
+    previous = await db.scalar(
+        select(ClusterUtilization)
+        .where(*where, ClusterUtilization.bucket < first)
+        .order_by(ClusterUtilization.bucket.desc())
+        .limit(1)
+    )
+    rows = await db.scalars(
+        select(ClusterUtilization)
+        .where(*where, ClusterUtilization.bucket >= first, ClusterUtilization.bucket < end)
+        .order_by(ClusterUtilization.bucket)
+    )
+    return previous, list(rows)
+
+def time_weighted_averages(
+    row: ClusterUtilization, before: Optional[ClusterUtilization], elapsed: float
+) -> Tuple[float, float, float]:
+    """Mean usage over the first elapsed seconds of row's bucket, weighted by time.
+
+    Until its first sample the bucket holds before's last state; without one,
+    the mean starts at the first sample. After the last sample its state holds.
+    """
+    start = 0.0 if before is not None else row.first_sample_offset
+    elapsed = max(elapsed, row.last_sample_offset)
+    if elapsed <= start:
+        return row.cpu_used_last, row.ram_used_last, row.gpu_used_last
+    averages = []
+    for resource in ("cpu", "ram", "gpu"):
+        head = getattr(before, f"{resource}_used_last") * row.first_sample_offset if before is not None else 0.0
+        tail = getattr(row, f"{resource}_used_last") * (elapsed - row.last_sample_offset)
+        averages.append((head + getattr(row, f"{resource}_used_seconds") + tail) / (elapsed - start))
+    return tuple(averages)
+
+def series_points(
+    previous: Optional[ClusterUtilization],
+    rows: Sequence[ClusterUtilization],
+    *,
+    resolution: int,
+    start: datetime,
+    end: datetime,
+    now: Optional[datetime] = None,
+) -> List[dict]:
+    """One point per bucket from start to end.
+
+    Capacity only changes with a snapshot, so a bucket without samples holds the
+    previous bucket's last state. Buckets before the first known state are left out.
+    Averages are weighted by how long each state held, up to now in the current bucket.
+    """
+    now = now or datetime.utcnow()
+    by_bucket = {row.bucket: row for row in rows}
+    last = previous
+    points = []
+    bucket = bucket_start(start, resolution)
+    while bucket < end:
+        row = by_bucket.get(bucket)
+        if row is not None:
+            elapsed = min(float(resolution), (now - bucket).total_seconds())
+            cpu_used_avg, ram_used_avg, gpu_used_avg = time_weighted_averages(row, last, elapsed)
+            points.append(dict(
+                bucket=bucket,
+                samples=row.samples,
+                cpu_used_avg=cpu_used_avg,
+                ram_used_avg=ram_used_avg,
+                gpu_used_avg=gpu_used_avg,
+                cpu_used_max=row.cpu_used_max,
+                ram_used_max=row.ram_used_max,
+                gpu_used_max=row.gpu_used_max,
+                total_cpu=row.total_cpu,
+                total_ram=row.total_ram,
+                total_gpu=row.total_gpu,
+            ))
+            last = row
+        elif last is not None:
+            points.append(dict(
+                bucket=bucket,
+                samples=0,
+                cpu_used_avg=last.cpu_used_last,
+                ram_used_avg=last.ram_used_last,
+                gpu_used_avg=last.gpu_used_last,
+                cpu_used_max=last.cpu_used_last,
+                ram_used_max=last.ram_used_last,
+                gpu_used_max=last.gpu_used_last,
+                total_cpu=last.total_cpu,
+                total_ram=last.total_ram,
+                total_gpu=last.total_gpu,
+            ))
+        bucket += timedelta(seconds=resolution)
+    return points
+
+PENDING_SNAPSHOTS = "utilization_snapshots"
+
+def stage_snapshot(session: Session, snapshot: UtilizationSnapshot) -> None:
+    """Record snapshot when session commits, for writes the ORM does not track."""
+    if settings.UTILIZATION_ENABLED:
+        session.info.setdefault(PENDING_SNAPSHOTS, {})[snapshot.cluster_id] = snapshot
+
+@event.listens_for(Session, "after_flush")
+def _stage_changed_clusters(session: Session, flush_context) -> None:
+    if not settings.UTILIZATION_ENABLED:
+        return
+    for instance in itertools.chain(session.new, session.dirty):
+        if not isinstance(instance, Cluster):
+            continue
+        state = inspect(instance)
+        # Only loaded attributes: a lazy load inside a flush fails under asyncio
+        if any(name not in state.dict for name in CAPACITY_COLUMNS):
+            continue
+        if not any(state.attrs[name].history.has_changes() for name in CAPACITY_COLUMNS):
+            continue
+        values = [state.dict[name] for name in CAPACITY_COLUMNS]
+        stage_snapshot(session, UtilizationSnapshot.from_capacity(state.dict["id"], tuple(values[:3]), tuple(values[3:])))
+
+@event.listens_for(Session, "after_commit")
+def _record_committed(session: Session) -> None:
+    for snapshot in session.info.pop(PENDING_SNAPSHOTS, {}).values():
+        utilization_recorder.record(snapshot)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session) -> None:
+    session.info.pop(PENDING_SNAPSHOTS, None)
@@ -0,0 +1,2 @@
+# app.db.models must be imported through app.db.base, which registers the models
+import app.db.base  # noqa: F401
@@ -0,0 +1,90 @@
+"""Helpers shared by the benchmarks: in-memory SQLite sessions seeded with synthetic work."""
+import random
+from typing import List, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.base import Base
+from app.db.models import Cluster, Deployment, DeploymentStatus, Organization, User
+
+# (cpu, ram, gpu) shapes: CPU-bound, memory-bound, GPU training and small services
+WORKLOAD_SHAPES: List[Tuple[float, float, int]] = [
+    (16.0, 32.0, 0),
+    (4.0, 128.0, 0),
+    (8.0, 64.0, 4),
+    (2.0, 16.0, 1),
+    (1.0, 2.0, 0),
+]
+
+def make_engine() -> Engine:
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    return engine
+
+def make_session(engine: Engine) -> Session:
+    return sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+
+def count_statements(engine: Engine) -> List[int]:
+    """Return a one-element counter incremented for every statement sent to the engine."""
+    counter = [0]
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        counter[0] += 1
+
+    return counter
+
+def seed_cluster(
+    db: Session,
+    *,
+    cpu: float = 256.0,
+    ram: float = 1024.0,
+    gpu: int = 32,
+    users: int = 4,
+) -> Tuple[Cluster, List[User]]:
+    organization = Organization(name="bench", invite_code="bench")
+    db.add(organization)
+    db.flush()
+    members = [
+        User(email=f"user{i}@bench.local", hashed_password="x", organization_id=organization.id)
+        for i in range(users)
+    ]
+    db.add_all(members)
+    cluster = Cluster(
+        name="bench",
+        total_cpu=cpu,
+        total_ram=ram,
+        total_gpu=gpu,
+        available_cpu=cpu,
+        available_ram=ram,
+        available_gpu=gpu,
+        organization_id=organization.id,
+    )
+    db.add(cluster)
+    db.commit()
+    return cluster, members
+
+def random_deployment(
+    rng: random.Random, cluster: Cluster, users: List[User], name: str, **values
+) -> Deployment:
+    cpu, ram, gpu = rng.choice(WORKLOAD_SHAPES)
+    fields = dict(
+        name=name,
+        docker_image="bench:latest",
+        priority=rng.randint(0, 9),
+        required_cpu=cpu,
+        required_ram=ram,
+        required_gpu=gpu,
+        cluster_id=cluster.id,
+        user_id=rng.choice(users).id,
+        status=DeploymentStatus.QUEUED,
+    )
+    fields.update(values)
+    return Deployment(**fields)
@@ -0,0 +1,157 @@
+"""Latency of other endpoints while a burst of logins hashes passwords.
+
+    python -m benchmarks.login_storm [--logins 200] [--concurrency 50] [--rounds 12] [--json]
+
+Runs the app in-process over ASGI against a temporary SQLite database, firing
+concurrent logins while a probe repeatedly calls GET /clusters/. Each run is done
+twice: bcrypt on the request threadpool (PASSWORD_HASH_WORKERS=0) and on the
+password hashing process pool.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def storm(app, users: int, logins: int, concurrency: int, token: str) -> Dict[str, float]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        headers = {"Authorization": f"Bearer {token}"}
+        await client.get("/api/v1/clusters/", headers=headers)
+
+        slots = asyncio.Semaphore(concurrency)
+        login_times: List[float] = []
+
+        async def login(index: int) -> None:
+            async with slots:
+                begin = time.perf_counter()
+                response = await client.post(
+                    "/api/v1/auth/login",
+                    data={"username": f"user{index % users}@bench.local", "password": "bench-password"},
+                )
+                response.raise_for_status()
+                login_times.append(time.perf_counter() - begin)
+
+        probe_times: List[float] = []
+        done = asyncio.Event()
+
+        async def probe() -> None:
+            while not done.is_set():
+                begin = time.perf_counter()
+                response = await client.get("/api/v1/clusters/", headers=headers)
+                response.raise_for_status()
+                probe_times.append(time.perf_counter() - begin)
+                await asyncio.sleep(0.005)
+
+        prober = asyncio.create_task(probe())
+        begin = time.perf_counter()
+        await asyncio.gather(*(login(index) for index in range(logins)))
+        elapsed = time.perf_counter() - begin
+        done.set()
+        await prober
+
+    return {
+        "probe_p50_ms": statistics.median(probe_times) * 1000,
+        "probe_p99_ms": percentile(probe_times, 0.99) * 1000,
+        "probe_requests": len(probe_times),
+        "login_p99_ms": percentile(login_times, 0.99) * 1000,
+        "logins_per_second": logins / elapsed,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=2, help="bcrypt processes for the pooled run")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    # The bcrypt context is built when app.core.security is imported, here and in the
+    # spawned hashing processes (which read the environment), so configure both first
+    settings.PASSWORD_BCRYPT_ROUNDS = args.rounds
+    settings.METRICS_ENABLED = False
+    settings.SCHEDULER_LOOP_ENABLED = False
+    settings.UTILIZATION_ENABLED = False
+    os.environ["PASSWORD_BCRYPT_ROUNDS"] = str(args.rounds)
+
+    from app.core.security import create_access_token, get_password_hash, shutdown_hash_pool
+    from app.db.base import Base, get_async_db, get_db
+    from app.db.models import Organization, User
+    from app.db.replicas import get_async_read_db
+    from app.main import app
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(
+            f"sqlite:///{os.path.join(directory, 'bench.db')}",
+            connect_args={"check_same_thread": False},
+        )
+        Base.metadata.create_all(engine)
+        SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, 'bench.db')}")
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+        db = SessionLocal()
+        organization = Organization(name="bench", invite_code="bench")
+        db.add(organization)
+        db.flush()
+        hashed_password = get_password_hash("bench-password")
+        db.add_all([
+            User(email=f"user{i}@bench.local", hashed_password=hashed_password, organization_id=organization.id)
+            for i in range(args.users)
+        ])
+        db.commit()
+        token = create_access_token(1)
+        db.close()
+
+        def get_bench_db():
+            session = SessionLocal()
+            try:
+                yield session
+            finally:
+                session.close()
+
+        async def get_bench_async_db():
+            async with AsyncSessionLocal() as session:
+                yield session
+
+        app.dependency_overrides[get_db] = get_bench_db
+        app.dependency_overrides[get_async_db] = get_bench_async_db
+        app.dependency_overrides[get_async_read_db] = get_bench_async_db
+        results = {}
+        for mode, workers in (("threadpool", 0), ("process_pool", args.workers)):
+            settings.PASSWORD_HASH_WORKERS = workers
+            results[mode] = asyncio.run(storm(app, args.users, args.logins, args.concurrency, token))
+            shutdown_hash_pool()
+        engine.dispose()
+        asyncio.run(async_engine.dispose())
+
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+
+    print(f"{'mode':<14}{'probe p50':>11}{'probe p99':>11}{'probes':>8}{'login p99':>11}{'logins/s':>10}")
+    for mode, result in results.items():
+        print(
+            f"{mode:<14}{result['probe_p50_ms']:>9.1f}ms{result['probe_p99_ms']:>9.1f}ms"
+            f"{result['probe_requests']:>8}{result['login_p99_ms']:>9.1f}ms{result['logins_per_second']:>10.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Compare packing strategies on one batched scheduling pass over a synthetic queue.
+
+    python -m benchmarks.packing [--queue 400] [--runs 5] [--seed 0] [--json]
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Dict, List
+
+from app.db.models import Cluster
+from app.services.packing import PACKING_STRATEGIES
+from app.services.scheduler import SchedulerService
+from benchmarks.common import make_engine, make_session, random_deployment, seed_cluster
+
+def run_strategy(strategy: str, queue: int, runs: int, seed: int) -> Dict[str, float]:
+    utilization: Dict[str, List[float]] = {"cpu": [], "ram": [], "gpu": []}
+    started: List[int] = []
+    timings: List[float] = []
+    for run in range(runs):
+        rng = random.Random(seed + run)
+        db = make_session(make_engine())
+        cluster, users = seed_cluster(db)
+        db.add_all([random_deployment(rng, cluster, users, f"d{i}") for i in range(queue)])
+        db.commit()
+
+        scheduler = SchedulerService(db, packing_strategy=strategy)
+        begin = time.perf_counter()
+        scheduler.process_queue_batch(cluster.id)
+        timings.append(time.perf_counter() - begin)
+
+        cluster = db.get(Cluster, cluster.id)
+        utilization["cpu"].append(1 - cluster.available_cpu / cluster.total_cpu)
+        utilization["ram"].append(1 - cluster.available_ram / cluster.total_ram)
+        utilization["gpu"].append(1 - cluster.available_gpu / cluster.total_gpu)
+        started.append(queue - len(scheduler.get_queued_deployments(cluster.id)))
+        db.close()
+
+    result = {f"{name}_utilization": statistics.mean(values) for name, values in utilization.items()}
+    result["mean_utilization"] = statistics.mean(
+        statistics.mean(values) for values in utilization.values()
+    )
+    result["started"] = statistics.mean(started)
+    result["pass_ms"] = statistics.median(timings) * 1000
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queue", type=int, default=400)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = {
+        strategy: run_strategy(strategy, args.queue, args.runs, args.seed)
+        for strategy in PACKING_STRATEGIES
+    }
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+
+    print(f"{'strategy':<22}{'cpu':>8}{'ram':>8}{'gpu':>8}{'mean':>8}{'started':>9}{'pass ms':>10}")
+    for strategy, result in results.items():
+        print(
+            f"{strategy:<22}"
+            f"{result['cpu_utilization']:>8.1%}{result['ram_utilization']:>8.1%}"
+            f"{result['gpu_utilization']:>8.1%}{result['mean_utilization']:>8.1%}"
+            f"{result['started']:>9.1f}{result['pass_ms']:>10.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
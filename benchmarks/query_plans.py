@@ -0,0 +1,100 @@
+"""Fail when a hot scheduler query plans a sequential scan of the deployments table.
+
+    python -m benchmarks.query_plans [--url postgresql://...] [--verbose]
+
+Without --url the check runs against an in-memory SQLite schema built from the
+models. With --url it runs against an already migrated database, with
+sequential scans disabled so that any query without a usable index still
+shows up as one.
+"""
+import argparse
+import random
+import sys
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+from app.db.models import Cluster
+from app.services.gang import load_waiting_gangs
+from app.services.scheduler import SchedulerService
+from benchmarks.common import make_engine, make_session, random_deployment, seed_cluster
+
+# Scheduler reads issued on every decision, by name
+HOT_QUERIES: Dict[str, Callable[[SchedulerService, object], object]] = {
+    "get_queued_deployments": lambda scheduler, cluster: scheduler.get_queued_deployments(cluster.id),
+    "get_running_deployments": lambda scheduler, cluster: scheduler.get_running_deployments(cluster.id),
+    "get_fitting_candidates": lambda scheduler, cluster: scheduler.get_fitting_candidates(cluster, 32),
+    "get_user_allocations": lambda scheduler, cluster: scheduler.get_user_allocations(cluster.id),
+    "load_waiting_gangs": lambda scheduler, cluster: load_waiting_gangs(scheduler.db, cluster_id=cluster.id),
+    "_reservation": lambda scheduler, cluster: scheduler._reservation(
+        cluster, (cluster.available_cpu, cluster.available_ram, cluster.available_gpu), datetime.utcnow()
+    ),
+}
+
+def capture_statements(engine: Engine, operation: Callable[[], object]) -> List[Tuple[str, object]]:
+    """Run operation and return the (statement, parameters) pairs it sent to the engine."""
+    captured: List[Tuple[str, object]] = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _capture)
+    try:
+        operation()
+    finally:
+        event.remove(engine, "before_cursor_execute", _capture)
+    return captured
+
+def explain(engine: Engine, statement: str, parameters) -> List[str]:
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            return [row[-1] for row in rows]
+        conn.exec_driver_sql("SET enable_seqscan = off")
+        return [row[0] for row in conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)]
+
+def is_sequential_scan(line: str) -> bool:
+    line = line.strip()
+    if "Seq Scan on deployments" in line:
+        return True
+    return line.startswith("SCAN deployments") and "INDEX" not in line
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="migrated database to check instead of in-memory SQLite")
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url) if args.url else make_engine()
+    db = make_session(engine)
+    if args.url:
+        cluster = db.query(Cluster).first()
+        if cluster is None:
+            parser.error("the database has no clusters to plan queries against")
+    else:
+        rng = random.Random(0)
+        cluster, users = seed_cluster(db)
+        db.add_all([random_deployment(rng, cluster, users, f"d{i}") for i in range(200)])
+        db.commit()
+
+    scheduler = SchedulerService(db)
+    failures = []
+    for name, query in HOT_QUERIES.items():
+        for statement, parameters in capture_statements(engine, lambda: query(scheduler, cluster)):
+            plan = explain(engine, statement, parameters)
+            if args.verbose:
+                print(f"{name}:\n  " + "\n  ".join(plan))
+            if any(is_sequential_scan(line) for line in plan):
+                failures.append((name, plan))
+    db.close()
+
+    for name, plan in failures:
+        print(f"sequential scan on deployments in {name}:\n  " + "\n  ".join(plan), file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print(f"{len(HOT_QUERIES)} scheduler queries use indexes")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+"""Deterministic scheduler simulator.
+
+Drives the real SchedulerService against an in-memory SQLite database with a seeded
+synthetic workload on a virtual clock, and reports scheduling latency, utilization
+over time, queue waits, preemptions and DB statements per decision as JSON.
+With --gang-fraction some arrivals are deployment groups that must start together;
+the report then counts decisions that left a gang partly running. With
+--runtime-estimate every deployment carries that multiple of its true runtime as
+estimated_runtime, which lets the scheduler backfill around reservations. With
+--nodes the cluster is split into that many equal nodes, each deployment has to
+fit on one of them, and the report counts samples in which fragmentation left a
+queued deployment without a node.
+
+    python -m benchmarks.simulator --seed 1 --output run.json
+    python -m benchmarks.simulator --seed 1 --baseline run.json --tolerance 0.2
+    python -m benchmarks.simulator --seed 1 --gang-fraction 0.2 --gang-size 4
+    python -m benchmarks.simulator --seed 1 --nodes 8
+"""
+import argparse
+import heapq
+import json
+import random
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+
+from app.db.models import Cluster, Deployment, DeploymentGroup, DeploymentStatus
+from app.schemas.node import NodeCreate
+from app.services.node import node_service
+from app.services.placement import NodeIndex
+from app.services.scheduler import SchedulerEvent, SchedulerService
+from benchmarks.common import (
+    WORKLOAD_SHAPES,
+    count_statements,
+    make_engine,
+    make_session,
+    seed_cluster,
+)
+
+EPOCH = datetime(2026, 1, 1)
+
+@dataclass
+class Workload:
+    seed: int = 0
+    duration: float = 3600.0           # virtual seconds of arrivals
+    arrival_rate: float = 0.2          # deployments per virtual second (Poisson)
+    mean_runtime: float = 600.0        # exponential runtime, virtual seconds
+    users: int = 8
+    cluster_cpu: float = 256.0
+    cluster_ram: float = 1024.0
+    cluster_gpu: int = 32
+    shapes: List[Tuple[float, float, int]] = field(default_factory=lambda: list(WORKLOAD_SHAPES))
+    shape_weights: List[float] = field(default_factory=lambda: [2, 2, 1, 3, 4])
+    priority_weights: List[float] = field(default_factory=lambda: [4, 3, 2, 1, 1, 1, 1, 1, 1, 1])
+    sample_interval: float = 60.0      # utilization sampling period, virtual seconds
+    fairness_policy: Optional[str] = None
+    packing_strategy: Optional[str] = None
+    gang_fraction: float = 0.0         # share of arrivals that are deployment groups
+    gang_size: int = 4
+    gang_timeout: float = 1800.0       # virtual seconds a group may wait to start
+    runtime_estimate: float = 0.0      # estimated_runtime = runtime * this; 0 leaves it unset
+    nodes: int = 0                     # equal nodes the cluster is split into; 0 keeps one pool
+
+@dataclass
+class Arrival:
+    at: float
+    name: str
+    user_index: int
+    priority: int
+    cpu: float
+    ram: float
+    gpu: int
+    runtime: float
+    # Members of the group; every one has the shape above
+    size: int = 1
+
+def generate_arrivals(workload: Workload) -> List[Arrival]:
+    rng = random.Random(workload.seed)
+    arrivals, now, index = [], 0.0, 0
+    while True:
+        now += rng.expovariate(workload.arrival_rate)
+        if now > workload.duration:
+            return arrivals
+        cpu, ram, gpu = rng.choices(workload.shapes, weights=workload.shape_weights)[0]
+        arrivals.append(Arrival(
+            at=now,
+            name=f"sim-{index}",
+            user_index=rng.randrange(workload.users),
+            priority=rng.choices(range(len(workload.priority_weights)), weights=workload.priority_weights)[0],
+            cpu=cpu,
+            ram=ram,
+            gpu=gpu,
+            runtime=rng.expovariate(1 / workload.mean_runtime),
+            # No extra draw without gangs, so plain workloads replay unchanged
+            size=workload.gang_size if workload.gang_fraction and rng.random() < workload.gang_fraction else 1,
+        ))
+        index += 1
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0, "mean": 0.0}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": ordered[-1],
+        "mean": statistics.fmean(ordered),
+    }
+
+class Simulator:
+    """Replays a workload through SchedulerService on a virtual clock.
+
+    Arrivals call schedule_deployment (then preempt_deployments for priority > 0),
+    completions call finish_deployment followed by a completion event. After each
+    decision the simulator diffs the RUNNING set to learn starts and preemptions.
+    A group arrival inserts all members and schedules the first, which starts or
+    queues the whole gang; members share the group's runtime.
+    """
+
+    def __init__(self, workload: Workload):
+        self.workload = workload
+        self.engine = make_engine()
+        self.db = make_session(self.engine)
+        self.statements = count_statements(self.engine)
+        self.cluster, self.users = seed_cluster(
+            self.db,
+            cpu=workload.cluster_cpu,
+            ram=workload.cluster_ram,
+            gpu=workload.cluster_gpu,
+            users=workload.users,
+        )
+        self.cluster_id = self.cluster.id
+        for index in range(workload.nodes):
+            node_service.create(self.db, cluster=self.cluster, obj_in=NodeCreate(
+                name=f"node{index}",
+                total_cpu=workload.cluster_cpu / workload.nodes,
+                total_ram=workload.cluster_ram / workload.nodes,
+                total_gpu=workload.cluster_gpu // workload.nodes,
+            ))
+        self.scheduler = SchedulerService(
+            self.db,
+            fairness_policy=workload.fairness_policy,
+            packing_strategy=workload.packing_strategy,
+            clock=lambda: EPOCH + timedelta(seconds=self.now),
+        )
+
+        self.now = 0.0
+        self.events: List[Tuple[float, int, str, Any]] = []
+        self._sequence = 0
+        self.running: Set[int] = set()
+        # deployment id -> completion generation, so a preempted run's completion is ignored
+        self.generation: Dict[int, int] = {}
+        self.runtime: Dict[int, float] = {}
+        self.arrived_at: Dict[int, float] = {}
+        self.waits: List[float] = []
+        # "cpu/ram/gpu" -> first-start waits, to see whether large shapes starve
+        self.shape_of: Dict[int, str] = {}
+        self.waits_by_shape: Dict[str, List[float]] = {}
+        self.latencies: List[float] = []
+        self.statements_per_decision: List[int] = []
+        self.preemptions = 0
+        self.utilization: List[Dict[str, float]] = []
+        self.gangs = 0
+        self.gang_arrived_at: Dict[int, float] = {}
+        self.gang_waits: List[float] = []
+        self.gang_timeouts = 0
+        self.gang_outcomes: Dict[int, str] = {}
+        # Decisions after which some group had members running while others waited
+        self.partial_gangs = 0
+        # Samples in which a queued deployment fit the free capacity but no single node
+        self.stranded_samples = 0
+
+    def push(self, at: float, kind: str, payload: Any) -> None:
+        heapq.heappush(self.events, (at, self._sequence, kind, payload))
+        self._sequence += 1
+
+    def run(self) -> Dict[str, Any]:
+        for arrival in generate_arrivals(self.workload):
+            self.push(arrival.at, "arrival", arrival)
+        sample = 0.0
+        while sample <= self.workload.duration:
+            self.push(sample, "sample", None)
+            sample += self.workload.sample_interval
+
+        while self.events:
+            self.now, _, kind, payload = heapq.heappop(self.events)
+            if kind == "arrival":
+                self.on_arrival(payload)
+            elif kind == "completion":
+                self.on_completion(*payload)
+            else:
+                self.on_sample()
+        return self.report()
+
+    def decide(self, action) -> None:
+        """Run one scheduling decision, timing it and counting its statements."""
+        before = self.statements[0]
+        begin = time.perf_counter()
+        action()
+        self.latencies.append(time.perf_counter() - begin)
+        self.statements_per_decision.append(self.statements[0] - before)
+        self.observe_transitions()
+
+    def on_arrival(self, arrival: Arrival) -> None:
+        created_at = EPOCH + timedelta(seconds=arrival.at)
+        group = None
+        if arrival.size > 1:
+            group = DeploymentGroup(
+                name=arrival.name,
+                cluster_id=self.cluster_id,
+                user_id=self.users[arrival.user_index].id,
+                timeout_seconds=self.workload.gang_timeout,
+                created_at=created_at,
+            )
+            self.db.add(group)
+            self.db.flush()
+            self.gangs += 1
+            self.gang_arrived_at[group.id] = arrival.at
+        members = [
+            Deployment(
+                name=f"{arrival.name}-{index}" if group else arrival.name,
+                docker_image="sim:latest",
+                priority=arrival.priority,
+                required_cpu=arrival.cpu,
+                required_ram=arrival.ram,
+                required_gpu=arrival.gpu,
+                estimated_runtime=arrival.runtime * self.workload.runtime_estimate or None,
+                cluster_id=self.cluster_id,
+                user_id=self.users[arrival.user_index].id,
+                group_id=group.id if group else None,
+                created_at=created_at,
+            )
+            for index in range(arrival.size)
+        ]
+        self.db.add_all(members)
+        self.db.commit()
+        for member in members:
+            self.arrived_at[member.id] = arrival.at
+            self.runtime[member.id] = arrival.runtime
+            self.shape_of[member.id] = f"{arrival.cpu:g}/{arrival.ram:g}/{arrival.gpu}"
+        deployment = members[0]
+
+        def schedule() -> None:
+            if not self.scheduler.schedule_deployment(deployment):
+                if deployment.priority > 0:
+                    self.scheduler.preempt_deployments(deployment)
+
+        self.decide(schedule)
+
+    def on_completion(self, deployment_id: int, generation: int) -> None:
+        if self.generation.get(deployment_id) != generation or deployment_id not in self.running:
+            return
+        deployment = self.db.get(Deployment, deployment_id)
+
+        def complete() -> None:
+            self.scheduler.finish_deployment(deployment, DeploymentStatus.COMPLETED)
+            self.scheduler.handle_event(self.cluster_id, SchedulerEvent.COMPLETION)
+
+        self.decide(complete)
+
+    def observe_transitions(self) -> None:
+        running = {
+            deployment_id
+            for (deployment_id,) in self.db.query(Deployment.id).filter(
+                Deployment.cluster_id == self.cluster_id,
+                Deployment.status == DeploymentStatus.RUNNING,
+            )
+        }
+        for deployment_id in running - self.running:
+            generation = self.generation.get(deployment_id, 0) + 1
+            self.generation[deployment_id] = generation
+            if generation == 1:
+                wait = self.now - self.arrived_at[deployment_id]
+                self.waits.append(wait)
+                self.waits_by_shape.setdefault(self.shape_of[deployment_id], []).append(wait)
+            self.push(self.now + self.runtime[deployment_id], "completion", (deployment_id, generation))
+        stopped = self.running - running
+        finished = {
+            deployment_id
+            for (deployment_id,) in self.db.query(Deployment.id).filter(
+                Deployment.id.in_(stopped),
+                Deployment.status.in_([DeploymentStatus.COMPLETED, DeploymentStatus.FAILED]),
+            )
+        } if stopped else set()
+        self.preemptions += len(stopped - finished)
+        self.running = running
+        if self.gangs:
+            self.observe_gangs()
+
+    def observe_gangs(self) -> None:
+        """Record gang starts and timeouts, and whether any gang is only partly running."""
+        rows = self.db.query(Deployment.group_id, Deployment.status, func.count()).filter(
+            Deployment.cluster_id == self.cluster_id,
+            Deployment.group_id.is_not(None),
+        ).group_by(Deployment.group_id, Deployment.status)
+        statuses: Dict[int, Dict[DeploymentStatus, int]] = {}
+        for group_id, status, count in rows:
+            statuses.setdefault(group_id, {})[status] = count
+        partial = False
+        for group_id, counts in statuses.items():
+            waiting = counts.get(DeploymentStatus.QUEUED, 0) + counts.get(DeploymentStatus.PENDING, 0)
+            if waiting and counts.get(DeploymentStatus.RUNNING):
+                partial = True
+            if group_id in self.gang_outcomes:
+                continue
+            if counts.get(DeploymentStatus.RUNNING) and not waiting:
+                self.gang_outcomes[group_id] = "started"
+                self.gang_waits.append(self.now - self.gang_arrived_at[group_id])
+            elif counts.get(DeploymentStatus.FAILED):
+                self.gang_outcomes[group_id] = "timed_out"
+                self.gang_timeouts += 1
+        self.partial_gangs += partial
+
+    def on_sample(self) -> None:
+        cluster = self.db.get(Cluster, self.cluster_id)
+        self.db.refresh(cluster)
+        queued = self.db.query(Deployment).filter(
+            Deployment.cluster_id == self.cluster_id,
+            Deployment.status == DeploymentStatus.QUEUED,
+        ).all()
+        self.utilization.append({
+            "t": self.now,
+            "cpu": 1 - cluster.available_cpu / cluster.total_cpu,
+            "ram": 1 - cluster.available_ram / cluster.total_ram,
+            "gpu": 1 - cluster.available_gpu / cluster.total_gpu if cluster.total_gpu else 0.0,
+            "queued": len(queued),
+        })
+        if self.workload.nodes:
+            nodes = NodeIndex.load(self.db, self.cluster_id)
+            self.stranded_samples += any(nodes.stranded(deployment) for deployment in queued)
+
+    def report(self) -> Dict[str, Any]:
+        mean_utilization = {
+            resource: statistics.fmean(sample[resource] for sample in self.utilization)
+            for resource in ("cpu", "ram", "gpu")
+        } if self.utilization else {}
+        return {
+            "workload": asdict(self.workload),
+            "decisions": len(self.latencies),
+            "deployments": len(self.arrived_at),
+            "started": len(self.waits),
+            "preemptions": self.preemptions,
+            "scheduling_latency_ms": {
+                key: value * 1000 for key, value in percentiles(self.latencies).items()
+            },
+            "queue_wait_s": percentiles(self.waits),
+            "queue_wait_s_by_shape": {
+                shape: percentiles(waits) for shape, waits in sorted(self.waits_by_shape.items())
+            },
+            "statements_per_decision": percentiles([float(n) for n in self.statements_per_decision]),
+            "utilization": {"mean": mean_utilization, "samples": self.utilization},
+            "gangs": {
+                "arrived": self.gangs,
+                "started": sum(outcome == "started" for outcome in self.gang_outcomes.values()),
+                "timed_out": self.gang_timeouts,
+                "queue_wait_s": percentiles(self.gang_waits),
+                "partially_running_decisions": self.partial_gangs,
+            },
+            "nodes": {
+                "count": self.workload.nodes,
+                "stranded_samples": self.stranded_samples,
+            },
+        }
+
+# Metrics checked by --baseline; all of them are "lower is better"
+GATED_METRICS = [
+    ("scheduling_latency_ms", "p95"),
+    ("statements_per_decision", "mean"),
+    ("queue_wait_s", "p95"),
+]
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Describe every gated metric that got worse than baseline by more than tolerance."""
+    regressions = []
+    for group, key in GATED_METRICS:
+        current, previous = result[group][key], baseline[group][key]
+        if current > previous * (1 + tolerance) and current - previous > 1e-9:
+            regressions.append(f"{group}.{key}: {previous:.4g} -> {current:.4g}")
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duration", type=float, default=Workload.duration)
+    parser.add_argument("--arrival-rate", type=float, default=Workload.arrival_rate)
+    parser.add_argument("--mean-runtime", type=float, default=Workload.mean_runtime)
+    parser.add_argument("--users", type=int, default=Workload.users)
+    parser.add_argument("--fairness-policy")
+    parser.add_argument("--packing-strategy")
+    parser.add_argument("--gang-fraction", type=float, default=Workload.gang_fraction)
+    parser.add_argument("--gang-size", type=int, default=Workload.gang_size)
+    parser.add_argument("--runtime-estimate", type=float, default=Workload.runtime_estimate)
+    parser.add_argument("--nodes", type=int, default=Workload.nodes)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="JSON report to compare against; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    workload = Workload(
+        seed=args.seed,
+        duration=args.duration,
+        arrival_rate=args.arrival_rate,
+        mean_runtime=args.mean_runtime,
+        users=args.users,
+        fairness_policy=args.fairness_policy,
+        packing_strategy=args.packing_strategy,
+        gang_fraction=args.gang_fraction,
+        gang_size=args.gang_size,
+        runtime_estimate=args.runtime_estimate,
+        nodes=args.nodes,
+    )
+    result = Simulator(workload).run()
+
+    report = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(report)
+    else:
+        print(report)
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare(result, json.load(handle), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ from setuptools import setup, find_packages
 setup(
     name="mlops-platform",
     version="0.1.0",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
     install_requires=[
         "fastapi==0.104.1",
         "uvicorn==0.24.0",
@@ -11,9 +11,13 @@ setup(
         "pydantic==2.5.2",
         "python-jose[cryptography]==3.3.0",
         "passlib[bcrypt]==1.7.4",
+        "bcrypt==4.0.1",
         "python-multipart==0.0.6",
         "redis==5.0.1",
+        "numpy==1.26.2",
+        "prometheus-client==0.19.0",
         "psycopg2-binary==2.9.9",
+        "asyncpg==0.29.0",
         "alembic==1.12.1",
     ],
 ) 
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""Shared fixtures: seeded SQLite sessions, and the app in-process with statement counting."""
+import asyncio
+from types import SimpleNamespace
+
+from app.core.config import settings
+
+# Keep background work out of the tests; each test drives the scheduler itself
+settings.METRICS_ENABLED = False
+settings.SCHEDULER_LOOP_ENABLED = False
+settings.UTILIZATION_ENABLED = False
+
+import app.main  # noqa: E402,F401  resolves the models' import cycle
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.principal_cache import principal_cache  # noqa: E402
+from app.core.response_cache import response_cache  # noqa: E402
+from app.core.security import create_access_token  # noqa: E402
+from app.db.base import Base, get_async_db, get_db  # noqa: E402
+from app.db.models import Cluster, Deployment, DeploymentGroup, DeploymentStatus, Organization, User  # noqa: E402
+from app.db.replicas import get_async_read_db, recent_writers  # noqa: E402
+from app.main import app as application  # noqa: E402
+from app.services import placement  # noqa: E402
+from benchmarks.common import count_statements, make_engine, make_session, seed_cluster  # noqa: E402
+
+@pytest.fixture(autouse=True)
+def process_caches():
+    """Start every test with empty process-wide caches: each test's fresh database reuses ids."""
+    placement._node_indexes.clear()
+    principal_cache.clear()
+    response_cache.clear()
+    recent_writers.clear()
+
+@pytest.fixture
+def engine():
+    engine = make_engine()
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def db(engine):
+    session = make_session(engine)
+    yield session
+    session.close()
+
+@pytest.fixture
+def seeded(db):
+    """(cluster, users) for a 64 cpu / 256 GiB / 8 gpu cluster with two users."""
+    return seed_cluster(db, cpu=64.0, ram=256.0, gpu=8, users=2)
+
+def seed_api(db) -> dict:
+    """One user, a 64 cpu cluster, a queued deployment and a group with one member."""
+    organization = Organization(name="api", invite_code="api")
+    db.add(organization)
+    db.flush()
+    user = User(email="user@api.example.com", hashed_password="x", organization_id=organization.id)
+    cluster = Cluster(
+        name="api", organization_id=organization.id,
+        total_cpu=64, total_ram=256, total_gpu=0, available_cpu=64, available_ram=256, available_gpu=0,
+    )
+    db.add_all([user, cluster])
+    db.flush()
+    deployment = Deployment(
+        name="api", docker_image="app:1", required_cpu=1, required_ram=1, required_gpu=0,
+        status=DeploymentStatus.QUEUED, cluster_id=cluster.id, user_id=user.id,
+    )
+    group = DeploymentGroup(name="api", cluster_id=cluster.id, user_id=user.id, timeout_seconds=600)
+    db.add_all([deployment, group])
+    db.flush()
+    db.add(Deployment(
+        name="api-worker", docker_image="app:1", required_cpu=1, required_ram=1, required_gpu=0,
+        status=DeploymentStatus.QUEUED, cluster_id=cluster.id, user_id=user.id, group_id=group.id,
+    ))
+    db.commit()
+    return {
+        "organization": organization.id, "user": user.id,
+        "cluster": cluster.id, "deployment": deployment.id, "group": group.id,
+    }
+
+@pytest.fixture
+def api(tmp_path):
+    """The app in-process on a seeded SQLite file: client, headers, ids and both engines."""
+    path = tmp_path / "api.db"
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    db = SessionLocal()
+    ids = seed_api(db)
+    db.close()
+
+    def get_test_db():
+        session = SessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    async def get_test_async_db():
+        async with AsyncSessionLocal() as session:
+            yield session
+
+    application.dependency_overrides[get_db] = get_test_db
+    application.dependency_overrides[get_async_db] = get_test_async_db
+    application.dependency_overrides[get_async_read_db] = get_test_async_db
+    try:
+        with TestClient(application) as client:
+            yield SimpleNamespace(
+                client=client,
+                headers={"Authorization": f"Bearer {create_access_token(ids['user'])}"},
+                ids=ids,
+                engines=[engine, async_engine.sync_engine],
+                sessionmaker=SessionLocal,
+            )
+    finally:
+        application.dependency_overrides.clear()
+        engine.dispose()
+        asyncio.run(async_engine.dispose())
+
+@pytest.fixture
+def statements(api):
+    """Callable returning the statements sent on both engines since its previous call."""
+    counters = [count_statements(engine) for engine in api.engines]
+
+    def take() -> int:
+        total = sum(counter[0] for counter in counters)
+        for counter in counters:
+            counter[0] = 0
+        return total
+
+    return take
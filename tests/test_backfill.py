@@ -0,0 +1,68 @@
+from datetime import datetime
+
+import pytest
+
+from app.db.models import Cluster, Deployment, DeploymentStatus
+from app.services.scheduler import SchedulerEvent, SchedulerService
+from benchmarks.common import seed_cluster
+
+NOW = datetime(2026, 1, 1)
+
+@pytest.fixture
+def blocked(db):
+    """A 10 cpu cluster: R runs on 8 cpu for 100 s more, L (priority 5) needs all 10."""
+    cluster, users = seed_cluster(db, cpu=10.0, ram=10.0, gpu=0, users=1)
+
+    def deployment(name, cpu, priority, status, estimated_runtime=None, started_at=None):
+        return Deployment(
+            name=name, docker_image="test:latest", priority=priority,
+            required_cpu=cpu, required_ram=1.0, required_gpu=0,
+            cluster_id=cluster.id, user_id=users[0].id, status=status,
+            estimated_runtime=estimated_runtime, started_at=started_at, created_at=NOW,
+        )
+
+    deployments = {
+        "R": deployment("R", 8.0, 0, DeploymentStatus.RUNNING, estimated_runtime=100, started_at=NOW),
+        "L": deployment("L", 10.0, 5, DeploymentStatus.QUEUED),
+        # Neither has an estimate, so neither fits what the reservation leaves over
+        "H": deployment("H", 2.0, 9, DeploymentStatus.QUEUED),
+        "low": deployment("low", 2.0, 1, DeploymentStatus.QUEUED),
+    }
+    db.add_all(deployments.values())
+    cluster.available_cpu = 2.0
+    cluster.available_ram = 9.0
+    db.commit()
+    return cluster, deployments
+
+def statuses(db, deployments):
+    db.expire_all()
+    return {name: db.get(Deployment, deployment.id).status for name, deployment in deployments.items()}
+
+EXPECTED = {
+    "R": DeploymentStatus.RUNNING,
+    "L": DeploymentStatus.QUEUED,
+    "H": DeploymentStatus.RUNNING,
+    "low": DeploymentStatus.QUEUED,
+}
+
+def test_batch_pass_reservation_only_holds_back_lower_ranks(db, blocked):
+    cluster, deployments = blocked
+
+    SchedulerService(db, clock=lambda: NOW).process_queue_batch(cluster.id)
+
+    assert statuses(db, deployments) == EXPECTED
+    assert db.get(Cluster, cluster.id).available_cpu == 0
+
+def test_event_pass_reservation_only_holds_back_lower_ranks(db, blocked):
+    cluster, deployments = blocked
+
+    SchedulerService(db, clock=lambda: NOW).handle_event(cluster.id, SchedulerEvent.RELEASE)
+
+    assert statuses(db, deployments) == EXPECTED
+
+def test_schedule_deployment_agrees_with_the_passes(db, blocked):
+    cluster, deployments = blocked
+    scheduler = SchedulerService(db, clock=lambda: NOW)
+
+    assert not scheduler.schedule_deployment(deployments["low"])
+    assert scheduler.schedule_deployment(deployments["H"])
@@ -0,0 +1,116 @@
+import pytest
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.api.v1.endpoints import deployments as endpoints
+from app.core.config import settings
+from app.db.models import Cluster, Deployment, DeploymentStatus, Organization
+from app.services.scheduler import SchedulerService
+from app.services.scheduler_loop import SchedulerLoop
+
+def item(cluster_id=None, cpu=1, **values):
+    return dict(
+        name="batch", docker_image="app:1", required_cpu=cpu, required_ram=1, required_gpu=0,
+        cluster_id=cluster_id, **values,
+    )
+
+@pytest.fixture
+def clusters(api):
+    """(own second cluster id, another organization's cluster id)."""
+    db = api.sessionmaker()
+    try:
+        other = Organization(name="other", invite_code="other")
+        db.add(other)
+        db.flush()
+        own = Cluster(
+            name="second", organization_id=api.ids["organization"],
+            total_cpu=8, total_ram=8, total_gpu=0, available_cpu=8, available_ram=8, available_gpu=0,
+        )
+        foreign = Cluster(
+            name="foreign", organization_id=other.id,
+            total_cpu=8, total_ram=8, total_gpu=0, available_cpu=8, available_ram=8, available_gpu=0,
+        )
+        db.add_all([own, foreign])
+        db.commit()
+        return own.id, foreign.id
+    finally:
+        db.close()
+
+def post(api, items):
+    return api.client.post("/api/v1/deployments/batch", headers=api.headers, json=items)
+
+def count(api):
+    db = api.sessionmaker()
+    try:
+        return db.query(Deployment).count()
+    finally:
+        db.close()
+
+def test_each_item_gets_its_own_outcome(api, clusters):
+    _, foreign = clusters
+    before = count(api)
+
+    response = post(api, [
+        item(api.ids["cluster"]),
+        item(foreign),
+        item(999),
+        {"name": "missing fields"},
+        item(api.ids["cluster"], cpu="lots"),
+        "not an object",
+        item(cpu=1000),
+        item(),
+    ])
+
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["index"] for result in results] == list(range(8))
+    assert [result["status_code"] for result in results] == [201, 403, 404, 422, 422, 422, 422, 201]
+    assert results[0]["deployment"]["status"] == "running"
+    assert "docker_image" in results[3]["detail"]
+    assert "required_cpu" in results[4]["detail"]
+    assert count(api) == before + 2
+
+def test_batch_size_is_capped(api, monkeypatch):
+    monkeypatch.setattr(settings, "DEPLOYMENT_BATCH_MAX_SIZE", 2)
+    before = count(api)
+
+    response = post(api, [item(api.ids["cluster"])] * 3)
+
+    assert response.status_code == 422
+    assert count(api) == before
+
+def test_full_scheduler_queue_rolls_back_rejected_items(api, monkeypatch):
+    loop = SchedulerLoop(max_queue_depth=1)
+    monkeypatch.setattr(SchedulerLoop, "running", property(lambda self: True))
+    monkeypatch.setattr(endpoints, "scheduler_loop", loop)
+    monkeypatch.setattr(settings, "SCHEDULER_LOOP_ENABLED", True)
+    before = count(api)
+
+    results = post(api, [item(api.ids["cluster"]), item(api.ids["cluster"])]).json()
+
+    assert [result["status_code"] for result in results] == [202, 503]
+    assert results[0]["deployment"]["status"] == "pending"
+    assert loop.depth() == 1
+    assert count(api) == before + 1
+
+def test_failed_cluster_pass_keeps_the_rest_of_the_batch(api, clusters, monkeypatch):
+    own, _ = clusters
+    process_queue_batch = SchedulerService.process_queue_batch
+
+    def conflicting(self, cluster_id):
+        if cluster_id == own:
+            raise StaleDataError("conflict")
+        return process_queue_batch(self, cluster_id)
+
+    monkeypatch.setattr(SchedulerService, "process_queue_batch", conflicting)
+
+    results = post(api, [item(own), item(api.ids["cluster"]), item(own)]).json()
+
+    assert [result["status_code"] for result in results] == [201, 201, 201]
+    assert [result["scheduled"] for result in results] == [False, None, False]
+    assert [result["deployment"]["status"] for result in results] == ["queued", "running", "queued"]
+    db = api.sessionmaker()
+    try:
+        queued = db.query(Deployment).filter(Deployment.cluster_id == own).all()
+        assert [deployment.status for deployment in queued] == [DeploymentStatus.QUEUED] * 2
+    finally:
+        db.close()
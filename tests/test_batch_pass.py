@@ -0,0 +1,85 @@
+import pytest
+
+from app.db.models import Cluster, Deployment, DeploymentStatus
+from app.services import scheduler as scheduler_module
+from app.services.scheduler import SchedulerService
+from benchmarks.common import make_session, seed_cluster
+
+@pytest.fixture
+def queued(db):
+    """A 10 cpu cluster with one running deployment (priority 0) and three queued ones."""
+    cluster, users = seed_cluster(db, cpu=10.0, ram=10.0, gpu=0, users=1)
+
+    def deployment(cpu, priority, status):
+        return Deployment(
+            name="d", docker_image="test:latest", priority=priority,
+            required_cpu=cpu, required_ram=1.0, required_gpu=0,
+            cluster_id=cluster.id, user_id=users[0].id, status=status,
+        )
+
+    running = deployment(6.0, 0, DeploymentStatus.RUNNING)
+    # 2 + 2 fit next to running, 7 only by preempting it
+    waiting = [
+        deployment(2.0, 0, DeploymentStatus.QUEUED),
+        deployment(2.0, 0, DeploymentStatus.QUEUED),
+        deployment(7.0, 3, DeploymentStatus.QUEUED),
+    ]
+    db.add_all([running] + waiting)
+    cluster.available_cpu = 4.0
+    cluster.available_ram = 9.0
+    db.commit()
+    return cluster, running, waiting
+
+def snapshot(engine, cluster):
+    db = make_session(engine)
+    try:
+        deployments = db.query(Deployment).order_by(Deployment.id).all()
+        row = db.get(Cluster, cluster.id)
+        return (
+            [(deployment.status, deployment.started_at, deployment.completed_at) for deployment in deployments],
+            (row.available_cpu, row.available_ram, row.version),
+        )
+    finally:
+        db.close()
+
+def test_returned_count_is_the_rows_changed(engine, db, queued):
+    cluster, running, waiting = queued
+    scheduler = SchedulerService(db)
+    plan = scheduler.plan_queue(cluster)
+    # Deployment rows plus the cluster row
+    expected = len(plan.changes) + 1
+    db.rollback()
+
+    rows = scheduler.process_queue_batch(cluster.id)
+
+    assert expected > 1
+    assert rows == expected
+    db.expire_all()
+    statuses = [db.get(Deployment, deployment.id).status for deployment in [running] + waiting]
+    changed = sum(1 for before, after in zip(
+        [DeploymentStatus.RUNNING] + [DeploymentStatus.QUEUED] * 3, statuses
+    ) if before != after)
+    assert changed == rows - 1
+    assert db.get(Cluster, cluster.id).version == cluster.version
+
+def test_nothing_to_do_changes_no_rows(db, queued):
+    cluster, running, waiting = queued
+    scheduler = SchedulerService(db)
+    scheduler.process_queue_batch(cluster.id)
+
+    assert scheduler.process_queue_batch(cluster.id) == 0
+
+def test_failure_inside_apply_plan_commits_nothing(engine, db, queued, monkeypatch):
+    cluster, _, _ = queued
+    before = snapshot(engine, cluster)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("failed after the UPDATEs")
+
+    # Runs after every deployment and cluster UPDATE, before the commit
+    monkeypatch.setattr(scheduler_module, "mark_changed", fail)
+
+    with pytest.raises(RuntimeError):
+        SchedulerService(db).process_queue_batch(cluster.id)
+
+    assert snapshot(engine, cluster) == before
@@ -0,0 +1,96 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.core.config import settings
+from app.db.base import Base
+from app.db.models import Cluster, Deployment, DeploymentStatus
+from app.services.scheduler import SchedulerService
+from benchmarks.common import make_session, seed_cluster
+
+@pytest.fixture
+def shared(tmp_path):
+    """An engine on a SQLite file, so two sessions see each other's commits."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'shared.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+def pending(db, cluster_id, user_id, cpu):
+    deployment = Deployment(
+        name="d", docker_image="test:latest", priority=0,
+        required_cpu=cpu, required_ram=1.0, required_gpu=0,
+        cluster_id=cluster_id, user_id=user_id, status=DeploymentStatus.PENDING,
+    )
+    db.add(deployment)
+    db.commit()
+    return deployment
+
+def test_version_increments_on_every_cluster_write(db, seeded):
+    cluster, _ = seeded
+    version = cluster.version
+    cluster.available_cpu -= 1
+    db.commit()
+
+    assert cluster.version == version + 1
+
+def test_conflict_is_retried_against_fresh_capacity(shared, monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_RETRY_BACKOFF", 0.0)
+    setup = make_session(shared)
+    cluster, users = seed_cluster(setup, cpu=10.0, ram=10.0, gpu=0, users=1)
+    cluster_id, user_id, version = cluster.id, users[0].id, cluster.version
+    setup.close()
+
+    first, second = make_session(shared), make_session(shared)
+    try:
+        x = pending(first, cluster_id, user_id, 8.0)
+        y = pending(second, cluster_id, user_id, 8.0)
+        # second holds the cluster it read before first commits its allocation
+        stale = second.get(Cluster, cluster_id)
+        assert stale.available_cpu == 10.0
+        assert SchedulerService(first).schedule_deployment(x)
+
+        attempts = []
+        retry = SchedulerService._retry_on_conflict
+
+        def counted(self, operation):
+            return retry(self, lambda: attempts.append(1) or operation())
+
+        monkeypatch.setattr(SchedulerService, "_retry_on_conflict", counted)
+        assert not SchedulerService(second).schedule_deployment(y)
+        assert len(attempts) == 2
+        assert stale.available_cpu == 2.0
+        x_id, y_id = x.id, y.id
+    finally:
+        first.close()
+        second.close()
+
+    check = make_session(shared)
+    try:
+        assert check.get(Deployment, x_id).status == DeploymentStatus.RUNNING
+        assert check.get(Deployment, y_id).status == DeploymentStatus.QUEUED
+        assert check.get(Cluster, cluster_id).available_cpu == 2.0
+        # Only the winner's allocation wrote the cluster
+        assert check.get(Cluster, cluster_id).version == version + 1
+    finally:
+        check.close()
+
+def test_exhausted_retries_return_409(api, monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_CONFLICT_RETRIES", 2)
+    monkeypatch.setattr(settings, "SCHEDULER_RETRY_BACKOFF", 0.0)
+    attempts = []
+
+    def always_stale(self, deployment):
+        attempts.append(deployment.id)
+        raise StaleDataError("cluster changed")
+
+    monkeypatch.setattr(SchedulerService, "_schedule_deployment", always_stale)
+
+    response = api.client.post("/api/v1/deployments/", headers=api.headers, json=dict(
+        name="d", docker_image="app:1", required_cpu=1, required_ram=1, required_gpu=0,
+        cluster_id=api.ids["cluster"],
+    ))
+
+    assert response.status_code == 409
+    assert response.json() == {"detail": "Cluster was modified concurrently, please retry"}
+    assert len(attempts) == 3
@@ -0,0 +1,115 @@
+import random
+
+import pytest
+
+from app.db.models import Deployment, DeploymentStatus
+from app.services.scheduler import SchedulerService
+from benchmarks.common import seed_cluster
+
+@pytest.fixture
+def cluster(db):
+    """A 10 cpu / 10 ram cluster without GPUs, shared by three users."""
+    cluster, users = seed_cluster(db, cpu=10.0, ram=10.0, gpu=0, users=3)
+    return cluster, users
+
+def add(db, cluster, user, name, cpu=1.0, ram=1.0, priority=0, status=DeploymentStatus.QUEUED):
+    deployment = Deployment(
+        name=name, docker_image="test:latest", priority=priority,
+        required_cpu=cpu, required_ram=ram, required_gpu=0,
+        cluster_id=cluster.id, user_id=user.id, status=status,
+    )
+    db.add(deployment)
+    db.commit()
+    return deployment
+
+def names(deployments):
+    return [deployment.name for deployment in deployments]
+
+def test_users_alternate_as_their_shares_are_charged(db, cluster):
+    cluster, (a, b, _) = cluster
+    queue = [
+        add(db, cluster, a, "a1"), add(db, cluster, a, "a2"),
+        add(db, cluster, b, "b1", cpu=4.0), add(db, cluster, b, "b2", cpu=4.0),
+    ]
+
+    ordered = SchedulerService(db).dominant_resource_fairness(cluster, queue)
+
+    # Both start at 0, a wins the tie on input order; b's 0.4 then trails a's 0.1
+    assert names(ordered) == ["a1", "b1", "a2", "b2"]
+
+def test_running_deployments_count_towards_the_share(db, cluster):
+    cluster, (a, b, _) = cluster
+    add(db, cluster, b, "running", cpu=1.0, status=DeploymentStatus.RUNNING)
+    queue = [add(db, cluster, b, "b1"), add(db, cluster, a, "a1"), add(db, cluster, a, "a2")]
+
+    ordered = SchedulerService(db).dominant_resource_fairness(cluster, queue)
+
+    # a catches up with b's 0.1 after a1, and the tie goes to b, whose deployment came first
+    assert names(ordered) == ["a1", "b1", "a2"]
+
+def test_share_is_the_largest_fraction_of_any_resource(db, cluster):
+    cluster, (a, b, _) = cluster
+    add(db, cluster, a, "cpu heavy", cpu=3.0, ram=0.0, status=DeploymentStatus.RUNNING)
+    add(db, cluster, b, "ram heavy", cpu=0.0, ram=5.0, status=DeploymentStatus.RUNNING)
+    queue = [add(db, cluster, b, "b1"), add(db, cluster, a, "a1")]
+
+    ordered = SchedulerService(db).dominant_resource_fairness(cluster, queue)
+
+    assert names(ordered) == ["a1", "b1"]
+
+def test_higher_priority_goes_first_within_a_user(db, cluster):
+    cluster, (a, _, _) = cluster
+    queue = [add(db, cluster, a, "low", priority=0), add(db, cluster, a, "high", priority=5)]
+
+    assert names(SchedulerService(db).dominant_resource_fairness(cluster, queue)) == ["high", "low"]
+
+def test_round_robin_policy_ignores_shares(db, cluster):
+    cluster, (a, b, _) = cluster
+    add(db, cluster, a, "running", cpu=8.0, status=DeploymentStatus.RUNNING)
+    queue = [add(db, cluster, a, "a1"), add(db, cluster, a, "a2"), add(db, cluster, b, "b1")]
+
+    scheduler = SchedulerService(db, fairness_policy="round_robin")
+
+    assert names(scheduler.ensure_fairness(cluster, queue)) == ["a1", "b1", "a2"]
+
+def reference_drf(scheduler, cluster, queue):
+    """The quadratic definition: rescan every user for the smallest share each step."""
+    totals = (cluster.total_cpu, cluster.total_ram, cluster.total_gpu)
+    user_deployments = scheduler._group_by_user(queue)
+    allocations = scheduler.get_user_allocations(cluster.id)
+    usage = {user_id: list(allocations.get(user_id, (0.0, 0.0, 0.0))) for user_id in user_deployments}
+
+    def share(user_id):
+        return max((used / total for used, total in zip(usage[user_id], totals) if total), default=0.0)
+
+    ordered = []
+    while any(user_deployments.values()):
+        user_id = min((u for u in user_deployments if user_deployments[u]), key=share)
+        deployment = user_deployments[user_id].pop(0)
+        ordered.append(deployment)
+        usage[user_id][0] += deployment.required_cpu
+        usage[user_id][1] += deployment.required_ram
+        usage[user_id][2] += deployment.required_gpu
+    return ordered
+
+def test_heap_matches_the_quadratic_definition(db):
+    rng = random.Random(7)
+    cluster, users = seed_cluster(db, cpu=64.0, ram=256.0, gpu=8, users=5)
+    for user in users[:3]:
+        add(db, cluster, user, "running", cpu=rng.randint(1, 8), ram=rng.randint(1, 32),
+            status=DeploymentStatus.RUNNING)
+    queue = []
+    for i in range(60):
+        deployment = Deployment(
+            name=f"d{i}", docker_image="test:latest", priority=rng.randint(0, 3),
+            required_cpu=rng.choice([0.5, 1.0, 2.0, 4.0]), required_ram=rng.choice([1.0, 4.0, 16.0]),
+            required_gpu=rng.choice([0, 0, 1]), cluster_id=cluster.id,
+            user_id=rng.choice(users).id, status=DeploymentStatus.QUEUED,
+        )
+        db.add(deployment)
+        queue.append(deployment)
+    db.commit()
+
+    scheduler = SchedulerService(db)
+
+    assert names(scheduler.dominant_resource_fairness(cluster, queue)) == names(reference_drf(scheduler, cluster, queue))
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.models import Cluster, Deployment, DeploymentGroup, DeploymentStatus
+from app.services.scheduler import SchedulerService
+
+@pytest.fixture
+def cluster_id(api):
+    """An empty 64 cpu cluster, so only the test's own deployments compete."""
+    response = api.client.post("/api/v1/clusters/", headers=api.headers, json=dict(
+        name="gangs", total_cpu=64, total_ram=64, total_gpu=0, organization_id=api.ids["organization"],
+    ))
+    response.raise_for_status()
+    return response.json()["id"]
+
+def deploy(api, cluster_id, cpu, priority=0):
+    response = api.client.post("/api/v1/deployments/", headers=api.headers, json=dict(
+        name="single", docker_image="app:1", priority=priority,
+        required_cpu=cpu, required_ram=1, required_gpu=0, cluster_id=cluster_id,
+    ))
+    response.raise_for_status()
+    return response.json()
+
+def gang(api, cluster_id, size, cpu, priority=0, **values):
+    member = dict(name="worker", docker_image="app:1", required_cpu=cpu, required_ram=1, required_gpu=0)
+    response = api.client.post("/api/v1/deployments/groups", headers=api.headers, json=dict(
+        name="gang", priority=priority, cluster_id=cluster_id, deployments=[member] * size, **values,
+    ))
+    response.raise_for_status()
+    return response.json()
+
+def statuses(api, group_id):
+    response = api.client.get(f"/api/v1/deployments/groups/{group_id}", headers=api.headers)
+    return [member["status"] for member in response.json()["deployments"]]
+
+def status(api, deployment_id):
+    return api.client.get(f"/api/v1/deployments/{deployment_id}", headers=api.headers).json()["status"]
+
+def available_cpu(api, cluster_id):
+    return api.client.get(f"/api/v1/clusters/{cluster_id}", headers=api.headers).json()["available_cpu"]
+
+def finish(api, deployment, new_status="completed"):
+    body = {key: deployment[key] for key in ("name", "docker_image", "priority", "required_cpu", "required_ram", "required_gpu")}
+    response = api.client.put(
+        f"/api/v1/deployments/{deployment['id']}", headers=api.headers, json=dict(body, status=new_status)
+    )
+    response.raise_for_status()
+
+def test_gang_that_fits_starts_all_members(api, cluster_id):
+    group = gang(api, cluster_id, 4, 16)
+
+    assert [member["status"] for member in group["deployments"]] == ["running"] * 4
+    assert available_cpu(api, cluster_id) == 0
+
+def test_partially_fitting_gang_stays_queued(api, cluster_id):
+    filler = deploy(api, cluster_id, 40)
+    # One 16 cpu member would fit into the 24 free, both would not
+    group = gang(api, cluster_id, 2, 16)
+
+    assert statuses(api, group["id"]) == ["queued", "queued"]
+    assert available_cpu(api, cluster_id) == 24
+
+    finish(api, filler)
+
+    assert statuses(api, group["id"]) == ["running", "running"]
+    assert available_cpu(api, cluster_id) == 32
+
+def test_running_gang_is_preempted_whole(api, cluster_id):
+    group = gang(api, cluster_id, 2, 24)
+    # 16 cpu are free; evicting one member would be enough, but the gang goes as a whole
+    urgent = deploy(api, cluster_id, 32, priority=9)
+
+    assert urgent["status"] == "running"
+    assert statuses(api, group["id"]) == ["queued", "queued"]
+    assert available_cpu(api, cluster_id) == 32
+
+def test_gang_preempts_lower_priority_deployments(api, cluster_id):
+    low = [deploy(api, cluster_id, 16) for _ in range(4)]
+    group = gang(api, cluster_id, 2, 16, priority=7)
+
+    assert statuses(api, group["id"]) == ["running", "running"]
+    assert sorted(status(api, deployment["id"]) for deployment in low) == ["queued", "queued", "running", "running"]
+    assert available_cpu(api, cluster_id) == 0
+
+def test_gang_that_cannot_preempt_enough_leaves_victims_running(api, cluster_id):
+    high = deploy(api, cluster_id, 40, priority=9)
+    low = deploy(api, cluster_id, 16)
+    group = gang(api, cluster_id, 2, 16, priority=5)
+
+    assert statuses(api, group["id"]) == ["queued", "queued"]
+    assert status(api, high["id"]) == status(api, low["id"]) == "running"
+    assert available_cpu(api, cluster_id) == 8
+
+def test_failed_member_fails_the_group_and_releases_it(api, cluster_id):
+    group = gang(api, cluster_id, 3, 16)
+
+    finish(api, group["deployments"][0], "failed")
+
+    assert statuses(api, group["id"]) == ["failed"] * 3
+    assert available_cpu(api, cluster_id) == 64
+
+def test_partly_running_gang_is_rolled_back_at_its_deadline(api, cluster_id):
+    group = gang(api, cluster_id, 2, 16, timeout_seconds=60)
+    # Simulate a gang left half started: one member back in the queue, past its deadline
+    db = api.sessionmaker()
+    try:
+        member = db.get(Deployment, group["deployments"][1]["id"])
+        member.status = DeploymentStatus.QUEUED
+        db.get(DeploymentGroup, group["id"]).created_at = datetime.utcnow() - timedelta(seconds=120)
+        db.get(Cluster, cluster_id).available_cpu += 16
+        db.commit()
+        assert available_cpu(api, cluster_id) == 48
+
+        SchedulerService(db).process_queue_batch(cluster_id)
+    finally:
+        db.close()
+
+    assert statuses(api, group["id"]) == ["failed", "failed"]
+    assert available_cpu(api, cluster_id) == 64
@@ -0,0 +1,15 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.core.metrics import instrument_engine
+
+def test_failed_statements_do_not_leak_start_times(engine):
+    instrument_engine(engine)
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+        conn.execute(text("SELECT 1"))
+
+        assert conn.info["query_start"] == []
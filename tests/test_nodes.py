@@ -0,0 +1,65 @@
+import pytest
+
+from app.db.models import Cluster, Deployment, DeploymentStatus, Node
+from app.schemas.node import NodeCreate
+from app.services.node import node_service
+from app.services.scheduler import SchedulerService
+from benchmarks.common import seed_cluster
+
+@pytest.fixture
+def split(db):
+    """Two 8 cpu nodes, each running one 5 cpu deployment: 6 cpu free, but at most 3 per node."""
+    cluster, users = seed_cluster(db, cpu=16.0, ram=16.0, gpu=0, users=1)
+    for index in range(2):
+        node_service.create(db, cluster=cluster, obj_in=NodeCreate(
+            name=f"node{index}", total_cpu=8.0, total_ram=8.0, total_gpu=0,
+        ))
+
+    def queue(name, priority):
+        deployment = Deployment(
+            name=name, docker_image="test:latest", priority=priority,
+            required_cpu=5.0, required_ram=1.0, required_gpu=0,
+            cluster_id=cluster.id, user_id=users[0].id, status=DeploymentStatus.QUEUED,
+        )
+        db.add(deployment)
+        db.commit()
+        return deployment
+
+    scheduler = SchedulerService(db)
+    running = [queue("a", 0), queue("b", 5)]
+    scheduler.process_queue_batch(cluster.id)
+    assert {deployment.node_id for deployment in running} == {node.id for node in db.query(Node)}
+    return scheduler, cluster, running, queue
+
+def statuses(db, deployments):
+    db.expire_all()
+    return [db.get(Deployment, deployment.id).status for deployment in deployments]
+
+def test_stranded_deployment_does_not_evict_equal_priorities(db, split):
+    scheduler, cluster, running, queue = split
+    stranded = queue("x", 0)
+
+    scheduler.process_queue_batch(cluster.id)
+    scheduler.handle_resource_fragmentation(db.get(Cluster, cluster.id), [stranded])
+
+    assert statuses(db, running + [stranded]) == [DeploymentStatus.RUNNING] * 2 + [DeploymentStatus.QUEUED]
+    assert db.get(Cluster, cluster.id).available_cpu == 6.0
+
+@pytest.mark.parametrize("batch", [True, False])
+def test_stranded_deployment_evicts_lower_priorities_on_one_node(db, split, batch):
+    scheduler, cluster, (low, high), queue = split
+    stranded = queue("x", 3)
+    node_id = low.node_id
+
+    if batch:
+        scheduler.process_queue_batch(cluster.id)
+    else:
+        scheduler.handle_resource_fragmentation(db.get(Cluster, cluster.id), [stranded])
+
+    assert statuses(db, [low, high, stranded]) == [
+        DeploymentStatus.QUEUED, DeploymentStatus.RUNNING, DeploymentStatus.RUNNING,
+    ]
+    db.expire_all()
+    assert db.get(Deployment, stranded.id).node_id == node_id
+    assert db.get(Deployment, low.id).node_id is None
+    assert sorted(node.available_cpu for node in db.query(Node)) == [3.0, 3.0]
@@ -0,0 +1,101 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from app.core.pagination import decode_cursor, encode_cursor, keyset_paginate
+from app.db.models import Deployment, DeploymentStatus
+from benchmarks.common import seed_cluster
+
+NOW = datetime(2026, 1, 1, 12, 30, 15, 250000)
+
+def test_cursor_round_trips():
+    cursor = encode_cursor(NOW, 42)
+
+    assert decode_cursor(cursor) == (NOW, 42)
+    # Used as a query parameter as is
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+
+def token(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor",
+    encode_cursor(NOW, 42)[:-3],
+    token({"created_at": NOW.isoformat(), "id": 42}),
+    token([NOW.isoformat(), 42, 7]),
+    token(["yesterday", 42]),
+    token([None, 42]),
+    token([NOW.isoformat(), "forty-two"]),
+    token([NOW.isoformat(), [42]]),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+])
+def test_tampered_cursor_is_a_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+@pytest.fixture
+def listed(db):
+    """Seven deployments, the first five created in the same instant."""
+    cluster, users = seed_cluster(db, cpu=8.0, ram=8.0, gpu=0, users=1)
+    created = [NOW] * 5 + [datetime(2026, 1, 2), datetime(2025, 12, 31)]
+    deployments = [
+        Deployment(
+            name=f"d{index}", docker_image="test:latest", required_cpu=1.0, required_ram=1.0,
+            required_gpu=0, cluster_id=cluster.id, user_id=users[0].id,
+            status=DeploymentStatus.QUEUED, created_at=created_at,
+        )
+        for index, created_at in enumerate(created)
+    ]
+    db.add_all(deployments)
+    db.commit()
+    return deployments
+
+def walk(page):
+    seen, cursor = [], None
+    while True:
+        rows, cursor = page(cursor)
+        seen.extend(rows)
+        if cursor is None:
+            return seen
+
+def test_pages_cover_every_row_once_with_id_breaking_ties(db, listed):
+    seen = walk(lambda cursor: keyset_paginate(db.query(Deployment), Deployment, limit=2, cursor=cursor))
+
+    expected = sorted(listed, key=lambda d: (d.created_at, d.id), reverse=True)
+    assert [d.id for d in seen] == [d.id for d in expected]
+
+def test_last_full_page_has_no_cursor(db, listed):
+    rows, cursor = keyset_paginate(db.query(Deployment), Deployment, limit=len(listed))
+
+    assert len(rows) == len(listed) and cursor is None
+
+def test_endpoint_follows_the_next_cursor_header(api):
+    db = api.sessionmaker()
+    try:
+        for index in range(3):
+            db.add(Deployment(
+                name=f"tie{index}", docker_image="app:1", required_cpu=1, required_ram=1, required_gpu=0,
+                status=DeploymentStatus.QUEUED, cluster_id=api.ids["cluster"], user_id=api.ids["user"],
+                created_at=NOW,
+            ))
+        db.commit()
+        expected = [d.id for d in db.query(Deployment).order_by(Deployment.created_at.desc(), Deployment.id.desc())]
+    finally:
+        db.close()
+
+    def page(cursor):
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = api.client.get("/api/v1/deployments/", headers=api.headers, params=params)
+        assert response.status_code == 200
+        return [item["id"] for item in response.json()], response.headers.get("X-Next-Cursor")
+
+    assert walk(page) == expected
+
+def test_endpoint_rejects_a_tampered_cursor(api):
+    response = api.client.get("/api/v1/deployments/", headers=api.headers, params={"cursor": token(["x", 1])})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
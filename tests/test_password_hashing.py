@@ -0,0 +1,87 @@
+import pytest
+from passlib.hash import bcrypt
+
+from app.core import security
+from app.core.config import settings
+from app.core.security import get_password_hash, verify_and_update_password
+from app.db.models import User
+
+CURRENT = f"$2b${settings.PASSWORD_BCRYPT_ROUNDS:02d}$"
+# Cheaper than the configured cost, as after PASSWORD_BCRYPT_ROUNDS is raised
+OLD_HASH = bcrypt.using(rounds=4, ident="2b").hash("secret")
+
+def test_only_hashes_of_another_cost_are_replaced():
+    current = get_password_hash("secret")
+
+    assert current.startswith(CURRENT)
+    assert verify_and_update_password("secret", current) == (True, None)
+    assert verify_and_update_password("wrong", OLD_HASH) == (False, None)
+    valid, new_hash = verify_and_update_password("secret", OLD_HASH)
+    assert valid and new_hash.startswith(CURRENT)
+
+@pytest.fixture(params=[1, 0], ids=["process pool", "threadpool"])
+def hashing(api, request, monkeypatch):
+    """api with the seeded user's password hashed at the old cost."""
+    security.shutdown_hash_pool()
+    monkeypatch.setattr(settings, "PASSWORD_HASH_WORKERS", request.param)
+    set_hash(api, OLD_HASH)
+    yield request.param
+    security.shutdown_hash_pool()
+
+def set_hash(api, hashed_password):
+    db = api.sessionmaker()
+    try:
+        db.get(User, api.ids["user"]).hashed_password = hashed_password
+        db.commit()
+    finally:
+        db.close()
+
+def stored_hash(api):
+    db = api.sessionmaker()
+    try:
+        return db.get(User, api.ids["user"]).hashed_password
+    finally:
+        db.close()
+
+def login(api, password):
+    return api.client.post(
+        "/api/v1/auth/login", data={"username": "user@api.example.com", "password": password}
+    )
+
+def test_login_rehashes_at_the_configured_cost(api, hashing):
+    response = login(api, "secret")
+
+    assert response.status_code == 200
+    assert response.json()["token_type"] == "bearer"
+    rehashed = stored_hash(api)
+    assert rehashed.startswith(CURRENT)
+    # bcrypt ran on the pool when one is configured, in the threadpool otherwise
+    assert (security._hash_pool is not None) == bool(hashing)
+
+    assert login(api, "secret").status_code == 200
+    assert stored_hash(api) == rehashed
+
+def test_failed_login_keeps_the_old_hash(api, hashing):
+    response = login(api, "wrong")
+
+    assert response.status_code == 401
+    assert stored_hash(api) == OLD_HASH
+
+def test_unknown_email_is_rejected_like_a_wrong_password(api, hashing):
+    response = api.client.post("/api/v1/auth/login", data={"username": "nobody@api.example.com", "password": "x"})
+
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Incorrect email or password"
+
+def test_register_hashes_on_the_pool_and_rejects_duplicates(api, hashing):
+    body = {"email": "new@api.example.com", "password": "secret"}
+
+    assert api.client.post("/api/v1/auth/register", json=body).status_code == 200
+    assert api.client.post("/api/v1/auth/register", json=body).status_code == 400
+
+    db = api.sessionmaker()
+    try:
+        user = db.query(User).filter(User.email == "new@api.example.com").one()
+        assert user.hashed_password.startswith(CURRENT)
+    finally:
+        db.close()
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from app.db.models import Cluster, Organization
+from app.schemas.node import NodeCreate
+from app.services.node import node_service
+from app.services.placement import placement_service, score_clusters
+
+def test_best_fit_prefers_the_tightest_cluster():
+    available = np.array([[8.0, 8.0, 0.0], [3.0, 3.0, 0.0]])
+    totals = np.array([[8.0, 8.0, 0.0], [8.0, 8.0, 0.0]])
+
+    scores = score_clusters(available, totals, np.array([2.0, 2.0, 0.0]), "best_fit")
+
+    assert np.argmax(scores) == 1
+
+def test_least_loaded_prefers_the_scarcest_resource_with_most_room():
+    # The first cluster has more cpu free but its ram is nearly gone
+    available = np.array([[7.0, 2.0, 0.0], [4.0, 4.0, 0.0]])
+    totals = np.array([[8.0, 8.0, 0.0], [8.0, 8.0, 0.0]])
+
+    scores = score_clusters(available, totals, np.array([1.0, 1.0, 0.0]), "least_loaded")
+
+    assert np.argmax(scores) == 1
+
+def test_clusters_that_cannot_start_it_score_minus_infinity():
+    available = np.array([[8.0, 8.0, 0.0], [8.0, 8.0, 2.0], [1.0, 8.0, 2.0]])
+    totals = np.array([[8.0, 8.0, 0.0], [8.0, 8.0, 2.0], [8.0, 8.0, 2.0]])
+
+    scores = score_clusters(available, totals, np.array([2.0, 1.0, 1.0]))
+
+    assert np.isneginf(scores[0]) and np.isneginf(scores[2])
+    assert np.isfinite(scores[1])
+
+@pytest.fixture
+def organization(db):
+    organization = Organization(name="placement", invite_code="placement")
+    db.add(organization)
+    db.commit()
+
+    def cluster(name, cpu, available_cpu=None, ram=8.0):
+        available_cpu = cpu if available_cpu is None else available_cpu
+        cluster = Cluster(
+            name=name, organization_id=organization.id,
+            total_cpu=cpu, total_ram=ram, total_gpu=0,
+            available_cpu=available_cpu, available_ram=ram, available_gpu=0,
+        )
+        db.add(cluster)
+        db.commit()
+        return cluster
+
+    return organization, cluster
+
+def place(db, organization, requirements, policy):
+    return placement_service.place_many(
+        db, organization_id=organization.id, requirements=requirements, policy=policy
+    )
+
+@pytest.mark.parametrize("policy", ["best_fit", "least_loaded"])
+def test_batch_spreads_once_the_best_cluster_is_charged(db, organization, policy):
+    organization, cluster = organization
+    a, b = cluster("a", 8.0), cluster("b", 8.0)
+
+    placements = place(db, organization, [(6.0, 1.0, 0)] * 2, policy)
+
+    assert sorted(placements) == sorted([a.id, b.id])
+    # Placement only reserves in memory, the clusters are untouched
+    assert db.get(Cluster, a.id).available_cpu == 8.0
+
+def test_best_fit_fills_the_tighter_cluster_first(db, organization):
+    organization, cluster = organization
+    roomy, tight = cluster("roomy", 8.0), cluster("tight", 8.0, available_cpu=4.0)
+
+    assert place(db, organization, [(4.0, 1.0, 0), (4.0, 1.0, 0)], "best_fit") == [tight.id, roomy.id]
+
+def test_nothing_free_queues_on_the_least_loaded_cluster_that_can_hold_it(db, organization):
+    organization, cluster = organization
+    cluster("small", 4.0, available_cpu=4.0)
+    busy = cluster("busy", 16.0, available_cpu=2.0)
+    idle = cluster("idle", 16.0, available_cpu=8.0)
+
+    # Only busy and idle are ever large enough; idle has more free
+    assert place(db, organization, [(10.0, 1.0, 0)], "best_fit") == [idle.id]
+    busy.available_cpu = 12.0
+    db.commit()
+    assert place(db, organization, [(10.0, 1.0, 0)], "best_fit") == [busy.id]
+
+def test_too_large_for_every_cluster_is_not_placed(db, organization):
+    organization, cluster = organization
+    cluster("a", 8.0)
+
+    assert place(db, organization, [(9.0, 1.0, 0), (1.0, 1.0, 0)], "best_fit")[0] is None
+
+def test_organization_without_clusters_places_nothing(db, organization):
+    organization, _ = organization
+
+    assert place(db, organization, [(1.0, 1.0, 0)] * 2, "best_fit") == [None, None]
+
+def test_cluster_with_nodes_counts_only_if_one_node_fits(db, organization):
+    organization, cluster = organization
+    # Scores better for 6 cpu than large, but its 8 cpu are two 4 cpu nodes
+    split = cluster("split", 8.0)
+    for index in range(2):
+        node_service.create(db, cluster=split, obj_in=NodeCreate(
+            name=f"node{index}", total_cpu=4.0, total_ram=4.0, total_gpu=0,
+        ))
+    large = cluster("large", 20.0, ram=20.0)
+
+    assert place(db, organization, [(6.0, 1.0, 0)], "best_fit") == [large.id]
+    assert place(db, organization, [(3.0, 1.0, 0)] * 3, "best_fit") == [split.id, split.id, large.id]
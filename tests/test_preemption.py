@@ -0,0 +1,174 @@
+from types import SimpleNamespace
+
+from sqlalchemy import event
+
+from app.db.models import Cluster, Deployment, DeploymentStatus
+from app.services.preemption import _greedy, plan_preemption, select_victims
+from app.services.scheduler import SchedulerService
+from benchmarks.common import seed_cluster
+
+def unit(id, cpu, priority=0):
+    return SimpleNamespace(
+        id=id, required_cpu=cpu, required_ram=0.0, required_gpu=0, priority=priority, group_id=None,
+    )
+
+# Greedy takes the 7 cpu candidate first (best cost per cpu) and then needs a second one
+RESOURCES = [(7.0, 0.0, 0.0), (5.0, 0.0, 0.0), (5.0, 0.0, 0.0)]
+COSTS = [3.0, 2.5, 2.5]
+SHORTFALL = (10.0, 0.0, 0.0)
+
+def test_branch_and_bound_beats_greedy():
+    greedy = _greedy(RESOURCES, COSTS, SHORTFALL)
+    chosen, exact = select_victims(RESOURCES, COSTS, SHORTFALL, exact_limit=24, time_budget=1.0)
+
+    assert sum(COSTS[i] for i in greedy) == 5.5
+    assert sorted(chosen) == [1, 2]
+    assert exact
+
+def covers(resources, chosen, shortfall):
+    return all(sum(resources[i][k] for i in chosen) >= shortfall[k] for k in range(3))
+
+def test_over_exact_limit_falls_back_to_a_feasible_greedy_set():
+    chosen, exact = select_victims(RESOURCES, COSTS, SHORTFALL, exact_limit=2, time_budget=1.0)
+
+    assert not exact
+    assert sorted(chosen) == sorted(_greedy(RESOURCES, COSTS, SHORTFALL))
+    assert covers(RESOURCES, chosen, SHORTFALL)
+
+def test_out_of_time_search_still_returns_a_feasible_set():
+    resources = [(float(1 + i % 7), float(1 + i % 5), 0.0) for i in range(22)]
+    costs = [1.0 + (i * 37 % 11) / 10 for i in range(22)]
+    shortfall = (40.0, 30.0, 0.0)
+
+    chosen, exact = select_victims(resources, costs, shortfall, exact_limit=24, time_budget=0.0)
+
+    assert not exact
+    assert covers(resources, chosen, shortfall)
+
+def test_infeasible_input_has_no_plan():
+    assert select_victims(RESOURCES, COSTS, (20.0, 0.0, 0.0), exact_limit=24, time_budget=1.0) == (None, True)
+
+    plan = plan_preemption(
+        unit(9, 20.0, 5), [unit(i, cpu) for i, (cpu, _, _) in enumerate(RESOURCES)],
+        (0.0, 0.0, 0.0), (20.0, 1.0, 1.0), cost_model="priority", exact_limit=24, time_budget=1.0,
+    )
+    assert not plan.feasible
+    assert plan.victims == []
+
+def running_cluster(db, specs, cpu=10.0):
+    """A cluster of cpu cpus running one deployment per (cpu, priority) in specs."""
+    cluster, users = seed_cluster(db, cpu=cpu, ram=10.0, gpu=0, users=1)
+    deployments = [
+        Deployment(
+            name=f"r{index}", docker_image="test:latest", priority=priority,
+            required_cpu=required, required_ram=0.0, required_gpu=0,
+            cluster_id=cluster.id, user_id=users[0].id, status=DeploymentStatus.RUNNING,
+        )
+        for index, (required, priority) in enumerate(specs)
+    ]
+    db.add_all(deployments)
+    cluster.available_cpu -= sum(required for required, _ in specs)
+    db.commit()
+    return cluster, users[0], deployments
+
+def add_queued(db, cluster, user, cpu, priority):
+    deployment = Deployment(
+        name="queued", docker_image="test:latest", priority=priority,
+        required_cpu=cpu, required_ram=0.0, required_gpu=0,
+        cluster_id=cluster.id, user_id=user.id, status=DeploymentStatus.QUEUED,
+    )
+    db.add(deployment)
+    db.commit()
+    return deployment
+
+def test_infeasible_preemption_changes_no_state(db):
+    cluster, user, running = running_cluster(db, [(6.0, 1), (4.0, 9)])
+    new = add_queued(db, cluster, user, 8.0, 5)
+    version = cluster.version
+
+    assert not SchedulerService(db).preempt_deployments(new)
+
+    db.expire_all()
+    assert [db.get(Deployment, deployment.id).status for deployment in running] == [DeploymentStatus.RUNNING] * 2
+    assert db.get(Deployment, new.id).status == DeploymentStatus.QUEUED
+    assert db.get(Cluster, cluster.id).available_cpu == 0.0
+    assert db.get(Cluster, cluster.id).version == version
+
+def test_batch_pass_evicts_only_the_cheapest_set(db):
+    cluster, user, (a, b, c) = running_cluster(db, [(6.0, 1), (3.0, 1), (1.0, 1)])
+    new = add_queued(db, cluster, user, 6.0, 5)
+
+    SchedulerService(db).process_queue_batch(cluster.id)
+
+    db.expire_all()
+    statuses = [db.get(Deployment, deployment.id).status for deployment in (a, b, c, new)]
+    assert statuses == [DeploymentStatus.QUEUED] + [DeploymentStatus.RUNNING] * 3
+    assert db.get(Cluster, cluster.id).available_cpu == 0.0
+
+def test_defragmentation_leaves_equal_priorities_alone(db):
+    # 1 of 10 cpu free and nothing queued can start or preempt
+    cluster, user, running = running_cluster(db, [(5.0, 0), (4.0, 0)])
+    new = add_queued(db, cluster, user, 6.0, 0)
+
+    assert SchedulerService(db).process_queue_batch(cluster.id) == 0
+
+    db.expire_all()
+    assert db.get(Deployment, new.id).status == DeploymentStatus.QUEUED
+
+def test_defragmentation_reuses_the_freed_capacity(db):
+    # Priority 0 never preempts, so only defragmentation can make room for new
+    cluster, user, (low, other) = running_cluster(db, [(5.0, -1), (4.0, 0)])
+    new = add_queued(db, cluster, user, 6.0, 0)
+
+    rows = SchedulerService(db).process_queue_batch(cluster.id)
+
+    db.expire_all()
+    statuses = [db.get(Deployment, deployment.id).status for deployment in (low, other, new)]
+    # other was evicted too, but fit back and counts as unchanged
+    assert statuses == [DeploymentStatus.QUEUED, DeploymentStatus.RUNNING, DeploymentStatus.RUNNING]
+    assert db.get(Cluster, cluster.id).available_cpu == 0.0
+    # new, low and the cluster row
+    assert rows == 3
+
+def test_dry_run_endpoint_writes_nothing(api):
+    db = api.sessionmaker()
+    try:
+        cluster = db.get(Cluster, api.ids["cluster"])
+        running = [
+            Deployment(
+                name=f"r{priority}", docker_image="app:1", priority=priority,
+                required_cpu=32, required_ram=1, required_gpu=0,
+                cluster_id=cluster.id, user_id=api.ids["user"], status=DeploymentStatus.RUNNING,
+            )
+            for priority in (1, 2)
+        ]
+        new = Deployment(
+            name="new", docker_image="app:1", priority=5, required_cpu=16, required_ram=1, required_gpu=0,
+            cluster_id=cluster.id, user_id=api.ids["user"], status=DeploymentStatus.QUEUED,
+        )
+        db.add_all(running + [new])
+        cluster.available_cpu = 0
+        db.commit()
+        ids = [deployment.id for deployment in running + [new]]
+    finally:
+        db.close()
+    writes = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("SELECT"):
+            writes.append(statement)
+
+    for engine in api.engines:
+        event.listen(engine, "before_cursor_execute", record)
+    response = api.client.get(f"/api/v1/deployments/{ids[2]}/preemption-plan", headers=api.headers)
+
+    assert response.status_code == 200
+    assert response.json()["feasible"] is True
+    assert response.json()["victim_ids"] == [ids[0]]
+    assert writes == []
+    db = api.sessionmaker()
+    try:
+        statuses = [db.get(Deployment, deployment_id).status for deployment_id in ids]
+    finally:
+        db.close()
+    assert statuses == [DeploymentStatus.RUNNING, DeploymentStatus.RUNNING, DeploymentStatus.QUEUED]
@@ -0,0 +1,125 @@
+import time
+
+import fakeredis
+import pytest
+
+from app.core import principal_cache as module
+from app.core.config import settings
+from app.core.principal_cache import Principal, PrincipalCache, principal_cache
+from app.db.models import Organization, User
+from app.schemas.user import UserUpdate
+from app.services.user import user_service
+
+def principal(user_id, organization_id=1):
+    return Principal(id=user_id, organization_id=organization_id, role="user", is_active=True)
+
+def test_entries_expire_after_the_ttl():
+    cache = PrincipalCache(ttl=0.0)
+    cache.put("t", {}, principal(1))
+
+    assert cache.get("t") is None
+    assert len(cache) == 0
+
+def test_entries_never_outlive_the_token():
+    cache = PrincipalCache(ttl=60.0)
+    cache.put("expired", {"exp": time.time() - 1}, principal(1))
+    cache.put("valid", {"exp": time.time() + 60}, principal(1))
+
+    assert cache.get("expired") is None
+    assert cache.get("valid") == ({"exp": pytest.approx(time.time() + 60, abs=5)}, principal(1))
+
+def test_least_recently_used_goes_first():
+    cache = PrincipalCache(ttl=60.0, max_size=2)
+    cache.put("a", {}, principal(1))
+    cache.put("b", {}, principal(2))
+    cache.get("a")
+    cache.put("c", {}, principal(3))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+def test_invalidate_user_drops_every_token_of_that_user_only():
+    cache = PrincipalCache(ttl=60.0)
+    cache.put("a1", {}, principal(1))
+    cache.put("a2", {}, principal(1))
+    cache.put("b", {}, principal(2))
+
+    cache.invalidate_user(1)
+
+    assert cache.get("a1") is None and cache.get("a2") is None
+    assert cache.get("b") is not None
+    # Evicting b afterwards must not trip over user 1's emptied token set
+    cache.invalidate_user(1)
+    cache.invalidate_user(2)
+    assert len(cache) == 0
+
+def token(api):
+    return api.headers["Authorization"].split(" ", 1)[1]
+
+def test_requests_are_authenticated_from_the_cache(api, statements):
+    api.client.get("/api/v1/clusters/", headers=api.headers).raise_for_status()
+    cached = principal_cache.get(token(api))
+    assert cached is not None and cached[1].id == api.ids["user"]
+    statements()
+
+    api.client.get("/api/v1/clusters/", headers=api.headers).raise_for_status()
+
+    # Only the listing itself: the user is not loaded again
+    assert statements() == 1
+
+def test_joining_an_organization_invalidates_the_principal(api):
+    db = api.sessionmaker()
+    try:
+        other = Organization(name="other", invite_code="other")
+        db.add(other)
+        db.commit()
+        other_id = other.id
+    finally:
+        db.close()
+    api.client.get("/api/v1/clusters/", headers=api.headers).raise_for_status()
+
+    api.client.post("/api/v1/organizations/join/other", headers=api.headers).raise_for_status()
+
+    assert principal_cache.get(token(api)) is None
+    api.client.get("/api/v1/clusters/", headers=api.headers).raise_for_status()
+    assert principal_cache.get(token(api))[1].organization_id == other_id
+
+def test_deactivating_a_user_invalidates_the_principal(api):
+    api.client.get("/api/v1/clusters/", headers=api.headers).raise_for_status()
+    db = api.sessionmaker()
+    try:
+        user_service.update(db, db.get(User, api.ids["user"]), UserUpdate(email="user@api.example.com", is_active=False))
+    finally:
+        db.close()
+
+    assert principal_cache.get(token(api)) is None
+    api.client.get("/api/v1/clusters/", headers=api.headers)
+    assert principal_cache.get(token(api))[1].is_active is False
+
+@pytest.fixture
+def redis_invalidation(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(settings, "AUTH_CACHE_REDIS_INVALIDATION", True)
+    monkeypatch.setattr(module, "_redis_client", client)
+    return client
+
+def test_invalidation_is_published_to_other_workers(redis_invalidation):
+    pubsub = redis_invalidation.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(module.INVALIDATION_CHANNEL)
+    principal_cache.put("t", {}, principal(7))
+
+    module.invalidate_principal(7)
+
+    assert principal_cache.get("t") is None
+    messages = [pubsub.get_message(timeout=0.1) for _ in range(3)]
+    assert [int(message["data"]) for message in messages if message] == [7]
+
+def test_published_invalidations_are_applied():
+    principal_cache.put("t", {}, principal(7))
+    principal_cache.put("u", {}, principal(8))
+
+    module._handle_invalidation({"data": b"not a user"})
+    assert len(principal_cache) == 2
+
+    module._handle_invalidation({"data": b"7"})
+    assert principal_cache.get("t") is None and principal_cache.get("u") is not None
@@ -0,0 +1,25 @@
+import random
+
+import pytest
+
+from app.services.scheduler import SchedulerService
+from benchmarks.common import random_deployment, seed_cluster
+from benchmarks.query_plans import HOT_QUERIES, capture_statements, explain, is_sequential_scan
+
+@pytest.fixture
+def scheduled(engine, db):
+    rng = random.Random(0)
+    cluster, users = seed_cluster(db)
+    db.add_all([random_deployment(rng, cluster, users, f"d{i}") for i in range(200)])
+    db.commit()
+    return SchedulerService(db), cluster
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_an_index(engine, scheduled, name):
+    scheduler, cluster = scheduled
+    statements = capture_statements(engine, lambda: HOT_QUERIES[name](scheduler, cluster))
+
+    assert statements
+    for statement, parameters in statements:
+        plan = explain(engine, statement, parameters)
+        assert not any(is_sequential_scan(line) for line in plan), "\n".join([statement, *plan])
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+import fakeredis
+import pytest
+
+from app.db.models import Deployment, DeploymentStatus
+from app.services.queue_store import QueueStore
+from app.services.scheduler import SchedulerService
+
+@pytest.fixture
+def store():
+    return QueueStore(fakeredis.FakeRedis())
+
+def queue(db, cluster, user, specs):
+    """Add queued deployments from (priority, created_at) pairs."""
+    deployments = [
+        Deployment(
+            name=f"d{index}",
+            docker_image="test:latest",
+            priority=priority,
+            required_cpu=1.0,
+            required_ram=1.0,
+            required_gpu=0,
+            cluster_id=cluster.id,
+            user_id=user.id,
+            status=DeploymentStatus.QUEUED,
+            created_at=created_at,
+        )
+        for index, (priority, created_at) in enumerate(specs)
+    ]
+    db.add_all(deployments)
+    db.commit()
+    return deployments
+
+def sql_order(db, cluster):
+    return [
+        deployment.id
+        for deployment in db.query(Deployment)
+        .filter(Deployment.cluster_id == cluster.id, Deployment.status == DeploymentStatus.QUEUED)
+        .order_by(Deployment.priority.desc(), Deployment.created_at.asc(), Deployment.id.asc())
+    ]
+
+def head_ids(store, cluster_id, limit=None):
+    return [QueueStore.deployment_id(member) for member in store.head(cluster_id, limit)]
+
+def test_reconcile_rebuilds_queues_from_sql(db, seeded, store):
+    cluster, users = seeded
+    now = datetime(2026, 1, 1)
+    deployments = queue(db, cluster, users[0], [(0, now), (3, now), (1, now)])
+    deployments[2].status = DeploymentStatus.RUNNING
+    db.commit()
+    store.client.zadd(QueueStore.key(999), {"leftover": 0})
+
+    assert store.reconcile(db) == 2
+    assert store.size(cluster.id) == 2
+    assert store.size(999) == 0
+    assert head_ids(store, cluster.id) == [deployments[1].id, deployments[0].id]
+
+def test_head_order_matches_sql_order(db, seeded, store):
+    cluster, users = seeded
+    now = datetime(2026, 1, 1)
+    microsecond = timedelta(microseconds=1)
+    # Microsecond gaps, equal timestamps and a wide priority range must all keep SQL order
+    queue(db, cluster, users[0], [
+        (5, now + 2 * microsecond),
+        (5, now + microsecond),
+        (5, now + microsecond),
+        (0, now - timedelta(days=365 * 40)),
+        (9, now + timedelta(days=365 * 40)),
+        (-3, now),
+        (5, now + microsecond),
+        (1000, now),
+    ])
+    store.reconcile(db)
+
+    assert head_ids(store, cluster.id) == sql_order(db, cluster)
+    assert head_ids(store, cluster.id, limit=3) == sql_order(db, cluster)[:3]
+
+def test_apply_keeps_sql_order_and_removes_dequeued(db, seeded, store):
+    cluster, users = seeded
+    now = datetime(2026, 1, 1)
+    deployments = queue(db, cluster, users[0], [(2, now), (2, now), (7, now + timedelta(microseconds=1))])
+    store.apply(QueueStore.entry(deployment) for deployment in deployments)
+    assert head_ids(store, cluster.id) == sql_order(db, cluster)
+
+    deployments[2].status = DeploymentStatus.RUNNING
+    db.commit()
+    store.apply([QueueStore.entry(deployments[2])])
+    assert head_ids(store, cluster.id) == sql_order(db, cluster)
+
+def test_stale_members_are_dropped(db, seeded, store):
+    cluster, users = seeded
+    now = datetime(2026, 1, 1)
+    deployments = queue(db, cluster, users[0], [(1, now), (0, now), (0, now + timedelta(seconds=1))])
+    store.reconcile(db)
+    # The store never hears about these changes
+    deployments[0].status = DeploymentStatus.RUNNING
+    db.delete(deployments[1])
+    db.commit()
+
+    queued = SchedulerService(db, queue_store=store).get_queued_deployments(cluster.id)
+
+    assert [deployment.id for deployment in queued] == [deployments[2].id]
+    assert head_ids(store, cluster.id) == [deployments[2].id]
+
+def test_fitting_candidates_scan_past_the_head(db, seeded, store):
+    cluster, users = seeded
+    now = datetime(2026, 1, 1)
+    deployments = queue(db, cluster, users[0], [(9 - index, now) for index in range(8)])
+    # Nothing at the head fits, and a stale member sits just ahead of the one that does
+    for deployment in deployments[:6]:
+        deployment.required_cpu = cluster.total_cpu * 2
+    db.delete(deployments[6])
+    db.commit()
+    store.reconcile(db)
+    store.client.zadd(QueueStore.key(cluster.id), {QueueStore.member(deployments[6]): -3})
+    scheduler = SchedulerService(db, queue_store=store)
+
+    fitting = scheduler.get_fitting_candidates(cluster, 2)
+
+    assert [deployment.id for deployment in fitting] == [deployments[7].id]
+    assert fitting == SchedulerService(db).get_fitting_candidates(cluster, 2)
+    assert scheduler.get_fitting_candidates(cluster, 1) == fitting
+    assert store.size(cluster.id) == 7
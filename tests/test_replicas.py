@@ -0,0 +1,115 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.db import replicas
+from app.db.replicas import (
+    READ_PRIMARY_COOKIE,
+    RecentWriters,
+    Replica,
+    ReadYourWritesMiddleware,
+    ReplicaRouter,
+    get_async_read_db,
+)
+
+def marked_database(path, name):
+    """A SQLite file whose marker table says which database answered."""
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE marker (name TEXT)"))
+        conn.execute(text("INSERT INTO marker (name) VALUES (:name)"), {"name": name})
+    engine.dispose()
+    return f"sqlite:///{path}"
+
+@pytest.fixture
+def router(tmp_path, monkeypatch):
+    primary_url = marked_database(tmp_path / "primary.db", "primary")
+    replica_url = marked_database(tmp_path / "replica.db", "replica")
+    primary = create_async_engine(primary_url.replace("sqlite", "sqlite+aiosqlite", 1))
+    router = ReplicaRouter([replica_url], max_lag=1.0, check_interval=0.0)
+    monkeypatch.setattr(replicas, "AsyncSessionLocal", async_sessionmaker(primary, expire_on_commit=False))
+    monkeypatch.setattr(replicas, "replica_router", router)
+    yield router
+    for engine in [primary, *(replica.engine for replica in router.replicas)]:
+        engine.sync_engine.dispose()
+
+@pytest.fixture
+def client(router):
+    app = FastAPI()
+    app.add_middleware(ReadYourWritesMiddleware, window=30.0)
+
+    @app.get("/source")
+    async def source(db=Depends(get_async_read_db)):
+        return {"name": await db.scalar(text("SELECT name FROM marker"))}
+
+    @app.post("/write")
+    async def write():
+        return {}
+
+    @app.post("/fail", status_code=400)
+    async def fail():
+        return {}
+
+    with TestClient(app) as client:
+        yield client
+
+def read_source(client, headers=None):
+    return client.get("/source", headers=headers).json()["name"]
+
+def test_reads_go_to_the_replica(client):
+    assert read_source(client) == "replica"
+    assert read_source(client) == "replica"
+
+def test_lagging_replica_falls_back_to_primary(client, router, monkeypatch):
+    async def lagging(self):
+        return 30.0
+
+    monkeypatch.setattr(Replica, "_measure", lagging)
+    assert read_source(client) == "primary"
+    assert router.replicas[0].lag == 30.0
+
+def test_unreachable_replica_falls_back_to_primary(client, monkeypatch):
+    async def unreachable(self):
+        raise ConnectionError("replica is down")
+
+    monkeypatch.setattr(Replica, "_measure", unreachable)
+    assert read_source(client) == "primary"
+
+def test_reads_stick_to_primary_after_a_write(client):
+    assert client.post("/fail").status_code == 400
+    assert READ_PRIMARY_COOKIE not in client.cookies
+    assert read_source(client) == "replica"
+
+    assert client.post("/write").status_code == 200
+    assert READ_PRIMARY_COOKIE in client.cookies
+    assert read_source(client) == "primary"
+
+    # Once the window has passed the client reads from the replica again
+    client.cookies.set(READ_PRIMARY_COOKIE, "0")
+    assert read_source(client) == "replica"
+
+def test_without_replicas_reads_use_primary(client, monkeypatch):
+    monkeypatch.setattr(replicas, "replica_router", ReplicaRouter([]))
+    assert read_source(client) == "primary"
+
+def test_bearer_clients_without_cookies_stick_to_primary_after_a_write(client):
+    writer, other = {"Authorization": "Bearer writer"}, {"Authorization": "Bearer other"}
+
+    assert client.post("/write", headers=writer).status_code == 200
+    client.cookies.clear()
+
+    assert read_source(client, writer) == "primary"
+    assert read_source(client, other) == "replica"
+
+def test_recent_writers_expire_and_stay_bounded():
+    writers = RecentWriters(max_size=2)
+    writers.mark("a", until=0.0)
+    assert not writers.wrote_recently("a")
+    assert len(writers) == 0
+
+    for token in ("a", "b", "c"):
+        writers.mark(token, until=float("inf"))
+    assert not writers.wrote_recently("a")
+    assert writers.wrote_recently("b") and writers.wrote_recently("c")
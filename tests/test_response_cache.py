@@ -0,0 +1,167 @@
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.response_cache import CachedResponse, ResponseCache, mark_changed, response_cache
+from app.core.security import create_access_token
+from app.db.models import Cluster, Organization, User
+from app.schemas.user import UserUpdate
+from app.services.user import user_service
+
+def entry(body=b"{}"):
+    return CachedResponse(body, '"etag"')
+
+def test_invalidating_a_tag_drops_every_entry_rendered_from_it():
+    cache = ResponseCache(ttl=60.0)
+    cache.put("cluster", entry(), [("cluster", 1)])
+    cache.put("list", entry(), [("organization", 1), ("cluster", 1), ("cluster", 2)])
+    cache.put("other", entry(), [("cluster", 2)])
+
+    cache.invalidate([("cluster", 1)])
+
+    assert cache.get("cluster") is None and cache.get("list") is None
+    assert cache.get("other") is not None
+
+def test_entries_expire_and_the_least_recently_used_goes_first():
+    assert ResponseCache(ttl=0.0).get("a") is None
+    cache = ResponseCache(ttl=60.0, max_size=2)
+    cache.put("a", entry(), [])
+    cache.put("b", entry(), [])
+    cache.get("a")
+    cache.put("c", entry(), [])
+
+    assert cache.get("b") is None and len(cache) == 2
+
+def test_rolled_back_changes_invalidate_nothing(db):
+    response_cache.put("cluster", entry(), [("cluster", 1)])
+
+    db.execute(select(1))
+    mark_changed(db, [("cluster", 1)])
+    db.rollback()
+    db.commit()
+    assert response_cache.get("cluster") is not None
+
+    mark_changed(db, [("cluster", 1)])
+    db.commit()
+    assert response_cache.get("cluster") is None
+
+def get(api, path, etag=None):
+    headers = {**api.headers, **({"If-None-Match": etag} if etag else {})}
+    return api.client.get(path, headers=headers)
+
+def cluster_path(api):
+    return f"/api/v1/clusters/{api.ids['cluster']}"
+
+def resize(api, cpu):
+    # Keeps the seeded cluster's other totals, including its lack of GPUs
+    db = api.sessionmaker()
+    try:
+        cluster = db.get(Cluster, api.ids["cluster"])
+        cluster.total_cpu = cluster.available_cpu = cpu
+        db.commit()
+    finally:
+        db.close()
+
+@pytest.mark.parametrize("header", ["{etag}", "W/{etag}", '"other", {etag}', "*"])
+def test_matching_if_none_match_answers_304(api, header):
+    etag = get(api, cluster_path(api)).headers["ETag"]
+
+    response = get(api, cluster_path(api), header.format(etag=etag))
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+def test_a_write_changes_the_cluster_etag(api):
+    etag = get(api, cluster_path(api)).headers["ETag"]
+    resize(api, 32)
+
+    response = get(api, cluster_path(api), etag)
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["total_cpu"] == 32
+
+@pytest.fixture
+def cached(monkeypatch):
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", True)
+
+def test_cached_reads_skip_the_database_until_a_write(api, statements, cached):
+    first = get(api, cluster_path(api))
+    statements()
+
+    hit = get(api, cluster_path(api))
+    assert hit.status_code == 200 and hit.content == first.content
+    assert statements() == 0
+
+    resize(api, 16)
+    statements()
+    fresh = get(api, cluster_path(api))
+    assert fresh.json()["total_cpu"] == 16
+    assert statements() > 0
+
+def test_cached_cluster_is_not_served_to_another_organization(api, cached):
+    get(api, cluster_path(api)).raise_for_status()
+    db = api.sessionmaker()
+    try:
+        other = Organization(name="other", invite_code="other")
+        db.add(other)
+        db.flush()
+        outsider = User(email="outsider@api.example.com", hashed_password="x", organization_id=other.id)
+        db.add(outsider)
+        db.commit()
+        outsider_id = outsider.id
+    finally:
+        db.close()
+
+    response = api.client.get(cluster_path(api), headers={"Authorization": f"Bearer {create_access_token(outsider_id)}"})
+
+    assert response.status_code == 403
+
+def organization_path(api):
+    return f"/api/v1/organizations/{api.ids['organization']}"
+
+def test_organization_revalidation_only_reads_the_version(api, statements):
+    etag = get(api, organization_path(api)).headers["ETag"]
+    statements()
+
+    response = get(api, organization_path(api), etag)
+
+    assert response.status_code == 304
+    assert statements() == 1
+
+def test_organization_etag_follows_its_row_and_its_users(api):
+    etag = get(api, organization_path(api)).headers["ETag"]
+    api.client.put(organization_path(api), headers=api.headers, json={"name": "renamed"}).raise_for_status()
+
+    renamed = get(api, organization_path(api), etag)
+    assert renamed.status_code == 200 and renamed.json()["name"] == "renamed"
+
+    etag = renamed.headers["ETag"]
+    db = api.sessionmaker()
+    try:
+        user_service.update(db, db.get(User, api.ids["user"]), UserUpdate(email="moved@api.example.com"))
+    finally:
+        db.close()
+
+    changed = get(api, organization_path(api), etag)
+    assert changed.status_code == 200
+    assert [user["email"] for user in changed.json()["users"]] == ["moved@api.example.com"]
+
+def test_leaving_an_organization_changes_both_etags(api):
+    db = api.sessionmaker()
+    try:
+        db.add(Organization(name="other", invite_code="other"))
+        db.commit()
+        other_id = db.query(Organization.id).filter(Organization.invite_code == "other").scalar()
+    finally:
+        db.close()
+    other_path = f"/api/v1/organizations/{other_id}"
+    etags = [get(api, organization_path(api)).headers["ETag"], get(api, other_path).headers["ETag"]]
+
+    api.client.post("/api/v1/organizations/join/other", headers=api.headers).raise_for_status()
+
+    left, joined = get(api, organization_path(api), etags[0]), get(api, other_path, etags[1])
+    assert (left.status_code, left.json()["users"]) == (200, [])
+    assert joined.status_code == 200
+    assert [user["id"] for user in joined.json()["users"]] == [api.ids["user"]]
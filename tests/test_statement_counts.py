@@ -0,0 +1,36 @@
+"""Each endpoint's SQL statement budget; a lazy load that sneaks in fails its test."""
+from typing import List, Optional, Tuple
+
+import pytest
+
+# (method, path template, request body, statement budget); paths are formatted with
+# the seeded cluster, deployment and deployment group ids
+ENDPOINTS: List[Tuple[str, str, Optional[dict], int]] = [
+    ("GET", "/api/v1/clusters/", None, 1),
+    ("GET", "/api/v1/clusters/{cluster}", None, 1),
+    ("GET", "/api/v1/clusters/{cluster}/nodes", None, 2),
+    ("GET", "/api/v1/deployments/", None, 1),
+    ("GET", "/api/v1/deployments/{deployment}", None, 1),
+    ("GET", "/api/v1/deployments/{deployment}/preemption-plan", None, 3),
+    ("GET", "/api/v1/deployments/groups/{group}", None, 2),
+    (
+        "PUT",
+        "/api/v1/deployments/{deployment}",
+        dict(name="renamed", docker_image="app:2", priority=0, required_cpu=1, required_ram=1, required_gpu=0),
+        3,
+    ),
+    ("DELETE", "/api/v1/deployments/{deployment}", None, 2),
+]
+
+@pytest.mark.parametrize(
+    "method,template,body,budget", ENDPOINTS, ids=[f"{method} {template}" for method, template, _, _ in ENDPOINTS]
+)
+def test_endpoint_statement_budget(api, statements, method, template, body, budget):
+    # Warm the principal cache so authentication does not count
+    api.client.get("/api/v1/clusters/", headers=api.headers).raise_for_status()
+    statements()
+
+    response = api.client.request(method, template.format(**api.ids), headers=api.headers, json=body)
+
+    response.raise_for_status()
+    assert statements() <= budget
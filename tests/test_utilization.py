@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.db.models import Cluster, ClusterUtilization
+from app.services import utilization
+from app.services.utilization import RESOLUTIONS, UtilizationRecorder, UtilizationSnapshot, series_points
+from benchmarks.common import make_session, seed_cluster
+
+NOON = datetime(2026, 1, 1, 12, 0)
+MINUTE = RESOLUTIONS["1m"]
+
+@pytest.fixture
+def recorder(engine, db):
+    """A recorder writing to the test database, and a 10 cpu cluster to sample."""
+    cluster, _ = seed_cluster(db, cpu=10.0, ram=10.0, gpu=0, users=1)
+    return UtilizationRecorder(session_factory=lambda: make_session(engine)), cluster
+
+def sample(recorder, cluster, at, cpu, flush=True):
+    recorder.record(UtilizationSnapshot.from_capacity(
+        cluster.id, (10.0, 10.0, 0), (10.0 - cpu, 10.0, 0), sampled_at=at,
+    ))
+    if flush:
+        assert recorder.flush() == 1
+
+def rollups(db, cluster, resolution):
+    db.expire_all()
+    return (
+        db.query(ClusterUtilization)
+        .filter_by(cluster_id=cluster.id, resolution=resolution)
+        .order_by(ClusterUtilization.bucket)
+        .all()
+    )
+
+def points(db, cluster, now, start=NOON, end=NOON + timedelta(minutes=2)):
+    previous = [row for row in rollups(db, cluster, MINUTE) if row.bucket < start]
+    rows = [row for row in rollups(db, cluster, MINUTE) if row.bucket >= start]
+    return series_points(
+        previous[-1] if previous else None, rows, resolution=MINUTE, start=start, end=end, now=now,
+    )
+
+def noon_samples(recorder, cluster, order=(10, 40)):
+    cpu = {10: 8.0, 40: 2.0}
+    for second in order:
+        sample(recorder, cluster, NOON + timedelta(seconds=second), cpu[second])
+
+def test_samples_are_upserted_into_every_resolution(db, recorder):
+    recorder, cluster = recorder
+    noon_samples(recorder, cluster)
+
+    for resolution in RESOLUTIONS.values():
+        (row,) = rollups(db, cluster, resolution)
+        assert row.samples == 2
+        assert (row.cpu_used_max, row.cpu_used_last) == (8.0, 2.0)
+        assert row.cpu_used_seconds == 8.0 * 30
+        assert row.last_sampled_at == NOON + timedelta(seconds=40)
+
+@pytest.mark.parametrize("order", [(10, 40), (40, 10)], ids=["in order", "late sample"])
+def test_average_weights_each_state_by_how_long_it_held(db, recorder, order):
+    recorder, cluster = recorder
+    sample(recorder, cluster, NOON - timedelta(minutes=1), 0.0)
+    noon_samples(recorder, cluster, order)
+
+    point, carried = points(db, cluster, now=NOON + timedelta(minutes=5))
+
+    # 0 for 10 s, 8 for 30 s, then 2 for the last 20 s; a per-sample mean would say 5
+    assert point["cpu_used_avg"] == pytest.approx((8.0 * 30 + 2.0 * 20) / 60)
+    assert point["cpu_used_max"] == 8.0
+    assert (carried["samples"], carried["cpu_used_avg"]) == (0, 2.0)
+
+def test_current_bucket_is_averaged_up_to_now(db, recorder):
+    recorder, cluster = recorder
+    sample(recorder, cluster, NOON - timedelta(minutes=1), 0.0)
+    noon_samples(recorder, cluster)
+
+    (point,) = points(db, cluster, now=NOON + timedelta(seconds=50), end=NOON + timedelta(minutes=1))
+
+    assert point["cpu_used_avg"] == pytest.approx((8.0 * 30 + 2.0 * 10) / 50)
+
+def test_without_an_earlier_state_the_average_starts_at_the_first_sample(db, recorder):
+    recorder, cluster = recorder
+    noon_samples(recorder, cluster)
+
+    (point,) = points(db, cluster, now=NOON + timedelta(minutes=5), end=NOON + timedelta(minutes=1))
+
+    assert point["cpu_used_avg"] == pytest.approx((8.0 * 30 + 2.0 * 20) / 50)
+
+def test_coalesced_snapshots_keep_their_peak(db, recorder):
+    recorder, cluster = recorder
+    sample(recorder, cluster, NOON + timedelta(seconds=10), 8.0, flush=False)
+    sample(recorder, cluster, NOON + timedelta(seconds=20), 2.0, flush=False)
+    assert recorder.pending() == 1
+
+    assert recorder.flush() == 1
+
+    (row,) = rollups(db, cluster, MINUTE)
+    assert (row.samples, row.cpu_used_max, row.cpu_used_last) == (1, 8.0, 2.0)
+
+def test_prune_applies_each_resolutions_retention(db, recorder, monkeypatch):
+    recorder, cluster = recorder
+    monkeypatch.setattr(settings, "UTILIZATION_RETENTION_MINUTE_DAYS", 1)
+    monkeypatch.setattr(settings, "UTILIZATION_RETENTION_HOUR_DAYS", 3)
+    monkeypatch.setattr(settings, "UTILIZATION_RETENTION_DAY_DAYS", 10)
+    for days in (2, 5):
+        sample(recorder, cluster, NOON - timedelta(days=days), 1.0)
+
+    # Both minute rows are past a day, the 5 day old hour row past 3 days
+    assert recorder.prune(now=NOON) == 3
+    assert [len(rollups(db, cluster, resolution)) for resolution in RESOLUTIONS.values()] == [0, 1, 2]
+
+def test_committed_capacity_changes_are_recorded(db, recorder, monkeypatch):
+    recorder, cluster = recorder
+    monkeypatch.setattr(settings, "UTILIZATION_ENABLED", True)
+    monkeypatch.setattr(utilization, "utilization_recorder", recorder)
+
+    cluster.available_cpu = 4.0
+    db.flush()
+    db.rollback()
+    assert recorder.pending() == 0
+
+    db.get(Cluster, cluster.id).available_cpu = 4.0
+    db.commit()
+    assert recorder.pending() == 1
+    recorder.flush()
+    (row,) = rollups(db, cluster, MINUTE)
+    assert row.cpu_used_last == 6.0
+
+def test_history_endpoint(api):
+    recorder = UtilizationRecorder(session_factory=api.sessionmaker)
+    for seconds, cpu in ((-60, 0.0), (10, 8.0), (40, 2.0)):
+        recorder.record(UtilizationSnapshot.from_capacity(
+            api.ids["cluster"], (64.0, 256.0, 0), (64.0 - cpu, 256.0, 0), sampled_at=NOON + timedelta(seconds=seconds),
+        ))
+        recorder.flush()
+    path = f"/api/v1/clusters/{api.ids['cluster']}/utilization"
+
+    def get(**params):
+        return api.client.get(path, headers=api.headers, params=params)
+
+    response = get(**{"from": "2026-01-01T12:00:00Z", "to": "2026-01-01T12:03:00Z", "step": "1m"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["step"] == "1m"
+    assert [point["samples"] for point in body["points"]] == [2, 0, 0]
+    assert body["points"][0]["cpu_used_avg"] == pytest.approx(280 / 60)
+
+    # Two days at one point per minute is too many, so the default step is an hour
+    two_days = {"from": "2026-01-01T00:00:00", "to": "2026-01-03T00:00:00"}
+    assert get(**two_days).json()["step"] == "1h"
+    assert get(**two_days, step="1m").status_code == 422
+    assert get(**{"from": "2026-01-01T12:00:00", "to": "2026-01-01T12:00:00"}).status_code == 422
+    assert get(step="5m").status_code == 422